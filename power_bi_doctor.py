@@ -1,33 +1,66 @@
 # %%
 import os
+import argparse
 import logging
-import shutil
+import time
 from tkinter import filedialog
-from src.agents.powerBI_documenter_agent import call_agent
-from src.utils.utils import (
-    list_files_in_directory,
-    update_measures_columns_descriptions,
-    update_table_description,
+from src.agents.powerBI_documenter_agent import (
+    CONTEXT_PROFILE,
+    call_agent,
+    context_cache_session,
+    model_context_report,
 )
+from src.agents.documentation_batch import run_documentation_job
+from src.infrastructure.llm_clients.base import LLMClientInterface
+from src.infrastructure.llm_clients.open_ai_client import OpenAiClient
+from src.infrastructure.memory_budget import get_memory_budget, peak_rss
+from src.infrastructure.scheduler import get_scheduler
+from src.infrastructure.usage_ledger import UsageLedger
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.description_cache import DEFAULT_CACHE_PATH, DescriptionCache
+from src.utils.incremental import (
+    DOCUMENTED_KINDS,
+    changed_objects_between,
+    changed_objects_since,
+    save_manifest,
+)
+from src.utils.model_watcher import ModelWatcher
+from src.utils.tmdl_parser import read_model_file
+from src.utils.tmdl_writer import write_descriptions
+from src.utils.utils import atomic_write_file
+from src.utils.output_modes import OUTPUT_MODES, prepare_output, unified_diff
 import asyncio
 import nest_asyncio
 from IPython import get_ipython
 
 logging.basicConfig(level=logging.INFO)
 
+DEFAULT_MODEL_PATH = (
+    r"C:\Users\micha\Documents\PBI files\Store Sales\Store Sales.SemanticModel"
+)
+# Where the updated files go, one of output_modes.OUTPUT_MODES
+OUTPUT_MODE = os.getenv("DOCUMENTATION_OUTPUT_MODE", "copy")
+
 
 async def get_model_documentation(
     analysis_requests: str,
-    model_files_path: str,
+    snapshot: ModelSnapshot,
     business_ctx_files_path: str = None,
+    cache: DescriptionCache = None,
+    include: set = None,
+    ledger: UsageLedger = None,
+    on_batch=None,
 ):
-    model_files = list_files_in_directory(
-        model_files_path, extension=".tmdl", recursive=True
+    output = await call_agent(
+        analysis_requests,
+        snapshot=snapshot,
+        cache=cache,
+        include=include,
+        ledger=ledger,
+        on_batch=on_batch,
     )
 
-    output = await call_agent(analysis_requests, model_files=model_files)
-
-    return output, model_files
+    return output, snapshot
 
 
 def process_documentation_results(results, requests):
@@ -44,7 +77,7 @@ def process_documentation_results(results, requests):
     documentation = {}
 
     for result, request in zip(results, requests):
-        docs_list = result[0].output.objects_documentation
+        docs_list = result[0].objects_documentation
         if not docs_list:
             logging.warning(f"No documentation found for request: {request}")
             continue
@@ -105,71 +138,527 @@ def _process_columns(column_docs, docs_list):
         }
 
 
-async def main():
-    logging.info("Getting mode files from the directory")
-    files_path = (
-        r"C:\Users\micha\Documents\PBI files\Store Sales\Store Sales.SemanticModel"
+def collect_file_descriptions(tmdl_file, documentation):
+    """
+    Select the descriptions that belong to the objects of a single TMDL file.
+
+    Args:
+        tmdl_file: Parsed TMDL file
+        documentation: Documentation dictionary from process_documentation_results
+
+    Returns:
+        dict: Descriptions keyed by (object kind, object name)
+    """
+    measure_docs = documentation.get("measure", {})
+    table_docs = documentation.get("table", {})
+    column_docs = documentation.get("column", {})
+
+    descriptions = {}
+    for obj in tmdl_file.objects:
+        if obj.kind == "measure":
+            item = measure_docs.get(obj.name)
+        elif obj.kind == "table":
+            item = table_docs.get(obj.name)
+            if item and item["understanding_score"] <= 0.8:
+                item = None
+        elif obj.kind == "column":
+            item = column_docs.get(obj.table, {}).get(obj.name)
+        else:
+            item = None
+        if item:
+            descriptions[(obj.kind, obj.name)] = item["description"]
+    return descriptions
+
+
+def get_description_cache():
+    """Open the description cache configured with DOCUMENTATION_CACHE_PATH, None if disabled."""
+    cache_path = os.getenv("DOCUMENTATION_CACHE_PATH", DEFAULT_CACHE_PATH)
+    return DescriptionCache(cache_path) if cache_path else None
+
+
+def get_batch_client() -> OpenAiClient:
+    """The client of batch job runs, configured with OPENAI_API_KEY, OPENAI_BASE_URL and DOCUMENTATION_BATCH_MODEL."""
+    return OpenAiClient(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1/"),
+        model_name=os.getenv("DOCUMENTATION_BATCH_MODEL", "gpt-4o-mini"),
     )
+
+
+class DescriptionApplier:
+    """
+    Writer stage of document_model: applies the documentation to the files as it arrives.
+
+    Finished batches are put in a queue. A file is written once every object of it
+    that is being documented has been through a batch, with the descriptions of all
+    tasks merged into a single atomic write. Files of failed batches are written
+    with the descriptions received when the applier is closed. When writing over
+    the model files, a file changed on disk since it was read (e.g. saved by an
+    editor meanwhile) is not overwritten, it is listed in skipped_files. The keys
+    of the objects whose description was written are collected in documented.
+
+    Args:
+        snapshot: The loaded model
+        output_folder: Folder the updated files are written to (a copy or links of
+            snapshot.root, or snapshot.root itself), None to only collect the diffs
+        include: Keys of the objects being documented, all objects if None
+    """
+
+    def __init__(self, snapshot: ModelSnapshot, output_folder: str, include: set = None):
+        self.snapshot = snapshot
+        self.output_folder = output_folder
+        self.queue = asyncio.Queue()
+        self.documentation = {}
+        self.updated_files = 0
+        self.skipped_files = []
+        self.diffs = {}
+        self.documented = set()
+        self.pending = {}
+        for tmdl_file in snapshot.tmdl_files():
+            keys = {
+                obj.key
+                for obj in tmdl_file.objects
+                if obj.kind in DOCUMENTED_KINDS and (include is None or obj.key in include)
+            }
+            if keys:
+                self.pending[tmdl_file.path] = keys
+        self.documenting = set().union(*self.pending.values())
+
+    @property
+    def undocumented(self) -> set:
+        """Keys of the objects being documented whose description wasn't written."""
+        return self.documenting - self.documented
+
+    async def submit(self, objects, result):
+        """Queue the documentation of a finished batch, the on_batch callback of call_agent."""
+        await self.queue.put((objects, result))
+
+    async def close(self):
+        """Write the remaining files and wait for the writer to finish."""
+        await self.queue.put(None)
+
+    def _add(self, objects, result) -> set:
+        """Merge a batch into the documentation, return the files that are complete."""
+        docs_list = result.objects_documentation
+        if docs_list:
+            element_type = objects[0].kind
+            self.documentation.setdefault(element_type, {})
+            _process_element_type(self.documentation, element_type, docs_list)
+        ready = set()
+        for obj in objects:
+            keys = self.pending.get(obj.path)
+            if keys is not None:
+                keys.discard(obj.key)
+                if not keys:
+                    ready.add(obj.path)
+        return ready
+
+    async def _write(self, path: str):
+        tmdl_file = self.snapshot.tmdl_file(path)
+        descriptions = collect_file_descriptions(tmdl_file, self.documentation)
+        updated_file_content = write_descriptions(
+            tmdl_file, descriptions, strip_trailing_tabs=True
+        )
+        documented = {
+            obj.key for obj in tmdl_file.objects if (obj.kind, obj.name) in descriptions
+        }
+        if updated_file_content == tmdl_file.content:
+            self.documented |= documented
+            return
+        if self.output_folder == self.snapshot.root:
+            on_disk = await asyncio.to_thread(read_model_file, path)
+            if on_disk != tmdl_file.content:
+                logging.warning(f"{path} changed since it was read, not overwritten")
+                self.skipped_files.append(path)
+                return
+        logging.info(f"Updated content for {path}")
+        self.updated_files += 1
+        if self.output_folder is None:
+            relative_path = os.path.relpath(path, self.snapshot.root)
+            self.diffs[relative_path] = unified_diff(
+                tmdl_file.content, updated_file_content, relative_path
+            )
+        else:
+            output_path = path.replace(self.snapshot.root, self.output_folder)
+            await asyncio.to_thread(atomic_write_file, output_path, updated_file_content)
+        self.documented |= documented
+
+    def patch(self) -> str:
+        """The diffs of all updated files, ordered by path."""
+        return "".join(self.diffs[path] for path in sorted(self.diffs))
+
+    async def run(self):
+        """Consume the queue until closed, batches queued together are written together."""
+        while True:
+            items = [await self.queue.get()]
+            while not self.queue.empty():
+                items.append(self.queue.get_nowait())
+            closed = None in items
+            ready = set()
+            for item in items:
+                if item is not None:
+                    ready |= self._add(*item)
+            if closed:
+                ready |= set(self.pending)
+            for path in ready:
+                self.pending.pop(path, None)
+                await self._write(path)
+            if closed:
+                return
+
+
+async def document_model(
+    snapshot: ModelSnapshot,
+    since: str = None,
+    manifest_path: str = None,
+    cache: DescriptionCache = None,
+    ledger: UsageLedger = None,
+    output_mode: str = None,
+    batch_client: LLMClientInterface = None,
+    include: set = None,
+) -> dict:
+    """
+    Document a loaded model and write the updated files.
+
+    Files are written while the LLM calls are running, as soon as all their objects
+    are documented (see DescriptionApplier). The usage of the LLM requests is written
+    next to the model folder, to `<model folder>_usage.json` and `<model folder>_usage.csv`.
+
+    Args:
+        output_mode: Where the updated files go, defaults to DOCUMENTATION_OUTPUT_MODE:
+            - "copy": the model is copied to the `_updated` folder, changed files written there,
+            - "in-place": the changed files are written over the originals,
+            - "hardlink": unchanged files are hard linked into the `_updated` folder,
+            - "patch": a unified diff is written to `<model folder>.patch`, no model
+              file is written.
+        batch_client: If given, all requests are sent as one batch job of this client
+            (job file `<model folder>_batch.jsonl`) and the results applied once it is
+            done, instead of interactive requests.
+        include: Keys of the objects to document when since isn't given, all
+            objects if None
+
+    Returns:
+        dict: Summary of the run with the number of documented objects, updated files,
+            the files not overwritten because they changed on disk (in-place mode),
+            the output folder (None in patch mode), the patch path (patch mode only),
+            the duration of the documentation stage and of the writes left after it
+            in seconds, the usage summary (tokens, cost, p50/p95 latency per task),
+            the tokens of the model saved by the context profile (see
+            MinifyReport.summary) and the memory: the cap and peak of the model
+            contexts held at the same time (see MemoryBudget) and the peak resident
+            memory of the process (None where not available), in bytes
+    """
+    if output_mode is None:
+        output_mode = OUTPUT_MODE
+    files_path = snapshot.root
+    if ledger is None:
+        ledger = UsageLedger()
+    timings = {}
+    started = time.perf_counter()
+    if since is not None:
+        include = changed_objects_since(snapshot, since)
+        logging.info(f"{len(include)} objects changed since {since}")
+
+    logging.info(f"Preparing the output ({output_mode})")
+    updated_folder = prepare_output(files_path, output_mode)
+
+    applier = DescriptionApplier(snapshot, updated_folder, include)
+    writer = asyncio.create_task(applier.run())
+
+    # Minifies the files once, the prompts are built from the same texts
+    context = model_context_report(snapshot, CONTEXT_PROFILE)
+    log_context_summary(context.summary())
+
     logging.info("Getting model documentation from LLM")
     requests = ["measure descriptions", "table descriptions", "column descriptions"]
+    # The model contexts cached for the run are deleted at its end
+    async with context_cache_session():
+        try:
+            if batch_client is not None:
+                documentation = await run_documentation_job(
+                    batch_client,
+                    snapshot,
+                    os.path.normpath(files_path) + "_batch.jsonl",
+                    on_batch=applier.submit,
+                    include=include,
+                    cache=cache,
+                    ledger=ledger,
+                )
+                results = [(documentation[req], snapshot) for req in requests]
+            else:
+                tasks = [
+                    asyncio.create_task(
+                        get_model_documentation(
+                            req,
+                            snapshot,
+                            cache=cache,
+                            include=include,
+                            ledger=ledger,
+                            on_batch=applier.submit,
+                        )
+                    )
+                    for req in requests
+                ]
+                try:
+                    results = await asyncio.gather(*tasks)
+                finally:
+                    # A failed task stops the others before the applier is closed
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            # Results received so far are written even if a task failed
+            timings["documentation"] = time.perf_counter() - started
+            started = time.perf_counter()
+            await applier.close()
+            await writer
+    logging.info("All documentation received")
 
-    tasks = [get_model_documentation(req, files_path) for req in requests]
-    results = await asyncio.gather(*tasks)
-    model_files = results[0][1]
-    # Process documentation results
-    documentation = process_documentation_results(results, requests)
+    patch_path = None
+    if output_mode == "patch":
+        patch_path = os.path.normpath(files_path) + ".patch"
+        logging.info(f"Writing patch: {patch_path}")
+        atomic_write_file(patch_path, applier.patch())
+    if manifest_path is not None:
+        # Objects left undocumented (e.g. of a failed batch) count as changed next time
+        logging.info(f"Saving manifest: {manifest_path}")
+        save_manifest(snapshot, manifest_path, exclude=applier.undocumented)
+    ledger.write(os.path.normpath(files_path) + "_usage")
+    timings["write"] = time.perf_counter() - started
+
+    return {
+        "documented_objects": sum(len(result[0].objects_documentation) for result in results),
+        "updated_files": applier.updated_files,
+        "skipped_files": applier.skipped_files,
+        "updated_folder": updated_folder,
+        "patch_path": patch_path,
+        "timings": timings,
+        "usage": ledger.summary(),
+        "context": context.summary(),
+        "memory": memory_summary(),
+    }
 
-    logging.info("All documentation received")
-    files_path_parts = os.path.split(files_path)
 
-    updated_folder = files_path_parts[-1] + "_updated"
-    updated_folder = os.path.join(*files_path_parts[:-1], updated_folder)
+async def watch_model(
+    files_path: str,
+    cache: DescriptionCache = None,
+    ledger: UsageLedger = None,
+    since: str = None,
+    watcher: ModelWatcher = None,
+    rounds: int = None,
+) -> list:
+    """
+    Keep the descriptions of a model up to date while it is being edited.
 
-    logging.info(f"Creating updated folder: {updated_folder}")
-    shutil.copytree(files_path, updated_folder, dirs_exist_ok=True)
+    The model folder is watched (see ModelWatcher); after every burst of saves the
+    changed files are parsed again and only the objects whose definition changed
+    are documented and written back into the model files (in-place). Writing a
+    description doesn't change a definition, so the watcher's own writes don't
+    start another round. Objects of files the editor saved again before they
+    were written, or that couldn't be read, are documented in the next round.
 
-    logging.info(f"Updated folder created: {updated_folder}")
-    for file_path in model_files:
-        table_name = os.path.basename(file_path).split(".")[0]
-        with open(file_path, "r", encoding="utf-8") as f:
-            file_content = f.read()
-            updated_file_content = file_content
+    Args:
+        files_path: The SemanticModel folder
+        cache: Description cache, objects documented before are taken from it
+        ledger: Records the usage of all rounds, written after every round; the
+            summary of a round reports the usage of that round only
+        since: Document the objects changed since this baseline first (see
+            changed_objects_since), nothing is documented before the first change if None
+        watcher: The watcher of the folder, a ModelWatcher of files_path if None
+        rounds: Stop after this many documentation rounds, None watches until cancelled
 
-        if "measure" in documentation.keys():
-            measure_descriptions = documentation["measure"]
-            updated_file_content = update_measures_columns_descriptions(
-                updated_file_content, measure_descriptions, "measure"
+    Returns:
+        list: The summaries (see document_model) of the rounds
+    """
+    if ledger is None:
+        ledger = UsageLedger()
+    if watcher is None:
+        watcher = ModelWatcher(files_path)
+    snapshot = ModelSnapshot.load(files_path)
+    pending = changed_objects_since(snapshot, since) if since is not None else set()
+    summaries = []
+
+    async def document(include: set):
+        nonlocal pending
+        logging.info(f"Documenting {len(include)} changed objects")
+        round_ledger = UsageLedger(prices=ledger.prices)
+        try:
+            summary = await document_model(
+                snapshot, cache=cache, ledger=round_ledger, output_mode="in-place", include=include
             )
-        if "table" in documentation.keys():
-            table_descriptions = documentation["table"]
-            if table_name in table_descriptions:
-                description = table_descriptions[table_name]["description"]
-                confidence = table_descriptions[table_name]["understanding_score"]
-                if confidence > 0.8:
-                    updated_file_content = update_table_description(
-                        updated_file_content, description
-                    )
+        finally:
+            ledger.records.extend(round_ledger.records)
+            ledger.write(os.path.normpath(files_path) + "_usage")
+        log_usage_summary(summary["usage"])
+        skipped = set(summary["skipped_files"])
+        pending = {
+            obj.key
+            for path in skipped
+            for obj in snapshot.tmdl_file(path).objects
+            if obj.key in include
+        }
+        summaries.append(summary)
+
+    if pending:
+        await document(pending)
+    logging.info(f"Watching {files_path} for changes")
+    unread = set()
+    async for changed_paths in watcher.changes():
+        changed_paths |= unread
+        try:
+            current = await asyncio.to_thread(snapshot.reload, changed_paths)
+        except OSError as exc:
+            logging.warning(f"Model files not readable, retrying after the next change: {exc}")
+            unread = changed_paths
+            continue
+        unread = set()
+        changed = changed_objects_between(snapshot, current, changed_paths)
+        existing = {obj.key for obj in current.index.objects()}
+        include = changed | (pending & existing)
+        snapshot = current
+        if not include:
+            continue
+        await document(include)
+        if rounds is not None and len(summaries) >= rounds:
+            break
+    return summaries
+
+
+def log_scheduler_metrics():
+    metrics = get_scheduler().metrics
+    logging.info(
+        f"LLM requests: {metrics.requests}, retries: {metrics.retries}, "
+        f"max queue depth: {metrics.max_queue_depth}, "
+        f"average wait: {metrics.average_wait_time:.1f}s, max wait: {metrics.max_wait_time:.1f}s"
+    )
 
-        if "column" in documentation.keys():
-            column_descriptions = documentation["column"]
-            if table_name in column_descriptions.keys():
-                column_descriptions = column_descriptions[table_name]
 
-                updated_file_content = update_measures_columns_descriptions(
-                    updated_file_content, column_descriptions, "column"
-                )
+def log_context_summary(context: dict):
+    logging.info(
+        f"Model context ({CONTEXT_PROFILE} profile): {context['original_tokens']} tokens, "
+        f"{context['minified_tokens']} sent, {context['saved_tokens']} saved "
+        f"({context['saved_share']:.0%})"
+    )
+    for keyword, tokens in context["saved_tokens_by_keyword"].items():
+        logging.info(f"  {keyword}: {tokens} tokens")
+
 
-        if updated_file_content != file_content:
-            logging.info(f"Updated content for {file_path}")
-            file_path = file_path.replace(files_path, updated_folder)
-            # create the directory if it does not exist
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(updated_file_content)
+def memory_summary() -> dict:
+    budget = get_memory_budget()
+    return {
+        "context_cap": budget.cap,
+        "context_peak": budget.metrics.peak,
+        "context_waits": budget.metrics.waits,
+        "process_peak_rss": peak_rss(),
+    }
+
+
+def log_memory_summary(memory: dict):
+    cap = f"{memory['context_cap'] / 2**20:.0f} MiB" if memory["context_cap"] else "no cap"
+    rss = memory["process_peak_rss"]
+    logging.info(
+        f"Memory: model contexts peak {memory['context_peak'] / 2**20:.1f} MiB ({cap}, "
+        f"{memory['context_waits']} waits), process peak "
+        + (f"{rss / 2**20:.1f} MiB" if rss is not None else "not available")
+    )
+
+
+def log_usage_summary(usage: dict):
+    logging.info(
+        f"LLM usage: {usage['requests']} requests, {usage['input_tokens']} input and "
+        f"{usage['output_tokens']} output tokens, estimated cost ${usage['cost']:.4f}"
+    )
+    for task, totals in usage["tasks"].items():
+        logging.info(
+            f"  {task}: {totals['requests']} requests, {totals['retries']} retries, "
+            f"latency p50 {totals['latency_p50']:.1f}s, p95 {totals['latency_p95']:.1f}s, "
+            f"cost ${totals['cost']:.4f}"
+        )
+
+
+async def main(
+    files_path: str = DEFAULT_MODEL_PATH,
+    since: str = None,
+    manifest_path: str = None,
+    output_mode: str = None,
+    batch_job: bool = False,
+    watch: bool = False,
+):
+    if watch:
+        await watch_model(files_path, cache=get_description_cache(), since=since)
+        return
+    logging.info("Getting mode files from the directory")
+    snapshot = ModelSnapshot.load(files_path)
+    summary = await document_model(
+        snapshot,
+        since,
+        manifest_path,
+        cache=get_description_cache(),
+        output_mode=output_mode,
+        batch_client=get_batch_client() if batch_job else None,
+    )
+    log_scheduler_metrics()
+    log_usage_summary(summary["usage"])
+    log_memory_summary(summary["memory"])
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description="Generate descriptions for a Power BI semantic model."
+    )
+    parser.add_argument(
+        "model_path",
+        nargs="?",
+        default=DEFAULT_MODEL_PATH,
+        help="SemanticModel folder with the .tmdl files",
+    )
+    parser.add_argument(
+        "--since",
+        help="Only document objects changed since a manifest file, a timestamp "
+        "(epoch seconds or ISO format) or a git ref",
+    )
+    parser.add_argument(
+        "--write-manifest",
+        dest="manifest_path",
+        help="Save a manifest of the model to use with --since in the next run",
+    )
+    parser.add_argument(
+        "--output-mode",
+        choices=OUTPUT_MODES,
+        help="copy (default): write to a copy of the model in the _updated folder, "
+        "in-place: overwrite the model files, hardlink: link unchanged files into the "
+        "_updated folder, patch: only write a unified diff",
+    )
+    parser.add_argument(
+        "--batch-job",
+        action="store_true",
+        help="Send all requests as one provider batch job (cheaper, results within "
+        "24 hours) with the OpenAI client configured by OPENAI_API_KEY, "
+        "OPENAI_BASE_URL and DOCUMENTATION_BATCH_MODEL",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and document the objects changed whenever the model files "
+        "are saved, writing the descriptions into the model files (--since documents "
+        "the objects changed since a baseline first)",
+    )
+    return parser.parse_args(args)
 
 
 # %%
 if __name__ == "__main__":
     if get_ipython() is not None:
         nest_asyncio.apply()
-    asyncio.run(main())
+    args = parse_args([] if get_ipython() is not None else None)
+    asyncio.run(
+        main(
+            args.model_path,
+            args.since,
+            args.manifest_path,
+            args.output_mode,
+            args.batch_job,
+            args.watch,
+        )
+    )
 # %%
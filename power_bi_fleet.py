@@ -0,0 +1,183 @@
+# %%
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from src.agents.powerBI_documenter_agent import context_cache_session
+from power_bi_doctor import (
+    document_model,
+    get_batch_client,
+    get_description_cache,
+    log_scheduler_metrics,
+)
+from src.utils.output_modes import OUTPUT_MODES
+from src.utils.model_snapshot import ModelSnapshot
+
+logging.basicConfig(level=logging.INFO)
+
+
+def expand_model_paths(patterns: list) -> list:
+    """
+    Expand folder paths and glob patterns into a sorted list of SemanticModel folders.
+
+    Args:
+        patterns: Folder paths or glob patterns, e.g. "models/*.SemanticModel"
+
+    Returns:
+        list: Unique existing folders
+    """
+    model_paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+        model_paths.update(
+            os.path.normpath(path) for path in matches if os.path.isdir(path)
+        )
+    return sorted(model_paths)
+
+
+async def _document_fleet_model(
+    model_path, executor, semaphore, since, cache, output_mode, batch_client=None
+) -> dict:
+    report = {"model": model_path, "status": "ok", "error": None}
+    started = time.perf_counter()
+    try:
+        # Parsed under the semaphore, only the models being documented are held in memory
+        async with semaphore:
+            snapshot = await asyncio.get_running_loop().run_in_executor(
+                executor, ModelSnapshot.load, model_path
+            )
+            report["files"] = len(snapshot.files)
+            report.update(
+                await document_model(
+                    snapshot,
+                    since=since,
+                    cache=cache,
+                    output_mode=output_mode,
+                    batch_client=batch_client,
+                )
+            )
+    except Exception as exc:
+        logging.exception(f"Documenting {model_path} failed")
+        report["status"] = "failed"
+        report["error"] = f"{type(exc).__name__}: {exc}"
+    report["duration_seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+async def run_fleet(
+    model_paths: list,
+    max_concurrent_models: int = 8,
+    parse_workers: int = None,
+    since: str = None,
+    output_mode: str = None,
+    batch_client=None,
+) -> list:
+    """
+    Document many semantic models in one process.
+
+    The models are parsed in a process pool when their turn comes, so at most
+    max_concurrent_models snapshots are held in memory. The LLM calls of all models
+    share the process-wide scheduler and the agent's model connection. A failing
+    model is reported and does not stop the others. The cached model contexts are deleted
+    once all models are done.
+
+    Args:
+        model_paths: SemanticModel folders
+        max_concurrent_models: Number of models documented at the same time
+        parse_workers: Number of processes parsing the models, defaults to the CPU count
+        since: Baseline for incremental runs, see power_bi_doctor --since
+        output_mode: Where the updated files go, see power_bi_doctor --output-mode
+        batch_client: Send the requests of every model as a batch job of this client,
+            see power_bi_doctor --batch-job
+
+    Returns:
+        list: One report per model with its status, error, counts and duration
+    """
+    semaphore = asyncio.Semaphore(max_concurrent_models)
+    cache = get_description_cache()
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        async with context_cache_session():
+            reports = await asyncio.gather(
+                *(
+                    _document_fleet_model(
+                        path, executor, semaphore, since, cache, output_mode, batch_client
+                    )
+                    for path in model_paths
+                )
+            )
+    return reports
+
+
+def summarize_reports(reports: list) -> dict:
+    failed = [report for report in reports if report["status"] != "ok"]
+    return {
+        "models": len(reports),
+        "succeeded": len(reports) - len(failed),
+        "failed": len(failed),
+        "documented_objects": sum(r.get("documented_objects", 0) for r in reports),
+        "updated_files": sum(r.get("updated_files", 0) for r in reports),
+        "estimated_cost": sum(r.get("usage", {}).get("cost", 0) for r in reports),
+        "failed_models": [report["model"] for report in failed],
+    }
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description="Generate descriptions for many Power BI semantic models."
+    )
+    parser.add_argument(
+        "models", nargs="+", help="SemanticModel folders or glob patterns"
+    )
+    parser.add_argument(
+        "--max-concurrent-models",
+        type=int,
+        default=8,
+        help="Number of models documented at the same time",
+    )
+    parser.add_argument(
+        "--parse-workers", type=int, help="Number of processes parsing the models"
+    )
+    parser.add_argument("--since", help="See power_bi_doctor.py --since")
+    parser.add_argument(
+        "--output-mode",
+        choices=OUTPUT_MODES,
+        help="See power_bi_doctor.py --output-mode",
+    )
+    parser.add_argument(
+        "--batch-job", action="store_true", help="See power_bi_doctor.py --batch-job"
+    )
+    parser.add_argument("--report", help="Path of the JSON summary report")
+    return parser.parse_args(args)
+
+
+async def main(args):
+    model_paths = expand_model_paths(args.models)
+    logging.info(f"Documenting {len(model_paths)} models")
+    reports = await run_fleet(
+        model_paths,
+        max_concurrent_models=args.max_concurrent_models,
+        parse_workers=args.parse_workers,
+        since=args.since,
+        output_mode=args.output_mode,
+        batch_client=get_batch_client() if args.batch_job else None,
+    )
+    summary = summarize_reports(reports)
+    log_scheduler_metrics()
+    logging.info(
+        f"{summary['succeeded']}/{summary['models']} models documented, "
+        f"{summary['failed']} failed, estimated LLM cost ${summary['estimated_cost']:.4f}"
+    )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "models": reports}, f, indent=2)
+    return summary
+
+
+# %%
+if __name__ == "__main__":
+    summary = asyncio.run(main(parse_args()))
+    raise SystemExit(1 if summary["failed"] else 0)
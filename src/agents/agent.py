@@ -5,6 +5,8 @@ import os
 import inspect
 import json
 import logging
+from src.agents.history import OpenAIHistory
+from src.agents.tool_calls import DEFAULT_MAX_TOOL_WORKERS, DEFAULT_TOOL_TIMEOUT, run_tool_calls
 # %%
 
 load_dotenv(find_dotenv()) # Use the found path explicitly if needed
@@ -24,6 +26,9 @@ class Agent:
                  system_instruction:str="",
                  temperature:int=1,
                  keep_chat_history:bool = True,
+                 tool_timeout:float = DEFAULT_TOOL_TIMEOUT,
+                 max_tool_workers:int = DEFAULT_MAX_TOOL_WORKERS,
+                 history:OpenAIHistory = None,
     ):
         
         self.model_name = model_name
@@ -32,15 +37,19 @@ class Agent:
         self.messages:list = [
         {"role": "system", "content": system_instruction}
         ]
+        self.history = history or OpenAIHistory()
         self.temperature = temperature
         self.avaible_functions = {f.__name__:f for f in tools}
         self.keep_chat_history = keep_chat_history
+        self.tool_timeout = tool_timeout
+        self.max_tool_workers = max_tool_workers
 
     def __call__(self, user_message:str):
         log.info(f"User message: {user_message}")
         response = self._send_message(user_message=user_message)
         while response.tool_calls:
             log.info(f"Tool calls: {response.tool_calls}")
+            self.messages.append(self._tool_calls_message(response))
             self._use_tools(response.tool_calls)
             response = self._send_message()
         self.messages.append({"role": "assistant", "content": response.content})
@@ -48,6 +57,7 @@ class Agent:
     def _send_message(self, user_message:str=None):
         if user_message is not None:
             self.messages.append({"role": "user", "content": user_message})
+        self.messages = self.history.compact(self.messages)
         completion = self.client.beta.chat.completions.parse(
             messages=self.messages,
             model = self.model_name,
@@ -58,17 +68,37 @@ class Agent:
         response = completion.choices[0].message
         return response
 
-    
+    def _tool_calls_message(self, response) -> dict:
+        """The assistant message with tool calls, the tool results have to follow it."""
+        return {
+            "role": "assistant",
+            "content": response.content,
+            "tool_calls": [
+                {
+                    "id": tool_call.id,
+                    "type": "function",
+                    "function": {
+                        "name": tool_call.function.name,
+                        "arguments": tool_call.function.arguments,
+                    },
+                }
+                for tool_call in response.tool_calls
+            ],
+        }
+
     def _call_function(self, name, args:dict):
         return self.avaible_functions[name](**args)
     
     def _use_tools(self,tool_calls):
+        """Run the tool calls of a turn concurrently, results are added in call order."""
+        calls = []
         for tool_call in tool_calls:
             name = tool_call.function.name
             log.info(f"Calling function: {name}")
             log.info(f"Function arguments: {tool_call.function.arguments}")
-            args = json.loads(tool_call.function.arguments)
-            result = self._call_function(name, args)
+            calls.append((name, json.loads(tool_call.function.arguments)))
+        results = run_tool_calls(self.avaible_functions, calls, self.tool_timeout, self.max_tool_workers)
+        for tool_call, result in zip(tool_calls, results):
             self.messages.append({"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(result)}
     )
 
@@ -1,4 +1,5 @@
 #%%
+import asyncio
 import base64
 import inspect
 from google import genai
@@ -9,15 +10,72 @@ import inspect
 import json
 import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pydantic import BaseModel
+from src.infrastructure.upload_manifest import DEFAULT_MANIFEST_PATH, UploadManifest, content_hash
+from src.agents.history import GoogleHistory
+from src.agents.tool_calls import (
+    DEFAULT_MAX_TOOL_WORKERS,
+    DEFAULT_TOOL_TIMEOUT,
+    run_tool_calls,
+    run_tool_calls_async,
+)
 
 load_dotenv(find_dotenv()) # Use the found path explicitly if needed
 google_api_key = os.getenv('GOOGLE_API_KEY')
+# Local record of uploaded files, empty keeps it in memory for the session only
+upload_manifest_path = os.getenv('GOOGLE_UPLOAD_MANIFEST_PATH', DEFAULT_MANIFEST_PATH)
 logging.basicConfig(level=logging.INFO)
 
+native_extentions_supported = [".pdf", ".txt", ".xlsx"]
+other_files_mime_types = {
+    ".tmdl":"text/plain"
+}
+
 #%%
 
+def _read_upload(file_path:str):
+    """Read a file to upload, return the hash of its content and the content."""
+    file_extension = os.path.splitext(file_path)[1]
+    if (file_extension not in native_extentions_supported
+            and not other_files_mime_types.get(file_extension)):
+        raise ValueError(f"Unsupported file type: {file_extension}.")
+    with open(file_path, "rb") as file:
+        file_bytes = file.read()
+    return content_hash(file_bytes), file_bytes
+
+def _upload_arguments(file_path:str, file_bytes:bytes) -> dict:
+    """Arguments of client.files.upload for a file."""
+    file_base_name = os.path.basename(file_path)
+    file_extension = os.path.splitext(file_base_name)[1]
+    if file_extension in native_extentions_supported:
+        return {"file": file_path, "config": {"display_name": file_base_name}}
+    return {
+        "file": BytesIO(file_bytes),
+        "config": {
+            "mime_type": other_files_mime_types.get(file_extension),
+            "display_name": file_base_name,
+        },
+    }
+
+def _manifest_entry(file) -> dict:
+    return {
+        "name": file.name,
+        "uri": file.uri,
+        "mime_type": file.mime_type,
+        "expires_at": file.expiration_time.timestamp() if file.expiration_time else None,
+    }
+
+def _file_parts_content(entries:list) -> types.Content:
+    return types.Content(
+        role="user",
+        parts=[
+            types.Part.from_uri(file_uri=entry["uri"], mime_type=entry["mime_type"])
+            for entry in entries
+        ],
+    )
+
 class Agent:
     def __init__(self, 
                  api_key:str,
@@ -25,7 +83,11 @@ class Agent:
                  tools:list=[], 
                  system_instruction:str="",
                  temperature:int=1,
-
+                 upload_manifest_path:str=upload_manifest_path,
+                 max_upload_workers:int=8,
+                 tool_timeout:float=DEFAULT_TOOL_TIMEOUT,
+                 max_tool_workers:int=DEFAULT_MAX_TOOL_WORKERS,
+                 history:GoogleHistory=None,
     ):
         
         self.model_name = model_name
@@ -35,10 +97,19 @@ class Agent:
         self.system_instruction = system_instruction
         self.config = self._get_config()
         self.messages:list = []
+        self.history = history or GoogleHistory()
         self.avaible_functions = {f.__name__:f for f in tools}
+        self.tool_timeout = tool_timeout
+        self.max_tool_workers = max_tool_workers
         self.last_assistant_message = None
         self.input_tokens = 0
         self.output_tokens = 0
+        self.upload_manifest = UploadManifest(upload_manifest_path or None)
+        self.max_upload_workers = max_upload_workers
+        # Remote file listing, fetched at most once per session
+        self._remote_files = None
+        # Content hash of the uploaded files by local path, to find their uploads again
+        self._upload_keys = {}
 
     def __call__(self, user_message:str=None, keep_chat_history:bool = True, files:list = None, update_config:dict = None):
         init_config = self.config.copy()
@@ -49,19 +120,12 @@ class Agent:
             initial_messages = self.messages.copy()
         logging.info(f"User message: {user_message}")
         response = self._send_message(user_message=user_message, files = files)
-        if response.text:
-            self.last_assistant_message = response.text
-            content = types.Content(
-                role="model",
-                parts=[
-                    types.Part.from_text(text=response.text),
-                ],
-            )
-            self.messages.append(content)
-        if response.function_calls:
+        while response.function_calls:
             logging.info(f"Tool calls: {response.function_calls}")
             self._use_tools(response.function_calls)
-            self.__call__()
+            response = self._send_message()
+        if response.text:
+            self.last_assistant_message = response.text
         if not keep_chat_history:
             self.messages = initial_messages.copy()
             self._clean_files(files)
@@ -83,63 +147,92 @@ class Agent:
                 logging.warning(f"Key '{key}' not found in config.")
         print(f"For this response, the config was updated to: {self.config}")
 
+    def _list_remote_files(self) -> dict:
+        """Remote files by name, listed once per session."""
+        if self._remote_files is None:
+            self._remote_files = {file.name:file for file in self.client.files.list()}
+        return self._remote_files
+
+    def _upload_file(self, file_path:str, file_bytes:bytes):
+        logging.info(f"Uploading file: {os.path.basename(file_path)}")
+        return self.client.files.upload(**_upload_arguments(file_path, file_bytes))
+
     def _upload_files(self, files:list):
+        """
+        Upload the files not uploaded yet and return them as a user message.
+
+        Files are identified by the hash of their content in the upload manifest, so
+        unchanged files are reused across sessions until they expire and changed files
+        are uploaded again. Manifest entries are checked against the remote file listing
+        (fetched once per session), files deleted remotely are uploaded again. Missing
+        files are uploaded in parallel.
+        """
         logging.info("Uploading files")
-        file_parts = []
-        native_extentions_supported = [".pdf", ".txt", ".xlsx"]
-        other_files_mime_types = {
-            ".tmdl":"text/plain"
-        }
-        currently_uploaded_files = {file.display_name:file for file in self.client.files.list()}
-        for i in files:
-            file_base_name = os.path.basename(i)
-            file_extension = os.path.splitext(file_base_name)[1]
-            logging.info(f"Uploading file: {os.path.basename(file_base_name)}")
-            file_path = i
-        
-            if file_base_name in currently_uploaded_files.keys():
-                logging.info(f"File {file_base_name} already uploaded. Skipping upload.")
-                file = currently_uploaded_files[file_base_name]
-            elif file_extension in native_extentions_supported:
-                file = self.client.files.upload(
-                    file=i, 
-                    config={
-                            "display_name":file_base_name}
-                 )
-            elif other_files_mime_types.get(file_extension):
-                with open(file_path, "rb") as file:
-                    file_bytes = file.read()
-                    io_object_tmdl = BytesIO(file_bytes)
-                    file = self.client.files.upload(
-                        file=io_object_tmdl, 
-                        config={
-                                "mime_type":other_files_mime_types.get(file_extension),
-                                "display_name":file_base_name}
-                    )
+        keys = self._upload_keys
+        to_upload = {}
+        for file_path in files:
+            key, file_bytes = _read_upload(file_path)
+            keys[file_path] = key
+            entry = self.upload_manifest.get(key)
+            if entry is not None and entry["name"] in self._list_remote_files():
+                logging.info(f"File {os.path.basename(file_path)} already uploaded. Skipping upload.")
             else:
-                raise ValueError(f"Unsupported file type: {file_extension}.")
-            file_parts.append(
-                types.Part.from_uri(
-                    file_uri=file.uri,
-                    mime_type=file.mime_type,
-                )
-            )
-        content = types.Content(
-            role="user",
-            parts=file_parts,
-        )
-        
-        logging.info(f"Files uploaded: {[file.name for file in self.client.files.list()]}")
-        return content
+                to_upload[key] = (file_path, file_bytes)
+
+        if to_upload:
+            with ThreadPoolExecutor(max_workers=self.max_upload_workers) as executor:
+                uploaded = dict(zip(
+                    to_upload,
+                    executor.map(lambda item: self._upload_file(*item), to_upload.values()),
+                ))
+            for key, file in uploaded.items():
+                self.upload_manifest.set(key, _manifest_entry(file))
+                if self._remote_files is not None:
+                    self._remote_files[file.name] = file
+            self.upload_manifest.save()
+        entries = [self.upload_manifest.entries[keys[file_path]] for file_path in files]
+        logging.info(f"Files uploaded: {[entry['name'] for entry in entries]}")
+        return _file_parts_content(entries)
+
+    def _clean_files(self,files:list[str]=None):
+        """
+        Delete uploaded files in parallel.
 
-    def _clean_files(self,files_names:list[str]=None):
+        Args:
+            files (list, optional): Local paths of the files to delete the uploads of,
+                all remote files if None.
+        """
         logging.info("Cleaning files")
-        if files_names is None:
-            files_names = [file.name for file in self.client.files.list()]
-        for file in self.client.files.list():
-            logging.info(f"Deleting file: {file.name}")
-            if file.name in files_names:
-                self.client.files.delete(name=file.name)
+        if files is None:
+            files_names = list(self._list_remote_files())
+            self._upload_keys.clear()
+        else:
+            keys = []
+            for file_path in files:
+                # The hash computed when the file was uploaded, the file may have changed since
+                key = self._upload_keys.pop(file_path, None)
+                if key is None:
+                    with open(file_path, "rb") as file:
+                        key = content_hash(file.read())
+                keys.append(key)
+            files_names = list(dict.fromkeys(
+                self.upload_manifest.entries[key]["name"]
+                for key in keys
+                if key in self.upload_manifest.entries
+            ))
+
+        def delete(name):
+            logging.info(f"Deleting file: {name}")
+            self.client.files.delete(name=name)
+
+        if files_names:
+            with ThreadPoolExecutor(max_workers=self.max_upload_workers) as executor:
+                list(executor.map(delete, files_names))
+        if self._remote_files is not None:
+            for name in files_names:
+                self._remote_files.pop(name, None)
+        self.upload_manifest.remove_names(files_names)
+        self.upload_manifest.save()
 
     def _get_config(self):
         agent_config = types.GenerateContentConfig(
@@ -153,10 +246,8 @@ class Agent:
         return agent_config
 
     def _send_message(self, user_message:str=None, files:list = None):
-        messages = self.messages.copy()
         if files:
-            files = self._upload_files(files)
-            messages.append(files)
+            self.messages.append(self._upload_files(files))
 
         if user_message is not None:
             message = types.Content(
@@ -165,13 +256,15 @@ class Agent:
                     types.Part.from_text(text=user_message),
                 ]
             )
-            messages.append(message)
+            self.messages.append(message)
+        self.messages = self.history.compact(self.messages)
         response = self.client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=messages,
+        model=self.model_name,
+        contents=self.messages,
         config=self.config
     )
-        self.messages.append(response)
+        if response.candidates and response.candidates[0].content:
+            self.messages.append(response.candidates[0].content)
         output_tokens = response.model_dump()['usage_metadata']['candidates_token_count']
         input_tokens = response.model_dump()['usage_metadata']['prompt_token_count']
         self.input_tokens += input_tokens
@@ -181,38 +274,29 @@ class Agent:
         return response
 
     
-    def _call_function(self, name, args:dict):
-        return self.avaible_functions[name](**args)
-    
     def _use_tools(self,tool_calls):
+        """
+        Run the tool calls of a turn concurrently.
+
+        The results are added in call order as one user turn answering the model turn
+        with the calls, like in AsyncAgent.
+        """
         for tool_call in tool_calls:
-            name = tool_call.name
-            args = tool_call.args
-            content = types.Content(
-                role="model",
-                parts=[
-                    types.Part.from_function_call(
-                        name=name,
-                        args = args
-                    )
-                ]
-            )
-            self.messages.append(content)
-            logging.info(f"Calling function: {name}")
-            logging.info(f"Function arguments: {args}")
-            
-            result = self._call_function(name, args)
+            logging.info(f"Calling function: {tool_call.name}")
+            logging.info(f"Function arguments: {tool_call.args}")
+        results = run_tool_calls(
+            self.avaible_functions,
+            [(tool_call.name, tool_call.args or {}) for tool_call in tool_calls],
+            self.tool_timeout,
+            self.max_tool_workers,
+        )
+        parts = []
+        for tool_call, result in zip(tool_calls, results):
             logging.info(f"Function result: {result}")
-            content = types.Content(
-                role="user",
-                parts=[
-                    types.Part.from_function_response(
-                        name=name,
-                        response= {"output": result},
-                    )
-                ]
+            parts.append(
+                types.Part.from_function_response(name=tool_call.name, response={"output": result})
             )
-            self.messages.append(content)
+        self.messages.append(types.Content(role="user", parts=parts))
     
     def _bind_tool(self,func) -> dict:
         sig = inspect.signature(func)
@@ -262,6 +346,176 @@ class Agent:
     
 
 
+class AgentSession:
+    """Conversation state of one AsyncAgent session."""
+
+    def __init__(self, config:types.GenerateContentConfig):
+        self.config = config
+        self.messages:list = []
+        self.last_assistant_message = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+
+class AsyncAgent:
+    """
+    Agent on the async Gemini client serving many conversations at the same time.
+
+    The client (and its connection pool), the tools and the upload manifest are shared,
+    the messages and config of every conversation are kept in its own AgentSession.
+    Tools are bound the same way as in Agent.
+
+    Example:
+        >>> agent = AsyncAgent(api_key=google_api_key, tools=[get_measure_expression])
+        >>> session = agent.new_session()
+        >>> response = await agent(session, "What does the Sales table contain?", files=files)
+    """
+
+    _bind_tool = Agent._bind_tool
+    _get_tools_list = Agent._get_tools_list
+    _get_config = Agent._get_config
+
+    def __init__(self,
+                 api_key:str,
+                 model_name:str="gemini-2.0-flash",
+                 tools:list=[],
+                 system_instruction:str="",
+                 temperature:int=1,
+                 upload_manifest_path:str=upload_manifest_path,
+                 max_upload_workers:int=8,
+                 tool_timeout:float=DEFAULT_TOOL_TIMEOUT,
+                 max_tool_workers:int=DEFAULT_MAX_TOOL_WORKERS,
+                 history:GoogleHistory=None,
+    ):
+        self.model_name = model_name
+        self.client = genai.Client(api_key=api_key)
+        self.history = history or GoogleHistory()
+        self.tools = self._get_tools_list(tools)
+        self.temperature = temperature
+        self.system_instruction = system_instruction
+        self.avaible_functions = {f.__name__:f for f in tools}
+        self.tool_timeout = tool_timeout
+        self.max_tool_workers = max_tool_workers
+        self.upload_manifest = UploadManifest(upload_manifest_path or None)
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._upload_slots = asyncio.Semaphore(max_upload_workers)
+        # Uploads running for any session by content hash, so a file is uploaded once
+        self._uploads_in_flight = {}
+        # Remote file listing, fetched at most once per agent
+        self._remote_files = None
+        self._listing_lock = asyncio.Lock()
+
+    def new_session(self) -> AgentSession:
+        return AgentSession(self._get_config())
+
+    async def __call__(self, session:AgentSession, user_message:str=None, files:list=None, update_config:dict=None):
+        config = session.config
+        if update_config:
+            session.config = config.model_copy(update=update_config)
+        try:
+            logging.info(f"User message: {user_message}")
+            if files:
+                session.messages.append(await self._upload_files(files))
+            if user_message is not None:
+                session.messages.append(
+                    types.Content(role="user", parts=[types.Part.from_text(text=user_message)])
+                )
+            response = await self._send_message(session)
+            while response.function_calls:
+                logging.info(f"Tool calls: {response.function_calls}")
+                await self._use_tools(session, response.function_calls)
+                response = await self._send_message(session)
+            if response.text:
+                session.last_assistant_message = response.text
+        finally:
+            session.config = config
+        return response
+
+    async def _send_message(self, session:AgentSession):
+        session.messages = self.history.compact(session.messages)
+        response = await self.client.aio.models.generate_content(
+            model=self.model_name,
+            contents=session.messages,
+            config=session.config,
+        )
+        if response.candidates and response.candidates[0].content:
+            session.messages.append(response.candidates[0].content)
+        usage = response.usage_metadata
+        input_tokens = (usage.prompt_token_count or 0) if usage else 0
+        output_tokens = (usage.candidates_token_count or 0) if usage else 0
+        session.input_tokens += input_tokens
+        session.output_tokens += output_tokens
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        logging.info(f"Input tokens: {input_tokens}")
+        logging.info(f"Output tokens: {output_tokens}")
+        return response
+
+    async def _use_tools(self, session:AgentSession, tool_calls):
+        """Run the tool calls of a turn concurrently, results are added in call order."""
+        for tool_call in tool_calls:
+            logging.info(f"Calling function: {tool_call.name}")
+            logging.info(f"Function arguments: {tool_call.args}")
+        results = await run_tool_calls_async(
+            self.avaible_functions,
+            [(tool_call.name, tool_call.args or {}) for tool_call in tool_calls],
+            self.tool_timeout,
+            self.max_tool_workers,
+        )
+        parts = []
+        for tool_call, result in zip(tool_calls, results):
+            logging.info(f"Function result: {result}")
+            parts.append(
+                types.Part.from_function_response(name=tool_call.name, response={"output": result})
+            )
+        session.messages.append(types.Content(role="user", parts=parts))
+
+    async def _upload_file(self, key:str, file_path:str, file_bytes:bytes):
+        try:
+            async with self._upload_slots:
+                logging.info(f"Uploading file: {os.path.basename(file_path)}")
+                file = await self.client.aio.files.upload(**_upload_arguments(file_path, file_bytes))
+            self.upload_manifest.set(key, _manifest_entry(file))
+            self.upload_manifest.save()
+            if self._remote_files is not None:
+                self._remote_files[file.name] = file
+        finally:
+            self._uploads_in_flight.pop(key, None)
+
+    async def _list_remote_files(self) -> dict:
+        """Remote files by name, listed once for all sessions."""
+        async with self._listing_lock:
+            if self._remote_files is None:
+                pager = await self.client.aio.files.list()
+                self._remote_files = {file.name:file async for file in pager}
+        return self._remote_files
+
+    async def _upload_files(self, files:list) -> types.Content:
+        """
+        Upload the files missing from the upload manifest, at most max_upload_workers at a time.
+
+        Manifest entries are checked against the remote file listing like in Agent.
+        """
+        logging.info("Uploading files")
+        keys = {}
+        uploads = []
+        for file_path in files:
+            key, file_bytes = _read_upload(file_path)
+            keys[file_path] = key
+            entry = self.upload_manifest.get(key)
+            if entry is not None and entry["name"] in await self._list_remote_files():
+                continue
+            if key not in self._uploads_in_flight:
+                self._uploads_in_flight[key] = asyncio.ensure_future(
+                    self._upload_file(key, file_path, file_bytes)
+                )
+            uploads.append(self._uploads_in_flight[key])
+        await asyncio.gather(*uploads)
+        entries = [self.upload_manifest.entries[keys[file_path]] for file_path in files]
+        return _file_parts_content(entries)
+
+
 
 # def addition(no_1:float, no_2:float):
 #     """
@@ -0,0 +1,320 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from pydantic import ValidationError
+from src.agents.powerBI_documenter_agent import (
+    BATCH_SIZE,
+    CONTEXT_MODE,
+    CONTEXT_MODES,
+    CONTEXT_PROFILE,
+    OUTPUT_FORMAT,
+    OUTPUT_FORMATS,
+    SHARED_CONTEXT,
+    TASK_OBJECT_TYPES,
+    CompactObjectDetailsList,
+    ObjectDetailsList,
+    batch_model_context,
+    cache_documentation,
+    cached_documentation,
+    compact_object_ids,
+    documentation_prompt,
+    estimated_context_size,
+    expand_compact_documentation,
+    prompt_objects,
+    reconcile_documentation,
+    split_objects_into_batches,
+)
+from src.infrastructure.llm_clients.base import BATCH_FINAL_STATUSES, LLMClientInterface
+from src.infrastructure.memory_budget import get_memory_budget
+from src.infrastructure.usage_ledger import UsageLedger
+from src.utils.description_cache import DescriptionCache
+from src.utils.dax_dependencies import DependencyGraph
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.tmdl_parser import TmdlObject
+from src.utils.utils import atomic_open
+
+# Seconds between two status checks of a batch job
+POLL_INTERVAL = float(os.getenv("DOCUMENTATION_BATCH_POLL_INTERVAL", "60"))
+# Seconds to wait for a batch job, providers finish them within 24 hours
+BATCH_TIMEOUT = float(os.getenv("DOCUMENTATION_BATCH_TIMEOUT", str(24 * 60 * 60)))
+
+
+@dataclass
+class DocumentationJob:
+    """
+    The documentation requests of a model as one batch job.
+
+    Only the objects of every request are kept; the request bodies, with their model
+    contexts, are built one at a time by documentation_requests and written to the
+    job file.
+
+    Attributes:
+        batches: custom_id mapped to the task and the objects of its request
+        cached: (task, objects, documentation) found in the description cache
+        cache_keys: Description cache keys by object id
+        objects_by_id: custom_id mapped to the objects of its request by their short
+            ID, for requests in the compact output format
+        graph: Dependency graph of the model in "dependencies" context mode
+        batch_files: Every request gets only the files of its objects as the model context
+        context_profile: What is kept of the TMDL text in the model contexts
+    """
+
+    batches: Dict[str, Tuple[str, List[TmdlObject]]] = field(default_factory=dict)
+    cached: List[Tuple[str, List[TmdlObject], ObjectDetailsList]] = field(default_factory=list)
+    cache_keys: Dict[int, str] = field(default_factory=dict)
+    objects_by_id: Dict[str, Dict[str, TmdlObject]] = field(default_factory=dict)
+    graph: Optional[DependencyGraph] = None
+    batch_files: bool = False
+    context_profile: str = CONTEXT_PROFILE
+
+
+def _response_format(output_type=ObjectDetailsList) -> dict:
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": output_type.__name__,
+            "schema": output_type.model_json_schema(),
+        },
+    }
+
+
+async def build_documentation_job(
+    snapshot: ModelSnapshot,
+    model_name: str,
+    tasks: Sequence[str] = tuple(TASK_OBJECT_TYPES),
+    include: set = None,
+    cache: DescriptionCache = None,
+    batch_size: int = BATCH_SIZE,
+    context: str = CONTEXT_MODE,
+    context_profile: str = CONTEXT_PROFILE,
+    shared_context: bool = SHARED_CONTEXT,
+    output_format: str = OUTPUT_FORMAT,
+) -> DocumentationJob:
+    """
+    Plan the documentation requests of a model: the objects and batches call_agent
+    would send, see call_agent for the arguments. The request bodies are built by
+    documentation_requests.
+    """
+    if context not in CONTEXT_MODES:
+        raise ValueError(f"Unknown context mode: {context}")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    compact = output_format == "compact"
+    job = DocumentationJob(
+        graph=DependencyGraph(snapshot.index) if context == "dependencies" else None,
+        batch_files=bool(batch_size) and not shared_context,
+        context_profile=context_profile,
+    )
+    for task in tasks:
+        if task not in TASK_OBJECT_TYPES:
+            raise ValueError(f"Unknown task: {task}")
+        object_type = TASK_OBJECT_TYPES[task]
+        objects = snapshot.index.objects(object_type)
+        if include is not None:
+            objects = [obj for obj in objects if obj.key in include]
+        if cache is not None and objects:
+            cache_keys, cached_objects, documentation, objects = cached_documentation(
+                snapshot, objects, cache, model_name
+            )
+            job.cache_keys.update(cache_keys)
+            if cached_objects:
+                job.cached.append(
+                    (task, cached_objects, ObjectDetailsList(objects_documentation=documentation))
+                )
+        if not objects:
+            continue
+        object_ids = compact_object_ids(snapshot, object_type) if compact else None
+        batches = split_objects_into_batches(objects, batch_size) if batch_size else [objects]
+        for number, batch in enumerate(batches):
+            custom_id = f"{task}/{number}"
+            job.batches[custom_id] = (task, batch)
+            if compact:
+                job.objects_by_id[custom_id] = prompt_objects(batch, object_ids)[1]
+    return job
+
+
+async def documentation_requests(
+    snapshot: ModelSnapshot, job: DocumentationJob
+) -> AsyncIterator[dict]:
+    """
+    Build the request of every batch of a job, one at a time.
+
+    Every request is {"custom_id", "body"} with a chat completion body, see
+    LLMClientInterface.batch_line. Its model context and prompt are built under
+    a reservation of the memory budget, held until the consumer asks for the next
+    request, so at most one request (or what the cap allows) is in memory.
+    """
+    for custom_id, (task, batch) in job.batches.items():
+        object_type = TASK_OBJECT_TYPES[task]
+        objects_by_id = job.objects_by_id.get(custom_id)
+        compact = objects_by_id is not None
+        object_ids = (
+            {obj.key: object_id for object_id, obj in objects_by_id.items()} if compact else None
+        )
+        size = estimated_context_size(snapshot, batch, job.graph, job.batch_files)
+        async with get_memory_budget().reserve(size):
+            model_context = await batch_model_context(
+                snapshot, batch, job.graph, job.batch_files, job.context_profile
+            )
+            system_prompt, request = documentation_prompt(
+                task,
+                model_context,
+                object_type,
+                prompt_objects(batch, object_ids)[0],
+                compact,
+            )
+            del model_context
+            yield {
+                "custom_id": custom_id,
+                "body": {
+                    "messages": [
+                        *({"role": "system", "content": part} for part in system_prompt),
+                        {"role": "user", "content": request},
+                    ],
+                    "temperature": 0,
+                    "response_format": _response_format(
+                        CompactObjectDetailsList if compact else ObjectDetailsList
+                    ),
+                },
+            }
+
+
+async def write_job_file(
+    client: LLMClientInterface, snapshot: ModelSnapshot, job: DocumentationJob, job_file: str
+) -> int:
+    """
+    Write the requests of a job to a JSONL job file as they are built.
+
+    Returns:
+        int: The number of requests written
+    """
+    count = 0
+    with atomic_open(job_file) as f:
+        async for request in documentation_requests(snapshot, job):
+            line = json.dumps(client.batch_line(request)) + "\n"
+            del request
+            await asyncio.to_thread(f.write, line)
+            count += 1
+    return count
+
+
+def _parse_result(result: dict, objects_by_id: Dict[str, TmdlObject] = None) -> ObjectDetailsList:
+    if "error" in result:
+        raise ValueError(f"Request failed: {result['error']}")
+    content = result["response"]["choices"][0]["message"]["content"]
+    if objects_by_id is not None:
+        return expand_compact_documentation(CompactObjectDetailsList.model_validate_json(content), objects_by_id)
+    return ObjectDetailsList.model_validate_json(content)
+
+
+async def run_documentation_job(
+    client: LLMClientInterface,
+    snapshot: ModelSnapshot,
+    job_file: str,
+    on_batch: Callable[[List[TmdlObject], ObjectDetailsList], Awaitable[None]] = None,
+    include: set = None,
+    cache: DescriptionCache = None,
+    ledger: UsageLedger = None,
+    poll_interval: float = None,
+    timeout: float = None,
+    **options,
+) -> Dict[str, ObjectDetailsList]:
+    """
+    Document a model with one provider batch job instead of interactive requests.
+
+    The requests are written to a JSONL job file one at a time, under the memory
+    budget (see documentation_requests), and the file is submitted; the job is polled
+    until it is final and the results are passed to on_batch like call_agent's.
+    Requests that failed or returned invalid documentation are logged and recorded
+    as failed in the ledger, their objects stay undocumented. Returned names are
+    matched to the model like call_agent's results; objects missing from a result
+    are logged, there are no follow-up requests in a batch job.
+
+    Args:
+        client: LLM client with batch support (supports_batches)
+        snapshot: The loaded model
+        job_file: Path of the JSONL job file
+        on_batch: Coroutine function called with the objects and the documentation
+            of every request and of the objects found in the cache
+        include: Keys of the objects to document, all objects if None
+        cache: Description cache, read before and updated after the job
+        ledger: Records the tokens of every request
+        poll_interval: Seconds between two status checks, defaults to POLL_INTERVAL
+        timeout: Seconds to wait for the job, defaults to BATCH_TIMEOUT
+        **options: batch_size, context, context_profile, shared_context and
+            output_format, see call_agent
+
+    Returns:
+        dict: The documentation of every task
+
+    Raises:
+        TypeError: If the client doesn't support batch jobs.
+        TimeoutError: If the job isn't final after timeout seconds.
+    """
+    if not client.supports_batches:
+        raise TypeError(f"{type(client).__name__} doesn't support batch jobs")
+    poll_interval = POLL_INTERVAL if poll_interval is None else poll_interval
+    timeout = BATCH_TIMEOUT if timeout is None else timeout
+    model_name = getattr(client, "model_name", "batch")
+    job = await build_documentation_job(
+        snapshot, model_name, include=include, cache=cache, **options
+    )
+    documentation = {task: [] for task in TASK_OBJECT_TYPES}
+    for task, objects, result in job.cached:
+        documentation[task] += result.objects_documentation
+        if on_batch is not None:
+            await on_batch(objects, result)
+    if not job.batches:
+        return {task: ObjectDetailsList(objects_documentation=items) for task, items in documentation.items()}
+
+    count = await write_job_file(client, snapshot, job, job_file)
+    batch_id = await asyncio.to_thread(client.submit_batch, job_file)
+    logging.info(f"Batch job {batch_id} submitted with {count} requests")
+    started = time.monotonic()
+    while True:
+        status = await asyncio.to_thread(client.poll_batch, batch_id)
+        if status in BATCH_FINAL_STATUSES:
+            break
+        if time.monotonic() - started > timeout:
+            raise TimeoutError(f"Batch job {batch_id} not finished after {timeout} seconds")
+        await asyncio.sleep(poll_interval)
+    if status != "completed":
+        logging.warning(f"Batch job {batch_id} {status}, applying the results it has")
+    results = await asyncio.to_thread(client.fetch_batch, batch_id)
+
+    for custom_id, (task, objects) in job.batches.items():
+        number = int(custom_id.rsplit("/", 1)[1])
+        result = results.get(custom_id, {"error": "no result"})
+        usage = (result.get("response") or {}).get("usage") or {}
+        try:
+            parsed = _parse_result(result, job.objects_by_id.get(custom_id))
+            documented, missing = reconcile_documentation(objects, parsed.objects_documentation)
+        except (ValueError, ValidationError, KeyError, IndexError) as exc:
+            logging.warning(f"Batch request {custom_id} not applied: {exc}")
+            if ledger is not None:
+                ledger.record(task, number, model_name, status="failed")
+            continue
+        if missing:
+            logging.warning(
+                f"Batch request {custom_id}: {len(missing)} objects left undocumented: "
+                + ", ".join(obj.name for obj in missing)
+            )
+        documented = ObjectDetailsList(objects_documentation=documented)
+        if ledger is not None:
+            ledger.record(
+                task,
+                number,
+                model_name,
+                input_tokens=usage.get("prompt_tokens", 0),
+                output_tokens=usage.get("completion_tokens", 0),
+            )
+        if cache is not None:
+            cache_documentation(cache, job.cache_keys, objects, documented)
+        documentation[task] += documented.objects_documentation
+        if on_batch is not None:
+            await on_batch(objects, documented)
+    return {task: ObjectDetailsList(objects_documentation=items) for task, items in documentation.items()}
@@ -0,0 +1,189 @@
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, List
+from google.genai import types
+from src.infrastructure.scheduler import estimate_tokens
+
+# Estimated tokens the resent history may take, 0 keeps the whole history
+DEFAULT_HISTORY_TOKEN_BUDGET = int(os.getenv("AGENT_HISTORY_TOKEN_BUDGET", "0"))
+# Latest turns (a user message and everything after it) that are never compacted
+DEFAULT_HISTORY_KEEP_TURNS = int(os.getenv("AGENT_HISTORY_KEEP_TURNS", "4"))
+# Characters of an older tool result kept when it is summarized
+DEFAULT_TOOL_RESULT_CHARS = int(os.getenv("AGENT_HISTORY_TOOL_RESULT_CHARS", "500"))
+# Ends a summarized tool result, so it is not summarized again
+SUMMARY_MARK = "of an older tool result removed]"
+
+
+class HistoryManager(ABC):
+    """
+    Keeps the history an agent resends on every request under a token budget.
+
+    Pinned messages (the system instruction, uploaded file parts) are always kept and
+    the last keep_last_turns turns are kept verbatim. When the history is over budget,
+    the tool results of older turns are cut to their first max_tool_result_chars
+    characters, then older turns are dropped whole, oldest first, so a tool call is
+    never separated from its result.
+
+    Subclasses tell the message format apart: _size, _is_pinned, _starts_turn and
+    _summarize_tool_result.
+
+    Args:
+        token_budget (int): Estimated tokens the history may take, 0 disables compaction.
+        keep_last_turns (int): Latest turns never compacted.
+        max_tool_result_chars (int): Characters of an older tool result that are kept.
+
+    Example:
+        >>> history = OpenAIHistory(token_budget=8000, keep_last_turns=2)
+        >>> messages = history.compact(messages)
+    """
+
+    def __init__(self,
+                 token_budget: int = DEFAULT_HISTORY_TOKEN_BUDGET,
+                 keep_last_turns: int = DEFAULT_HISTORY_KEEP_TURNS,
+                 max_tool_result_chars: int = DEFAULT_TOOL_RESULT_CHARS,
+    ):
+        self.token_budget = token_budget
+        self.keep_last_turns = keep_last_turns
+        self.max_tool_result_chars = max_tool_result_chars
+
+    def compact(self, messages: List[Any]) -> List[Any]:
+        """
+        Compact a history that is over the token budget.
+
+        Args:
+            messages: The history, oldest message first
+
+        Returns:
+            list: The compacted history, messages itself when it is within the budget
+        """
+        if not self.token_budget:
+            return messages
+        sizes = [self._size(message) for message in messages]
+        if sum(sizes) <= self.token_budget:
+            return messages
+
+        turn_starts = [i for i, message in enumerate(messages) if self._starts_turn(message)]
+        turn_start_set = set(turn_starts)
+        if self.keep_last_turns <= 0:
+            recent_start = len(messages)
+        elif len(turn_starts) >= self.keep_last_turns:
+            recent_start = turn_starts[-self.keep_last_turns]
+        else:
+            recent_start = 0
+
+        # Older turns as lists of [message, size], the messages before the first turn
+        # start form a turn of their own
+        turns = []
+        for i, message in enumerate(messages[:recent_start]):
+            if not turns or i in turn_start_set:
+                turns.append([])
+            if not self._is_pinned(message):
+                message = self._summarize_tool_result(message)
+            turns[-1].append([message, self._size(message)])
+        total = sum(size for turn in turns for _, size in turn) + sum(sizes[recent_start:])
+
+        dropped = 0
+        for turn in turns:
+            if total <= self.token_budget:
+                break
+            kept = []
+            for message, size in turn:
+                if self._is_pinned(message):
+                    kept.append([message, size])
+                else:
+                    total -= size
+                    dropped += 1
+            turn[:] = kept
+
+        compacted = [message for turn in turns for message, _ in turn] + messages[recent_start:]
+        logging.info(
+            f"History compacted from {sum(sizes)} to {total} estimated tokens, "
+            f"{dropped} older messages dropped"
+        )
+        if total > self.token_budget:
+            logging.warning(
+                f"History is still over its budget of {self.token_budget} tokens, "
+                f"the last {self.keep_last_turns} turns and pinned messages are kept whole"
+            )
+        return compacted
+
+    def _shorten(self, text: str) -> str:
+        if len(text) <= self.max_tool_result_chars or text.endswith(SUMMARY_MARK):
+            return text
+        removed = len(text) - self.max_tool_result_chars
+        return f"{text[: self.max_tool_result_chars]}... [{removed} characters {SUMMARY_MARK}"
+
+    @abstractmethod
+    def _size(self, message) -> int:
+        """Estimated tokens of the message."""
+
+    @abstractmethod
+    def _is_pinned(self, message) -> bool:
+        """True for messages that are never dropped."""
+
+    @abstractmethod
+    def _starts_turn(self, message) -> bool:
+        """True for the user message starting a turn."""
+
+    @abstractmethod
+    def _summarize_tool_result(self, message):
+        """The message with its tool result shortened, other messages unchanged."""
+
+
+class OpenAIHistory(HistoryManager):
+    """History of chat completion messages (dicts with role and content)."""
+
+    def _size(self, message: dict) -> int:
+        return estimate_tokens(json.dumps(message, default=str))
+
+    def _is_pinned(self, message: dict) -> bool:
+        return message["role"] == "system"
+
+    def _starts_turn(self, message: dict) -> bool:
+        return message["role"] == "user"
+
+    def _summarize_tool_result(self, message: dict) -> dict:
+        if message["role"] != "tool":
+            return message
+        return {**message, "content": self._shorten(message["content"])}
+
+
+class GoogleHistory(HistoryManager):
+    """
+    History of Gemini types.Content messages.
+
+    The system instruction is part of the request config and never in the history,
+    user messages with uploaded file parts are pinned.
+    """
+
+    def _size(self, message: types.Content) -> int:
+        return estimate_tokens(message.model_dump_json(exclude_none=True))
+
+    def _is_pinned(self, message: types.Content) -> bool:
+        return any(part.file_data is not None for part in message.parts or [])
+
+    def _starts_turn(self, message: types.Content) -> bool:
+        return message.role == "user" and any(
+            part.text is not None for part in message.parts or []
+        )
+
+    def _summarize_tool_result(self, message: types.Content) -> types.Content:
+        parts = message.parts or []
+        if not any(part.function_response is not None for part in parts):
+            return message
+        summarized = []
+        for part in parts:
+            if part.function_response is not None:
+                response = part.function_response.response or {}
+                if set(response) == {"output"} and isinstance(response["output"], str):
+                    response = response["output"]
+                else:
+                    response = json.dumps(response, default=str)
+                part = types.Part.from_function_response(
+                    name=part.function_response.name,
+                    response={"output": self._shorten(response)},
+                )
+            summarized.append(part)
+        return types.Content(role=message.role, parts=summarized)
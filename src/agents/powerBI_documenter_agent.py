@@ -1,21 +1,33 @@
 # %%
 import asyncio
+import contextlib
 from dataclasses import dataclass
 from pydantic_ai import Agent, RunContext
 from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai.providers import openai
+from pydantic_ai.providers.google_gla import GoogleGLAProvider
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai import BinaryContent
 from typing import List
 from pathlib import Path
 import os
+import hashlib
+import logging
+import time
 import nest_asyncio
-from src.utils.utils import (
-    list_files_in_directory,
-    get_objects_from_model,
-)
+from src.utils.utils import list_files_in_directory
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.tmdl_parser import TmdlFile, TmdlObject
+from src.utils.tmdl_minifier import ContextProfile, MinifyReport, get_profile, minify_tmdl
+from src.utils.dax_dependencies import DependencyGraph
+from src.utils.description_cache import DescriptionCache, object_cache_key
+from src.infrastructure.scheduler import estimate_tokens, get_scheduler
+from src.infrastructure.replay import RecordReplayModel, ResponseStore
+from src.infrastructure.usage_ledger import UsageLedger
+from src.infrastructure.context_cache import CachedContextClient, GeminiContextCache
+from src.infrastructure.memory_budget import get_memory_budget
 import logfire
-from typing import Dict, List
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Set, Tuple, Union
 from pydantic import BaseModel, RootModel, Field
 from typing import Dict
 
@@ -24,16 +36,71 @@ from dotenv import find_dotenv, load_dotenv
 load_dotenv(find_dotenv())
 
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
-model = GeminiModel(GEMINI_MODEL, provider="google-gla")
+# "": the model context is sent with every request, "gemini": it is cached on the
+# Gemini API once and referenced by every request
+CONTEXT_CACHE = os.getenv("DOCUMENTATION_CONTEXT_CACHE", "")
+context_cache = None
+if CONTEXT_CACHE == "gemini":
+    context_cache = GeminiContextCache()
+    model = GeminiModel(
+        GEMINI_MODEL,
+        provider=GoogleGLAProvider(http_client=CachedContextClient(context_cache, timeout=600)),
+    )
+elif CONTEXT_CACHE:
+    raise ValueError(f"Unknown context cache: {CONTEXT_CACHE}, expected 'gemini'")
+else:
+    model = GeminiModel(GEMINI_MODEL, provider="google-gla")
+if os.getenv("LLM_REPLAY_DIR"):
+    # Record the LLM responses or replay recorded ones (benchmarks, offline runs)
+    model = RecordReplayModel(
+        ResponseStore(os.getenv("LLM_REPLAY_DIR")),
+        model=model,
+        mode=os.getenv("LLM_REPLAY_MODE", "auto"),
+        latency=float(os.getenv("LLM_REPLAY_LATENCY", "0")),
+    )
+# Number of objects per LLM call, 0 sends all objects of a task in a single call
+BATCH_SIZE = int(os.getenv("DOCUMENTATION_BATCH_SIZE", "0"))
+MAX_CONCURRENCY = int(os.getenv("DOCUMENTATION_MAX_CONCURRENCY", "4"))
+# "files": whole files as the model context, "dependencies": only what the objects reference
+CONTEXT_MODE = os.getenv("DOCUMENTATION_CONTEXT", "files")
+CONTEXT_MODES = ("files", "dependencies")
+# What is kept of the TMDL text in the model context, see tmdl_minifier.PROFILES:
+# "none" sends it as it is, "standard" drops lineage tags, annotations and formatting
+# and cuts M queries, "aggressive" also drops partitions and source columns
+CONTEXT_PROFILE = os.getenv("DOCUMENTATION_CONTEXT_PROFILE", "none")
+# "full": the model returns type, name, source table and description of every object,
+# "compact": the objects get short IDs and the model returns only ID and description
+OUTPUT_FORMAT = os.getenv("DOCUMENTATION_OUTPUT_FORMAT", "full")
+OUTPUT_FORMATS = ("full", "compact")
+# Follow-up rounds requesting the objects missing from a result, and objects per request
+RECONCILE_RETRIES = int(os.getenv("DOCUMENTATION_RECONCILE_RETRIES", "2"))
+RECONCILE_BATCH_SIZE = int(os.getenv("DOCUMENTATION_RECONCILE_BATCH_SIZE", "10"))
+# Send the whole model as the context of every batch in "files" mode, so all requests
+# share it; on by default with a context cache
+SHARED_CONTEXT = os.getenv("DOCUMENTATION_SHARED_CONTEXT", "1" if context_cache else "0") == "1"
+
+
+def context_cache_session():
+    """
+    Scope of a documentation run, the model contexts it cached are deleted at its end.
+
+    Runs open at the same time keep the contexts alive until the last one ends,
+    see ContextCache.session. Does nothing without a context cache.
+    """
+    if context_cache is None:
+        return contextlib.nullcontext()
+    return context_cache.session()
+
 
 logfire.configure(send_to_logfire="if-token-present")
 
+# The prompt is built so that the model context is a byte-identical prefix of every
+# request of a run: context first, then the instructions of the object type, the
+# objects of the batch last in the user message
+documentation_context_template = """{model_context}
+{business_context}"""
+
 documentation_prompt_template = """
-{model_context}
-{business_context}
-<List of {object_type}'s>
-{objects}
-</List of {object_type}'s>
 Your Role: You are the Power BI Documentation Assistant, specifically tasked with generating documentation for {object_type}s. 
 Your primary goal is to produce a list of objects, each detailing a {object_type} with its type, name, source, a varied description, and a confidence score.
 
@@ -70,6 +137,52 @@ The final output must be a single JSON array containing all these objects.
     ```
 """
 
+compact_documentation_prompt_template = """
+Your Role: You are the Power BI Documentation Assistant, specifically tasked with generating documentation for {object_type}s. 
+Your primary goal is to produce a varied description and a confidence score for every {object_type} in <List of {object_type}'s>.
+
+**Mandatory Process for Generating {object_type}'s Documentation:**
+
+
+* **Action:** <List of {object_type}'s> maps every file to its {object_type}s as ID: name. For each {object_type}, using detailed model context provided, construct an object adhering to the `CompactObjectDetails` structure.
+The final output must be a single JSON array containing all these objects.
+* **Content Guidance for Each `CompactObjectDetails` instance:**
+    * `id` (string): The ID of the {object_type} exactly as given in the list, not its name.
+    * `description` (string, 1-2 sentences):
+        - For measures: Clearly explain the measure's conceptual calculation (what it achieves) AND its business purpose or the insight it provides. Avoid overly technical DAX.
+        - For columns: Describe what data the column contains and its business relevance or purpose within the table.
+        - For tables: Explain what business entity or data the table represents and its role in the data model.
+        * **Critical for Quality - Varied Phrasing:** You **must** vary how you start each description. **Strictly avoid repeatedly using phrases like "This {object_type}..."**.
+        * **Techniques for Variety:** Consider starting with the {object_type}'s purpose, the insight it offers, a direct statement, or its nature. Ensure natural language flow.
+    * `confidence` (integer, 0-100): Your confidence score in the accuracy and completeness of the generated `description` based on the information you have.
+* **JSON Output Format:** A single JSON array, where each element is an object matching the `CompactObjectDetails` structure.
+    ```json
+    [
+        {{
+        "id": "m12",
+        "description": "Example description with varied phrasing that explains the {object_type}'s purpose and business value.",
+        "confidence": 95
+        }}
+    ]
+    ```
+"""
+
+documentation_request_template = """{task}
+<List of {object_type}'s>
+{objects}
+</List of {object_type}'s>"""
+
+
+# Cached descriptions are only reused for the prompt they were generated with
+PROMPT_VERSION = hashlib.sha256(
+    (
+        documentation_context_template
+        + documentation_prompt_template
+        + compact_documentation_prompt_template
+        + documentation_request_template
+    ).encode("utf-8")
+).hexdigest()[:12]
+
 
 class ObjectDetails(BaseModel):
     type: str = Field(description="Type of object, e.g., table, measure, column")
@@ -88,44 +201,402 @@ class ObjectDetailsList(BaseModel):
     )
 
 
-async def _prepare_model_context(model_files: list) -> str:
-    """Prepare the model context from files with XML structure."""
-    context_parts = []
+class CompactObjectDetails(BaseModel):
+    id: str = Field(description="ID of the object in the list of objects")
+    description: str = Field(description="Description of the object")
+    confidence: int = Field(
+        description="Confidence score for the description, ranging from 0 to 100"
+    )
+
+
+class CompactObjectDetailsList(BaseModel):
+    objects_documentation: List[CompactObjectDetails] = Field(
+        ...,
+        description="List of object IDs with their descriptions.",
+    )
+
+
+TASK_OBJECT_TYPES = {
+    "measure descriptions": "measure",
+    "column descriptions": "column",
+    "table descriptions": "table",
+}
+
+
+def _minified_file(tmdl_file: TmdlFile, profile: ContextProfile) -> Tuple[str, MinifyReport]:
+    """
+    The minified text of a file and what was removed from it.
+
+    Kept with the file, so every batch and task of a snapshot reuses it and it is
+    dropped with the snapshot (or the file, when a changed file is read again).
+    """
+    key = ("minified", profile)
+    if key not in tmdl_file.derived:
+        report = MinifyReport()
+        text = minify_tmdl(tmdl_file.content, profile, report)
+        if text is tmdl_file.content:
+            # Nothing removed, no second reference to keep
+            return text, report
+        tmdl_file.derived[key] = (text, report)
+    return tmdl_file.derived[key]
+
+
+def _minified(tmdl_file: TmdlFile, profile: ContextProfile) -> str:
+    return _minified_file(tmdl_file, profile)[0]
+
+
+def model_context_report(
+    snapshot: ModelSnapshot, profile: Union[str, ContextProfile] = CONTEXT_PROFILE
+) -> MinifyReport:
+    """What the context profile removes from the files of a model, from the texts the prompts are built from."""
+    profile = get_profile(profile)
+    report = MinifyReport()
+    for tmdl_file in snapshot.tmdl_files():
+        report.update(_minified_file(tmdl_file, profile)[1])
+    return report
+
+
+def _context_fragments(files: Iterable[Tuple[str, str]]) -> Iterator[str]:
+    """
+    The model context as fragments, from (file name, text) pairs.
+
+    The file texts are yielded as they are, so joining the fragments copies every
+    file once, into the context itself.
+    """
+    yield "<model_context>\n"
+    separator = ""
+    for file_name, text in files:
+        yield f"{separator}<file name='{file_name}'>\n"
+        yield text
+        yield "\n</file>"
+        separator = "\n"
+    yield "\n</model_context>"
+
+
+async def _prepare_model_context(
+    snapshot: ModelSnapshot,
+    file_paths: List[str] = None,
+    profile: str = CONTEXT_PROFILE,
+) -> str:
+    """Prepare the model context from files with XML structure.
+
+    If file_paths is given, only these files of the snapshot are included. The
+    files are minified with the context profile.
+    """
+    profile = get_profile(profile)
+    return "".join(
+        _context_fragments(
+            (tmdl_file.file_name, _minified(tmdl_file, profile))
+            for tmdl_file in snapshot.tmdl_files()
+            if file_paths is None or tmdl_file.path in file_paths
+        )
+    )
+
+
+def _declaration_line(content: str, obj: TmdlObject) -> str:
+    line_end = content.find("\n", obj.start)
+    return content[obj.start : line_end if line_end != -1 else len(content)].rstrip()
+
+
+def _prepare_dependency_context(
+    snapshot: ModelSnapshot,
+    graph: DependencyGraph,
+    objects: List[TmdlObject],
+    profile: str = CONTEXT_PROFILE,
+) -> str:
+    """Prepare the model context from the objects and everything they reference.
+
+    Files of documented tables are included whole. Of the other tables only the
+    declaration, the column list and the referenced columns and measures are included.
+    """
+    full_tables = {obj.table for obj in objects if obj.kind == "table"}
+    keys = graph.closure(obj.key for obj in objects)
+    tables = {graph.objects[key].table for key in keys}
+    return "".join(
+        _context_fragments(_dependency_files(snapshot, full_tables, tables, keys, profile))
+    )
+
+
+def _dependency_files(
+    snapshot: ModelSnapshot,
+    full_tables: Set[str],
+    tables: Set[str],
+    keys: Set[str],
+    profile: str,
+) -> Iterator[Tuple[str, str]]:
+    """(file name, text) of the files in a dependency context, see _prepare_dependency_context."""
+    for tmdl_file in snapshot.tmdl_files():
+        file_tables = {obj.table for obj in tmdl_file.tables}
+        if file_tables & full_tables:
+            yield tmdl_file.file_name, _minified(tmdl_file, get_profile(profile))
+        elif file_tables & tables:
+            lines = []
+            for obj in tmdl_file.objects:
+                if obj.kind == "table":
+                    lines.append(_declaration_line(tmdl_file.content, obj))
+                elif obj.key in keys:
+                    lines.append(tmdl_file.text((obj.start, obj.end)).rstrip())
+                elif obj.kind == "column" and obj.table in tables:
+                    lines.append(_declaration_line(tmdl_file.content, obj))
+            # Parts of files differ from batch to batch, they aren't kept with the file
+            yield tmdl_file.file_name, minify_tmdl("\n".join(lines), profile)
+
+
+def split_objects_into_batches(
+    objects: List[TmdlObject], batch_size: int
+) -> List[List[TmdlObject]]:
+    """Split the objects into batches of at most batch_size objects."""
+    return [objects[i : i + batch_size] for i in range(0, len(objects), batch_size)]
 
-    for file in model_files:
-        if isinstance(file, str):
-            file_path = Path(file)
-            if file_path.exists():
-                content = file_path.read_text(encoding="utf-8")
-                context_parts.append(
-                    f"<file name='{file_path.name}'>\n{content}\n</file>"
-                )
 
-    full_context = "\n".join(context_parts)
-    return f"<model_context>\n{full_context}\n</model_context>"
+def _objects_by_file(objects: List[TmdlObject]) -> Dict[str, List[str]]:
+    """Group object names by file name, the format of the object list in the prompt."""
+    objects_by_file = {}
+    for obj in objects:
+        objects_by_file.setdefault(obj.file_name, []).append(obj.name)
+    return objects_by_file
 
 
-async def call_agent(task: str, model_files: list, business_files: list = None) -> str:
-    model_context = await _prepare_model_context(model_files)
-    if task == "measure descriptions":
-        object_type = "measure"
-        objects = await get_objects_from_model(model_files, "measures")
+def compact_object_ids(snapshot: ModelSnapshot, object_type: str) -> Dict[str, str]:
+    """Short IDs of the objects of a type for the compact output format, by object key."""
+    return {
+        obj.key: f"{object_type[0]}{number}"
+        for number, obj in enumerate(snapshot.index.objects(object_type))
+    }
 
-    elif task == "column descriptions":
-        object_type = "column"
-        objects = await get_objects_from_model(model_files, "columns")
 
-    elif task == "table descriptions":
-        object_type = "table"
-        objects = await get_objects_from_model(model_files, "tables")
+def prompt_objects(
+    objects: List[TmdlObject], object_ids: Dict[str, str] = None
+) -> Tuple[dict, Dict[str, TmdlObject]]:
+    """
+    The object list of the prompt and, in compact format, the objects by ID.
+
+    Args:
+        objects: The objects of the request
+        object_ids: IDs by object key (see compact_object_ids), None for the full format
+
+    Returns:
+        tuple: Object names by file name (in compact format object names by ID by
+            file name) and the objects by ID (None in full format)
+    """
+    if object_ids is None:
+        return _objects_by_file(objects), None
+    objects_by_file = {}
+    for obj in objects:
+        objects_by_file.setdefault(obj.file_name, {})[object_ids[obj.key]] = obj.name
+    return objects_by_file, {object_ids[obj.key]: obj for obj in objects}
+
+
+def expand_compact_documentation(
+    result: CompactObjectDetailsList, objects_by_id: Dict[str, TmdlObject]
+) -> ObjectDetailsList:
+    """Map compact documentation back to ObjectDetails, unknown IDs are left out."""
+    documentation = []
+    for item in result.objects_documentation:
+        obj = objects_by_id.get(item.id.strip())
+        if obj is None:
+            continue
+        documentation.append(
+            ObjectDetails(
+                type=obj.kind,
+                name=obj.name,
+                source_table=obj.table,
+                description=item.description,
+                confidence=item.confidence,
+            )
+        )
+    return ObjectDetailsList(objects_documentation=documentation)
+
+
+def _normalize_name(name: str) -> str:
+    """
+    Object name for comparison: surrounding quotes or brackets removed, quote
+    escaping undone and case ignored (TMDL names are case insensitive).
+
+    Example:
+        >>> _normalize_name("'KPI''s name'") == _normalize_name("KPI's name")
+        True
+    """
+    name = name.strip()
+    if len(name) >= 2 and (name[0], name[-1]) in (("'", "'"), ("[", "]")):
+        name = name[1:-1]
+    return name.replace("''", "'").casefold()
+
+
+def _match_documentation(
+    objects: List[TmdlObject], documentation: List[ObjectDetails]
+) -> Dict[int, ObjectDetails]:
+    """
+    Match the documentation returned by the LLM to the requested objects.
+
+    Names are compared normalized (see _normalize_name), items without a
+    description are ignored.
+
+    Returns:
+        dict: The position of the object in objects mapped to its documentation.
+              Items that can't be matched unambiguously are left out.
+    """
+    positions_by_name = {}
+    for position, obj in enumerate(objects):
+        positions_by_name.setdefault(_normalize_name(obj.name), []).append(position)
+    matched = {}
+    for item in documentation:
+        if not item.description.strip():
+            continue
+        positions = positions_by_name.get(_normalize_name(item.name), [])
+        if len(positions) > 1:
+            source_table = _normalize_name(item.source_table.split(".")[0])
+            positions = [
+                p for p in positions if _normalize_name(objects[p].table) == source_table
+            ]
+        if len(positions) == 1:
+            matched[positions[0]] = item
+    return matched
+
+
+def reconcile_documentation(
+    objects: List[TmdlObject], documentation: List[ObjectDetails]
+) -> Tuple[List[ObjectDetails], List[TmdlObject]]:
+    """
+    Compare the documentation returned by the LLM with the requested objects.
+
+    Returns:
+        tuple: The matched documentation with the names (and tables of columns and
+            tables) of the model, and the objects that are missing or invalid
+    """
+    matched = _match_documentation(objects, documentation)
+    documented = []
+    for position in sorted(matched):
+        obj = objects[position]
+        update = {"type": obj.kind, "name": obj.name}
+        if obj.kind != "measure":
+            update["source_table"] = obj.table
+        documented.append(matched[position].model_copy(update=update))
+    missing = [obj for position, obj in enumerate(objects) if position not in matched]
+    return documented, missing
+
+
+def documentation_prompt(
+    task: str, model_context: str, object_type: str, objects: dict, compact: bool = False
+) -> Tuple[List[str], str]:
+    """The system prompt parts (shared model context first) and the user message."""
+    template = compact_documentation_prompt_template if compact else documentation_prompt_template
+    system_prompt = [
+        documentation_context_template.format(
+            model_context=model_context, business_context=""
+        ),
+        template.format(object_type=object_type),
+    ]
+    request = documentation_request_template.format(
+        task=task, object_type=object_type, objects=objects
+    )
+    return system_prompt, request
+
+
+async def batch_model_context(
+    snapshot: ModelSnapshot,
+    batch: List[TmdlObject],
+    graph: DependencyGraph = None,
+    batch_files: bool = False,
+    profile: str = CONTEXT_PROFILE,
+) -> str:
+    """The model context of a batch, see call_agent's context, shared_context and context_profile."""
+    if graph is not None:
+        return _prepare_dependency_context(snapshot, graph, batch, profile)
+    context_files = None
+    if batch_files:
+        context_files = list(dict.fromkeys(obj.path for obj in batch))
+    return await _prepare_model_context(snapshot, context_files, profile)
+
+
+def estimated_context_size(
+    snapshot: ModelSnapshot,
+    batch: List[TmdlObject],
+    graph: DependencyGraph = None,
+    batch_files: bool = False,
+) -> int:
+    """
+    Estimated bytes of a batch's model context and the system prompt formatted from
+    it, before they are built: twice the text of the files the context is made of.
+    """
+    if graph is not None:
+        keys = graph.closure(obj.key for obj in batch)
+        paths = {obj.path for obj in batch} | {graph.objects[key].path for key in keys}
+    elif batch_files:
+        paths = {obj.path for obj in batch}
     else:
-        raise ValueError(f"Unknown task: {task}")
+        paths = None
+    return 2 * sum(
+        len(tmdl_file.content)
+        for tmdl_file in snapshot.tmdl_files()
+        if paths is None or tmdl_file.path in paths
+    )
+
+
+def cached_documentation(
+    snapshot: ModelSnapshot,
+    objects: List[TmdlObject],
+    cache: DescriptionCache,
+    model_name: str = GEMINI_MODEL,
+) -> Tuple[Dict[int, str], List[TmdlObject], List[ObjectDetails], List[TmdlObject]]:
+    """
+    Look the objects up in the description cache.
+
+    Returns:
+        tuple: The cache keys by object id, the cached objects, their documentation
+            and the objects left to document
+    """
+    cache_keys = {
+        id(obj): object_cache_key(
+            snapshot.tmdl_file(obj.path), obj, model_name, PROMPT_VERSION, snapshot.name
+        )
+        for obj in objects
+    }
+    cached = cache.get_many(cache_keys.values())
+    cached_objects = [obj for obj in objects if cache_keys[id(obj)] in cached]
+    documentation = [
+        ObjectDetails.model_validate_json(cached[cache_keys[id(obj)]])
+        for obj in cached_objects
+    ]
+    remaining = [obj for obj in objects if cache_keys[id(obj)] not in cached]
+    return cache_keys, cached_objects, documentation, remaining
+
+
+def cache_documentation(
+    cache: DescriptionCache,
+    cache_keys: Dict[int, str],
+    batch: List[TmdlObject],
+    result: ObjectDetailsList,
+):
+    """Store the documentation of a batch that can be matched to its objects."""
+    matched = _match_documentation(batch, result.objects_documentation)
+    cache.set_many(
+        {
+            cache_keys[id(batch[position])]: item.model_dump_json()
+            for position, item in matched.items()
+        }
+    )
 
-    system_prompt = documentation_prompt_template.format(
-        model_context=model_context,
-        business_context="",
-        object_type=object_type,
-        objects=objects,
+
+async def _run_documentation_agent(
+    task: str,
+    model_context: str,
+    object_type: str,
+    objects: List[TmdlObject],
+    batch: int = 0,
+    ledger: UsageLedger = None,
+    object_ids: Dict[str, str] = None,
+) -> ObjectDetailsList:
+    """
+    Document the objects of one request.
+
+    With object_ids (see compact_object_ids) the compact output format is requested and
+    mapped back to ObjectDetails.
+    """
+    compact = object_ids is not None
+    request_objects, objects_by_id = prompt_objects(objects, object_ids)
+    system_prompt, request = documentation_prompt(
+        task, model_context, object_type, request_objects, compact
     )
 
     power_bi_agent = Agent(
@@ -133,11 +604,245 @@ async def call_agent(task: str, model_files: list, business_files: list = None)
         system_prompt=system_prompt,
         temperature=0,
         instrument=True,
-        output_type=ObjectDetailsList,
+        output_type=CompactObjectDetailsList if compact else ObjectDetailsList,
     )
 
-    result = await power_bi_agent.run(task)
-    return result
+    attempts = 0
+    started = None
+
+    async def run():
+        nonlocal attempts, started
+        attempts += 1
+        started = time.perf_counter()
+        return await power_bi_agent.run(request)
+
+    try:
+        result = await get_scheduler().run(
+            run, estimated_tokens=estimate_tokens("".join(system_prompt) + request)
+        )
+    except Exception:
+        if ledger is not None:
+            ledger.record(
+                task,
+                batch,
+                power_bi_agent.model.model_name,
+                latency=time.perf_counter() - started if started else 0,
+                retries=max(0, attempts - 1),
+                status="failed",
+            )
+        raise
+    if ledger is not None:
+        usage = result.usage()
+        ledger.record(
+            task,
+            batch,
+            power_bi_agent.model.model_name,
+            input_tokens=usage.request_tokens or 0,
+            output_tokens=usage.response_tokens or 0,
+            latency=time.perf_counter() - started,
+            retries=attempts - 1,
+        )
+    if compact:
+        return expand_compact_documentation(result.output, objects_by_id)
+    return result.output
+
+
+async def _request_missing_objects(
+    task: str,
+    model_context: str,
+    object_type: str,
+    objects: List[TmdlObject],
+    result: ObjectDetailsList,
+    batch: int = 0,
+    ledger: UsageLedger = None,
+    retries: int = RECONCILE_RETRIES,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    object_ids: Dict[str, str] = None,
+) -> ObjectDetailsList:
+    """
+    Request the objects missing from a result again, in small follow-up requests.
+
+    Objects whose name is missing from the result, can't be matched or has no
+    description are requested again with the same model context, at most
+    batch_size per request, for up to retries rounds. A failed follow-up request
+    is logged, its objects stay missing.
+
+    Returns:
+        ObjectDetailsList: The documentation of the objects, with the model's names
+    """
+    documented, missing = reconcile_documentation(objects, result.objects_documentation)
+    for _ in range(retries):
+        if not missing:
+            break
+        logging.info(
+            f"{task}: {len(missing)} objects missing from batch {batch}, requesting them again"
+        )
+        follow_ups = await asyncio.gather(
+            *(
+                _run_documentation_agent(
+                    task,
+                    model_context,
+                    object_type,
+                    chunk,
+                    batch=batch,
+                    ledger=ledger,
+                    object_ids=object_ids,
+                )
+                for chunk in split_objects_into_batches(missing, batch_size)
+            ),
+            return_exceptions=True,
+        )
+        items = []
+        for follow_up in follow_ups:
+            if isinstance(follow_up, Exception):
+                logging.warning(f"{task}: follow-up request of batch {batch} failed: {follow_up}")
+            else:
+                items += follow_up.objects_documentation
+        found, missing = reconcile_documentation(missing, items)
+        documented += found
+    if missing:
+        logging.warning(
+            f"{task}: {len(missing)} objects of batch {batch} left undocumented: "
+            + ", ".join(obj.name for obj in missing)
+        )
+    return ObjectDetailsList(objects_documentation=documented)
+
+
+async def call_agent(
+    task: str,
+    model_files: list = None,
+    business_files: list = None,
+    snapshot: ModelSnapshot = None,
+    batch_size: int = BATCH_SIZE,
+    max_concurrency: int = MAX_CONCURRENCY,
+    cache: DescriptionCache = None,
+    include: Set[str] = None,
+    ledger: UsageLedger = None,
+    context: str = CONTEXT_MODE,
+    context_profile: str = CONTEXT_PROFILE,
+    shared_context: bool = SHARED_CONTEXT,
+    reconcile_retries: int = RECONCILE_RETRIES,
+    output_format: str = OUTPUT_FORMAT,
+    on_batch: Callable[[List[TmdlObject], ObjectDetailsList], Awaitable[None]] = None,
+) -> ObjectDetailsList:
+    """
+    Generate documentation for all objects of the type the task is about.
+
+    Args:
+        task: One of "measure descriptions", "column descriptions" or "table descriptions"
+        model_files: TMDL files of the model, used when no snapshot is given
+        business_files: Business context files (currently unused)
+        snapshot: The loaded model
+        batch_size: If set, the objects are documented in batches of this size, each
+            batch with only the files containing its objects as the model context
+        max_concurrency: Maximum number of batches sent to the LLM at the same time
+        cache: Cache of descriptions, objects whose definition did not change since
+            they were documented are taken from it instead of the LLM
+        include: Keys (TmdlObject.key) of the objects to document, all objects if None
+        ledger: Records the tokens, latency, retries and cost of every LLM request
+        context: "files" sends whole files as the model context (all files, or the
+            files of the batch's objects when batching), "dependencies" only the
+            objects of the batch, what their DAX references and the column lists of
+            the tables involved
+        context_profile: What is kept of the TMDL text in the model context, one of
+            tmdl_minifier.PROFILES ("none", "standard" or "aggressive")
+        shared_context: Send the model context of all files with every batch, as a
+            prefix the provider can cache
+        reconcile_retries: Follow-up rounds requesting the objects missing from a result
+        output_format: "full" has the model repeat type, name and source table of
+            every object, "compact" gives the objects short IDs and has the model
+            return only ID, description and confidence, mapped back with the model index
+        on_batch: Coroutine function called with the objects and the documentation of
+            every finished batch (and of the objects found in the cache), so results
+            can be used before the whole task is done
+
+    Returns:
+        ObjectDetailsList: Documentation of all objects, merged over all batches
+    """
+    if snapshot is None:
+        snapshot = ModelSnapshot.from_files(model_files)
+    if task not in TASK_OBJECT_TYPES:
+        raise ValueError(f"Unknown task: {task}")
+    if context not in CONTEXT_MODES:
+        raise ValueError(f"Unknown context mode: {context}")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    context_profile = get_profile(context_profile)
+    object_type = TASK_OBJECT_TYPES[task]
+
+    objects = snapshot.index.objects(object_type)
+    if include is not None:
+        objects = [obj for obj in objects if obj.key in include]
+        if not objects:
+            return ObjectDetailsList(objects_documentation=[])
+    documentation = []
+    cache_keys = {}
+    if cache is not None:
+        cache_keys, cached_objects, documentation, objects = cached_documentation(
+            snapshot, objects, cache
+        )
+        logging.info(
+            f"{task}: {len(documentation)} objects found in cache, {len(objects)} to document"
+        )
+        if on_batch is not None and cached_objects:
+            await on_batch(
+                cached_objects, ObjectDetailsList(objects_documentation=documentation)
+            )
+        if not objects:
+            return ObjectDetailsList(objects_documentation=documentation)
+
+    if batch_size:
+        batches = split_objects_into_batches(objects, batch_size)
+    else:
+        batches = [objects]
+    semaphore = asyncio.Semaphore(max_concurrency)
+    graph = DependencyGraph(snapshot.index) if context == "dependencies" else None
+    object_ids = compact_object_ids(snapshot, object_type) if output_format == "compact" else None
+
+    batch_files = bool(batch_size) and not shared_context
+
+    async def run_batch(number: int, batch: List[TmdlObject]) -> ObjectDetailsList:
+        # The context and the prompts are only held while the batch's requests run,
+        # under the memory cap of all tasks (DOCUMENTATION_MEMORY_CAP_MB)
+        context_size = estimated_context_size(snapshot, batch, graph, batch_files)
+        async with semaphore, get_memory_budget().reserve(context_size):
+            model_context = await batch_model_context(
+                snapshot, batch, graph, batch_files, context_profile
+            )
+            result = await _run_documentation_agent(
+                task,
+                model_context,
+                object_type,
+                batch,
+                batch=number,
+                ledger=ledger,
+                object_ids=object_ids,
+            )
+            result = await _request_missing_objects(
+                task,
+                model_context,
+                object_type,
+                batch,
+                result,
+                batch=number,
+                ledger=ledger,
+                retries=reconcile_retries,
+                object_ids=object_ids,
+            )
+            del model_context
+        if cache is not None:
+            cache_documentation(cache, cache_keys, batch, result)
+        if on_batch is not None:
+            await on_batch(batch, result)
+        return result
+
+    results = await asyncio.gather(
+        *(run_batch(number, batch) for number, batch in enumerate(batches))
+    )
+    return ObjectDetailsList(
+        objects_documentation=documentation
+        + [item for result in results for item in result.objects_documentation]
+    )
 
 
 class MeasureDocumentationOutput(BaseModel):
@@ -0,0 +1,81 @@
+import asyncio
+import functools
+import inspect
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+# Seconds a single tool call may take before the model gets a timeout error instead
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("AGENT_TOOL_TIMEOUT", "60"))
+DEFAULT_MAX_TOOL_WORKERS = int(os.getenv("AGENT_MAX_TOOL_WORKERS", "8"))
+
+
+async def run_tool_calls_async(
+    functions: Dict[str, Callable],
+    calls: List[Tuple[str, dict]],
+    timeout: float = DEFAULT_TOOL_TIMEOUT,
+    max_workers: int = DEFAULT_MAX_TOOL_WORKERS,
+) -> List[Any]:
+    """
+    Run the tool calls of one model turn concurrently.
+
+    Coroutine functions are awaited together, other functions run on a thread pool.
+    A call running longer than the timeout gets {"error": ...} as its result, so the
+    model can go on without it.
+
+    Args:
+        functions: The tools by name
+        calls: (tool name, arguments) of every call, in the order the model made them
+        timeout: Seconds every single call may take
+        max_workers: Threads running the synchronous tools
+
+    Returns:
+        list: The results in the order of the calls
+
+    Raises:
+        Exception: The first error raised by a tool, in call order, after all calls finished.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def run(name, args):
+        function = functions[name]
+        if inspect.iscoroutinefunction(function):
+            call = function(**args)
+        else:
+            call = loop.run_in_executor(executor, functools.partial(function, **args))
+        try:
+            return await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Tool {name} timed out after {timeout}s")
+            return {"error": f"Tool {name} timed out after {timeout} seconds"}
+
+    try:
+        results = await asyncio.gather(
+            *(run(name, args) for name, args in calls), return_exceptions=True
+        )
+    finally:
+        # Don't wait for threads of timed out calls
+        executor.shutdown(wait=False, cancel_futures=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+def run_tool_calls(
+    functions: Dict[str, Callable],
+    calls: List[Tuple[str, dict]],
+    timeout: float = DEFAULT_TOOL_TIMEOUT,
+    max_workers: int = DEFAULT_MAX_TOOL_WORKERS,
+) -> List[Any]:
+    """Synchronous version of run_tool_calls_async, also usable when an event loop is running."""
+    coroutine = run_tool_calls_async(functions, calls, timeout, max_workers)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Called from a running event loop (e.g. a notebook), run in a separate thread
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
@@ -0,0 +1,277 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+import httpx
+
+GEMINI_API_ROOT = "https://generativelanguage.googleapis.com/v1beta"
+DEFAULT_CACHE_TTL = int(os.getenv("DOCUMENTATION_CONTEXT_CACHE_TTL", "3600"))
+# Cached contexts are created again this many seconds before their TTL ends
+REFRESH_MARGIN = 60
+# Responses to a request with a cachedContent the provider no longer knows
+MISSING_CACHE_STATUSES = (403, 404)
+# Requests whose system instruction starts with this are sent with the cached context
+MODEL_CONTEXT_TAG = "<model_context>"
+# Request fields a provider requires in the cached content instead of the request
+CACHED_REQUEST_FIELDS = ("tools", "toolConfig")
+
+
+class ContextCache(ABC):
+    """
+    Provider side cache of the model context shared by the documentation requests.
+
+    A context is cached once and referenced by name by every request using it.
+    Requests for the same context running at the same time wait for a single creation.
+    If the provider refuses to cache a context (e.g. it is below the minimum size),
+    None is returned and the context is sent with every request as before; it is
+    tried again once the TTL has passed.
+
+    A cached context is created again shortly before its TTL ends, so long runs
+    (watch mode, fleets) never reference an expired one; a context the provider
+    lost anyway is dropped with `invalidate`. The contexts are deleted when the
+    last open `session` ends.
+
+    Subclasses implement _create and _delete.
+
+    Args:
+        ttl (int): Seconds the provider keeps a cached context.
+        clock (callable): Returns the current time in seconds.
+
+    Example:
+        >>> cache = LocalContextCache()
+        >>> async with cache.session():
+        ...     name = await cache.reference("gemini-2.0-flash", model_context)
+    """
+
+    def __init__(self, ttl: int = DEFAULT_CACHE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.names: Dict[str, Optional[str]] = {}
+        self.references = 0
+        self._expires_at: Dict[str, float] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._sessions = 0
+
+    @staticmethod
+    def key(model_name: str, context: str, config: dict = None) -> str:
+        payload = json.dumps([model_name, context, config], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def reference(self, model_name: str, context: str, config: dict = None) -> Optional[str]:
+        """
+        The name of the cached context, created on first use.
+
+        Args:
+            model_name: The model the context is cached for
+            context: The shared prefix of the requests
+            config: Request fields cached with the context (e.g. tools)
+
+        Returns:
+            str: The name to reference the context with, None if it could not be cached
+        """
+        key = self.key(model_name, context, config)
+        if key in self.names and self.clock() >= self._expires_at[key]:
+            # The provider deletes it by itself when the TTL ends
+            self._forget(key)
+        if key not in self.names:
+            if key not in self._in_flight:
+                self._in_flight[key] = asyncio.ensure_future(
+                    self._create_once(key, model_name, context, config)
+                )
+            await asyncio.shield(self._in_flight[key])
+        name = self.names[key]
+        if name is not None:
+            self.references += 1
+        return name
+
+    async def _create_once(self, key, model_name, context, config):
+        # The TTL starts before the provider receives the context
+        self._expires_at[key] = self.clock() + self.ttl - min(REFRESH_MARGIN, self.ttl / 2)
+        try:
+            self.names[key] = await self._create(model_name, context, config)
+            logging.info(f"Model context cached as {self.names[key]}")
+        except Exception as exc:
+            logging.warning(f"Model context not cached, it is sent with every request: {exc}")
+            self.names[key] = None
+        finally:
+            self._in_flight.pop(key, None)
+
+    def _forget(self, key: str):
+        self.names.pop(key, None)
+        self._expires_at.pop(key, None)
+
+    def invalidate(self, name: str):
+        """Drop a cached context the provider no longer knows, the next reference creates it again."""
+        for key in [key for key, cached in self.names.items() if cached == name]:
+            self._forget(key)
+
+    async def clear(self):
+        """Delete the cached contexts, before their TTL expires."""
+        names = [name for name in self.names.values() if name is not None]
+        self.names = {}
+        self._expires_at = {}
+        results = await asyncio.gather(*(self._delete(name) for name in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Cached model context {name} not deleted, it expires with its TTL: {result}")
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        Scope of a documentation run, the contexts are deleted when the last open session ends.
+
+        Runs sharing the cache at the same time (e.g. the models of a fleet) keep
+        the contexts alive for each other.
+        """
+        self._sessions += 1
+        try:
+            yield self
+        finally:
+            self._sessions -= 1
+            if not self._sessions:
+                await self.clear()
+
+    @abstractmethod
+    async def _create(self, model_name: str, context: str, config: Optional[dict]) -> str:
+        """Cache the context on the provider side, return its name."""
+
+    @abstractmethod
+    async def _delete(self, name: str):
+        """Delete a cached context."""
+
+
+class LocalContextCache(ContextCache):
+    """In-memory stand-in for a provider cache, for tests and offline runs."""
+
+    def __init__(self, ttl: int = DEFAULT_CACHE_TTL, clock=time.monotonic):
+        super().__init__(ttl, clock)
+        self.contexts: Dict[str, dict] = {}
+
+    async def _create(self, model_name, context, config):
+        name = f"cachedContents/local-{len(self.contexts)}"
+        self.contexts[name] = {"model": model_name, "context": context, "config": config}
+        return name
+
+    async def _delete(self, name):
+        self.contexts.pop(name, None)
+
+
+class GeminiContextCache(ContextCache):
+    """
+    Context cache on the Gemini API (cachedContents).
+
+    Args:
+        api_key (str, optional): Gemini API key, defaults to GEMINI_API_KEY.
+        ttl (int): Seconds Gemini keeps a cached context.
+        http_client (httpx.AsyncClient, optional): Client sending the cache requests.
+    """
+
+    def __init__(self, api_key: str = None, ttl: int = DEFAULT_CACHE_TTL, http_client: httpx.AsyncClient = None):
+        super().__init__(ttl)
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.http_client = http_client or httpx.AsyncClient(timeout=600)
+
+    async def _create(self, model_name, context, config):
+        body = {
+            "model": f"models/{model_name}",
+            "contents": [{"role": "user", "parts": [{"text": context}]}],
+            "ttl": f"{self.ttl}s",
+            **(config or {}),
+        }
+        response = await self.http_client.post(
+            f"{GEMINI_API_ROOT}/cachedContents",
+            json=body,
+            headers={"X-Goog-Api-Key": self.api_key},
+        )
+        response.raise_for_status()
+        return response.json()["name"]
+
+    async def _delete(self, name):
+        response = await self.http_client.delete(
+            f"{GEMINI_API_ROOT}/{name}", headers={"X-Goog-Api-Key": self.api_key}
+        )
+        response.raise_for_status()
+
+
+class CachedContextClient(httpx.AsyncClient):
+    """
+    HTTP client for pydantic-ai's GeminiModel sending the model context by reference.
+
+    A generateContent request whose first system instruction part is a model context
+    is sent with cachedContent instead: the context, the tools and the tool config
+    are cached with the context cache (Gemini doesn't allow them next to a cached
+    content) and the remaining system instruction parts are sent in front of the
+    first user message. A request the provider answers with a missing cached
+    content (e.g. deleted before its TTL ended) is sent once more with the context
+    cached again.
+
+    Args:
+        context_cache (ContextCache): Where the contexts are cached.
+        **kwargs: Arguments of httpx.AsyncClient.
+
+    Example:
+        >>> client = CachedContextClient(GeminiContextCache(), timeout=600)
+        >>> model = GeminiModel("gemini-2.0-flash", provider=GoogleGLAProvider(http_client=client))
+    """
+
+    def __init__(self, context_cache: ContextCache, **kwargs):
+        super().__init__(**kwargs)
+        self.context_cache = context_cache
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        if request.method != "POST" or not request.url.path.endswith(":generateContent"):
+            return await super().send(request, **kwargs)
+        cached_request, name = await self._with_cached_context(request)
+        response = await super().send(cached_request, **kwargs)
+        if name is not None and response.status_code in MISSING_CACHE_STATUSES:
+            await response.aclose()
+            logging.warning(f"Cached model context {name} not found, caching it again")
+            self.context_cache.invalidate(name)
+            cached_request, name = await self._with_cached_context(request)
+            response = await super().send(cached_request, **kwargs)
+        return response
+
+    async def _with_cached_context(self, request: httpx.Request) -> Tuple[httpx.Request, Optional[str]]:
+        """The request sent with the cached context and the name of the context, None if not cached."""
+        body = json.loads(request.content)
+        system_parts = body.get("systemInstruction", {}).get("parts", [])
+        if not system_parts or not system_parts[0].get("text", "").startswith(MODEL_CONTEXT_TAG):
+            return request, None
+        model_name = request.url.path.rsplit("/", 1)[-1].split(":")[0]
+        config = {field: body[field] for field in CACHED_REQUEST_FIELDS if field in body}
+        name = await self.context_cache.reference(model_name, system_parts[0]["text"], config)
+        if name is None:
+            return request, None
+
+        cached_body = {
+            field: value
+            for field, value in body.items()
+            if field != "systemInstruction" and field not in CACHED_REQUEST_FIELDS
+        }
+        contents = cached_body.get("contents", [])
+        instructions = system_parts[1:]
+        if instructions:
+            if contents and contents[0].get("role") == "user":
+                contents = [{**contents[0], "parts": instructions + contents[0]["parts"]}] + contents[1:]
+            else:
+                contents = [{"role": "user", "parts": instructions}] + contents
+        cached_body["contents"] = contents
+        cached_body["cachedContent"] = name
+        headers = {
+            header: value
+            for header, value in request.headers.items()
+            if header.lower() != "content-length"
+        }
+        cached_request = self.build_request(
+            request.method,
+            request.url,
+            content=json.dumps(cached_body).encode("utf-8"),
+            headers=headers,
+            extensions=request.extensions,
+        )
+        return cached_request, name
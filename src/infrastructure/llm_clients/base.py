@@ -1,13 +1,23 @@
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Optional
 
+# Batch job statuses after which the job doesn't change anymore
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
 class LLMClientInterface(ABC):
     """Interface for LLM clients.
 
     This interface defines the methods that any LLM client must implement.
     It allows for different LLM clients to be used interchangeably in the codebase.
+
+    Clients of providers with a batch endpoint also implement batch_line, submit_batch,
+    poll_batch and fetch_batch, to send many requests as one cheaper job without interactive latency,
+    and set supports_batches; callers check it before submitting a job.
     """
 
+    # True for clients implementing the batch methods
+    supports_batches: bool = False
+
     @abstractmethod
     def send_message(self,
                      messages: List[Dict[str, Any]],
@@ -16,11 +26,43 @@ class LLMClientInterface(ABC):
                      **kwargs) -> Dict[str, Any]:
         """Send a message to the LLM and return the response."""
         pass
-    def get_client(api_key: str, **kwargs) -> Any:
+    def get_client(self, api_key: str, **kwargs) -> Any:
         """Get the LLM client instance."""
         pass
-    
+
 
     def get_tools_list(self,tools:List[callable]) -> List[Dict[str, Any]]:
         """Get the tools list."""
-        pass
\ No newline at end of file
+        pass
+
+    def batch_line(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The line of the JSONL job file of one request.
+
+        Args:
+            request: {"custom_id": str, "body": dict}, the body being the request of
+                send_message in the provider's format
+        """
+        raise NotImplementedError(f"{type(self).__name__} doesn't support batch jobs")
+
+    def submit_batch(self, job_file: str) -> str:
+        """
+        Submit a JSONL job file of batch_line lines as a batch job.
+
+        Returns:
+            str: The id of the batch job
+        """
+        raise NotImplementedError(f"{type(self).__name__} doesn't support batch jobs")
+
+    def poll_batch(self, batch_id: str) -> str:
+        """The status of a batch job, final once in BATCH_FINAL_STATUSES."""
+        raise NotImplementedError(f"{type(self).__name__} doesn't support batch jobs")
+
+    def fetch_batch(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        The results of a finished batch job.
+
+        Returns:
+            dict: custom_id mapped to {"response": response body} or {"error": error}
+        """
+        raise NotImplementedError(f"{type(self).__name__} doesn't support batch jobs")
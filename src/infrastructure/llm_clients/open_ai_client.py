@@ -1,16 +1,28 @@
 from src.infrastructure.llm_clients.base import LLMClientInterface
 from openai import OpenAI
+import inspect
+import json
+import logging
+
+# Endpoint the batch job requests are sent to
+BATCH_ENDPOINT = "/v1/chat/completions"
 
 class OpenAiClient(LLMClientInterface):
     """OpenAI LLM client."""
 
+    supports_batches = True
+
     def __init__(self, api_key: str, **kwargs):
         """Initialize the OpenAI client."""
         self.api_key:str = api_key
         self.base_url = kwargs.get("base_url", "https://api.openai.com/v1/")
         self.model_name:str = kwargs.get("model_name", "gpt-3.5-turbo")
         self.temperature:int = kwargs.get("temperature", 1)
-        self.client:OpenAI = self.get_client(api_key, **kwargs)
+        self.completion_window:str = kwargs.get("completion_window", "24h")
+        self.client:OpenAI = self.get_client(api_key, base_url=self.base_url)
+
+    def get_client(self, api_key: str, **kwargs) -> OpenAI:
+        return OpenAI(api_key=api_key, base_url=kwargs.get("base_url"))
 
     def send_message(self, messages:list[dict]=None, tools:list[dict]=None, temperature:int=None):
         completion = self.client.beta.chat.completions.parse(
@@ -18,66 +30,61 @@ class OpenAiClient(LLMClientInterface):
             model = self.model_name,
             tools=tools,
             tool_choice="auto",
-            temperature = temperature
+            temperature = self.temperature if temperature is None else temperature
         )
         response = completion.choices[0].message
         return response
-    
-    def __init__(self, 
-                 llm_interface:LLMClientInterface = None,
-                 client_base_url:str = None,
-                 model_name:str="gemini-2.0-flash", 
-                 tools:list=[], 
-                 system_instruction:str="",
-                 temperature:int=1,
-                 keep_chat_history:bool = True,
-    ):
-        
-        self.model_name = model_name
-        self.client:LLMClientInterface = llm_interface
-        self.tools:list = self._get_tools_list(tools)
-        self.messages:list = [
-        {"role": "system", "content": system_instruction}
-        ]
-        self.temperature = temperature
-        self.avaible_functions = {f.__name__:f for f in tools}
-        self.keep_chat_history = keep_chat_history
 
-    def __call__(self, message:str):
-        log.info(f"User message: {message}")
-        response = self.client.send_message(messages=self.messages, tools=self.tools, temperature=self.temperature)
-        self.messages.append(response)
-        while self.messages[-1].tool_calls:
-            log.info(f"Tool calls: {self.messages[-1].tool_calls}")
-            self._use_tools(self.messages[-1].tool_calls)
-            self._send_message()
-        if self.messages[-1].content:
-            print(self.messages[-1].content)
-        if not self.keep_chat_history:
-            self.messages = self.messages[0]
+    def batch_line(self, request: dict) -> dict:
+        return {
+            "custom_id": request["custom_id"],
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {"model": self.model_name, **request["body"]},
+        }
+
+    def submit_batch(self, job_file: str) -> str:
+        with open(job_file, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def poll_batch(self, batch_id: str) -> str:
+        batch = self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts is not None:
+            logging.info(
+                f"Batch job {batch_id}: {batch.status}, {counts.completed}/{counts.total} "
+                f"completed, {counts.failed} failed"
+            )
+        return batch.status
 
+    def fetch_batch(self, batch_id: str) -> dict:
+        batch = self.client.batches.retrieve(batch_id)
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                if item.get("error") or response.get("status_code", 200) != 200:
+                    results[item["custom_id"]] = {
+                        "error": item.get("error") or response.get("body")
+                    }
+                else:
+                    results[item["custom_id"]] = {"response": response["body"]}
+        return results
 
-    
-    def _call_function(self, name, args:dict):
-        return self.avaible_functions[name](**args)
-    
-    def _use_tools(self,tool_calls):
-        for tool_call in tool_calls:
-            name = tool_call.function.name
-            log.info(f"Calling function: {name}")
-            log.info(f"Function arguments: {tool_call.function.arguments}")
-            args = json.loads(tool_call.function.arguments)
-            result = self._call_function(name, args)
-            self.messages.append({"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(result)}
-    )
+    def get_tools_list(self, tools:list) -> list[dict]:
+        return [self._bind_tool(tool) for tool in tools]
 
-    def _get_client(self, ) ->OpenAI:
-        client = OpenAI(
-            api_key=google_api_key,
-            base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-        )
-        return client
-    
     def _bind_tool(self,func) -> dict:
         sig = inspect.signature(func)
         required = []
@@ -93,7 +100,6 @@ class OpenAiClient(LLMClientInterface):
         for _, param in sig.parameters.items():
             # Use annotation if available, else default to string
             arg_name = param.name
-            param_type = param.annotation.__name__ 
             param_type = type_mapping.get(param.annotation)
             if param_type is None:
                 exception_message = f"Unsupported type: {param.annotation}"
@@ -117,11 +123,3 @@ class OpenAiClient(LLMClientInterface):
         }
     }
         return tool_dict
-    
-    def _get_tools_list(self,unbinded_tools):
-        tools = []
-        for tool in unbinded_tools:
-            binded_tool = self._bind_tool(tool)
-            tools.append(binded_tool)
-        return tools
-    
\ No newline at end of file
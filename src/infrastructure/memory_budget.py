@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class MemoryMetrics:
+    """Counters of a MemoryBudget, sizes in bytes."""
+
+    in_use: int = 0
+    peak: int = 0
+    waits: int = 0
+
+
+class MemoryBudget:
+    """
+    Bounds the memory of the large buffers (model contexts and the prompts built
+    from them) held at the same time.
+
+    A request reserves the estimated size of its buffers before building them and
+    releases it when it is done; requests that don't fit wait for others to finish,
+    in the order they arrived. A request larger than the whole cap runs once nothing
+    else is reserved, so it can't wait forever.
+
+    Args:
+        cap (int): Maximum bytes reserved at the same time, 0 for no cap.
+
+    Example:
+        >>> budget = MemoryBudget(cap=512 * 2**20)
+        >>> async with budget.reserve(estimated_size):
+        ...     context = build_context()
+    """
+
+    def __init__(self, cap: int = 0):
+        self.cap = cap
+        self.metrics = MemoryMetrics()
+        self._loop = None
+        self._condition: asyncio.Condition = None
+        self._queue = []
+
+    def _bind_loop(self):
+        # asyncio primitives belong to one event loop, a new run gets new ones
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._condition = asyncio.Condition()
+            self._queue = []
+
+    def _fits(self, size: int) -> bool:
+        return not self.cap or self.metrics.in_use == 0 or self.metrics.in_use + size <= self.cap
+
+    async def acquire(self, size: int):
+        """Wait until size bytes fit under the cap and reserve them."""
+        self._bind_loop()
+        async with self._condition:
+            ticket = object()
+            self._queue.append(ticket)
+            if self._queue[0] is not ticket or not self._fits(size):
+                self.metrics.waits += 1
+            try:
+                await self._condition.wait_for(
+                    lambda: self._queue[0] is ticket and self._fits(size)
+                )
+            finally:
+                self._queue.remove(ticket)
+                # The next request in line may fit now
+                self._condition.notify_all()
+            self.metrics.in_use += size
+            self.metrics.peak = max(self.metrics.peak, self.metrics.in_use)
+
+    async def release(self, size: int):
+        async with self._condition:
+            self.metrics.in_use -= size
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        """Reserve size bytes for the duration of the block."""
+        await self.acquire(size)
+        try:
+            yield
+        finally:
+            await self.release(size)
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident memory of the process in bytes, None where it isn't available (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+_memory_budget: Optional[MemoryBudget] = None
+
+
+def get_memory_budget() -> MemoryBudget:
+    """
+    Return the process-wide memory budget, created on first use.
+
+    The cap is read from DOCUMENTATION_MEMORY_CAP_MB (0 or unset for no cap).
+    """
+    global _memory_budget
+    if _memory_budget is None:
+        cap_mb = int(os.getenv("DOCUMENTATION_MEMORY_CAP_MB") or 0)
+        _memory_budget = MemoryBudget(cap_mb * 2**20)
+    return _memory_budget
+
+
+def set_memory_budget(budget: Optional[MemoryBudget]):
+    """Replace the process-wide memory budget, None recreates it from the environment on next use."""
+    global _memory_budget
+    _memory_budget = budget
@@ -0,0 +1,235 @@
+import asyncio
+import dataclasses
+import hashlib
+import json
+import os
+import time
+from typing import Any, Optional
+from pydantic_ai.messages import ModelMessagesTypeAdapter
+from pydantic_ai.models import Model
+from pydantic_ai.usage import Usage
+
+RECORD = "record"
+REPLAY = "replay"
+# Replay recorded responses, record the ones missing
+AUTO = "auto"
+MODES = (RECORD, REPLAY, AUTO)
+
+
+def _drop_volatile_fields(value: Any) -> Any:
+    """Remove fields that change between identical requests (timestamps, ids)."""
+    if isinstance(value, dict):
+        return {
+            key: _drop_volatile_fields(item)
+            for key, item in value.items()
+            if key not in ("timestamp", "id", "response_id", "create_time")
+        }
+    if isinstance(value, (list, tuple)):
+        return [_drop_volatile_fields(item) for item in value]
+    return value
+
+
+def _to_jsonable(value: Any) -> Any:
+    """Convert SDK objects (pydantic models, dataclasses) into plain JSON values."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, dict):
+        return {str(key): _to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(item) for item in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+class ResponseStore:
+    """
+    Directory of recorded LLM responses, one JSON file per request.
+
+    Requests are identified by a hash of their content, so replaying the same
+    request returns the same response.
+
+    Example:
+        >>> store = ResponseStore("tests/recordings")
+        >>> key = store.key({"messages": messages})
+        >>> store.save(key, {"response": response_json})
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(request: Any) -> str:
+        payload = json.dumps(
+            _drop_volatile_fields(_to_jsonable(request)), sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, key: str, recording: dict):
+        with open(self._path(key), "w", encoding="utf-8") as f:
+            json.dump(recording, f, indent=2)
+
+
+class _Recorder:
+    """Shared record/replay logic of the wrappers below."""
+
+    def __init__(self, store: ResponseStore, mode: str = REPLAY, latency: float = 0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}, expected one of {MODES}")
+        self.store = store
+        self.mode = mode
+        self.latency = latency
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        if self.mode == RECORD:
+            return None
+        recording = self.store.load(key)
+        if recording is None and self.mode == REPLAY:
+            raise LookupError(
+                f"No recorded response for request {key} in {self.store.directory}"
+            )
+        return recording
+
+
+class RecordReplayModel(_Recorder, Model):
+    """
+    pydantic-ai model recording the responses of another model or replaying them.
+
+    Args:
+        store (ResponseStore): Where the responses are kept.
+        model (Model, optional): The real model, required to record.
+        mode (str): 'record', 'replay' or 'auto' (replay, record what is missing).
+        latency (float): Seconds added to every replayed response to simulate the API.
+
+    Example:
+        >>> documenter_agent.model = RecordReplayModel(ResponseStore("recordings"), mode="replay")
+    """
+
+    def __init__(
+        self,
+        store: ResponseStore,
+        model: Model = None,
+        mode: str = REPLAY,
+        latency: float = 0,
+    ):
+        super().__init__(store, mode, latency)
+        self.wrapped = model
+
+    @property
+    def model_name(self) -> str:
+        return self.wrapped.model_name if self.wrapped else "replay"
+
+    @property
+    def system(self) -> str:
+        return self.wrapped.system if self.wrapped else "replay"
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        key = self.store.key(
+            {
+                "messages": ModelMessagesTypeAdapter.dump_python(messages, mode="json"),
+                "output_tools": [
+                    tool.name for tool in model_request_parameters.output_tools
+                ],
+            }
+        )
+        recording = self._lookup(key)
+        if recording is not None:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            response = ModelMessagesTypeAdapter.validate_python([recording["response"]])[0]
+            return response, Usage(**recording["usage"])
+
+        response, usage = await self.wrapped.request(
+            messages, model_settings, model_request_parameters
+        )
+        self.store.save(
+            key,
+            {
+                "response": ModelMessagesTypeAdapter.dump_python([response], mode="json")[0],
+                "usage": dataclasses.asdict(usage),
+            },
+        )
+        return response, usage
+
+
+class _SyncRecorder(_Recorder):
+    def __init__(self, store, create, response_type, mode=REPLAY, latency=0):
+        super().__init__(store, mode, latency)
+        self.create = create
+        self.response_type = response_type
+
+    def __call__(self, **kwargs):
+        key = self.store.key(kwargs)
+        recording = self._lookup(key)
+        if recording is not None:
+            if self.latency:
+                time.sleep(self.latency)
+            return self.response_type.model_validate(recording["response"])
+        response = self.create(**kwargs)
+        self.store.save(key, {"response": response.model_dump(mode="json")})
+        return response
+
+
+class _Namespace:
+    """Attribute proxy replacing some attributes of an SDK object."""
+
+    def __init__(self, wrapped, **overrides):
+        self._wrapped = wrapped
+        self.__dict__.update(overrides)
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+
+def record_replay_google_agent(agent, store: ResponseStore, mode: str = REPLAY, latency: float = 0):
+    """
+    Make an agent_google.Agent record or replay its generate_content calls.
+
+    Only generate_content goes through the recorder, file uploads still use the client.
+    """
+    from google.genai import types
+
+    models = agent.client.models
+    recorder = _SyncRecorder(
+        store,
+        models.generate_content,
+        types.GenerateContentResponse,
+        mode=mode,
+        latency=latency,
+    )
+    agent.client = _Namespace(
+        agent.client, models=_Namespace(models, generate_content=recorder)
+    )
+    return agent
+
+
+def record_replay_openai_agent(agent, store: ResponseStore, mode: str = REPLAY, latency: float = 0):
+    """Make an agent.Agent (OpenAI compatible API) record or replay its completions."""
+    from openai.types.chat import ChatCompletion
+
+    completions = agent.client.beta.chat.completions
+    recorder = _SyncRecorder(
+        store, completions.parse, ChatCompletion, mode=mode, latency=latency
+    )
+    beta = agent.client.beta
+    agent.client = _Namespace(
+        agent.client,
+        beta=_Namespace(
+            beta,
+            chat=_Namespace(beta.chat, completions=_Namespace(completions, parse=recorder)),
+        ),
+    )
+    return agent
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+import httpx
+import openai
+from google.genai import errors as genai_errors
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Connection errors and timeouts of the HTTP clients and the provider SDKs, httpx
+# timeouts are transport errors (the SDKs of OpenAI and Gemini send through httpx)
+RETRYABLE_EXCEPTIONS = (
+    TimeoutError,
+    ConnectionError,
+    httpx.TransportError,
+    openai.APIConnectionError,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text, about 4 characters per token."""
+    return len(text) // 4 + 1
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """Rate limits, server errors, timeouts and connection errors are worth a retry."""
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None and isinstance(exc, genai_errors.APIError):
+        status_code = exc.code
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, RETRYABLE_EXCEPTIONS)
+
+
+class TokenBucket:
+    """
+    A token bucket refilled continuously up to its capacity.
+
+    Args:
+        capacity (float): Maximum number of tokens in the bucket.
+        per_minute (float): Number of tokens added per minute.
+        clock (callable): Returns the current time in seconds.
+    """
+
+    def __init__(self, capacity: float, per_minute: float, clock: Callable[[], float]):
+        self.capacity = capacity
+        self.rate = per_minute / 60
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, amount: float) -> float:
+        """
+        Take the tokens if they are available.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds to wait before trying again.
+        """
+        amount = min(amount, self.capacity)
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0
+        return (amount - self.tokens) / self.rate
+
+
+@dataclass
+class SchedulerMetrics:
+    """Counters of an LLMScheduler, times in seconds."""
+
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    in_flight: int = 0
+    total_wait_time: float = 0
+    max_wait_time: float = 0
+
+    @property
+    def average_wait_time(self) -> float:
+        return self.total_wait_time / self.requests if self.requests else 0
+
+
+class LLMScheduler:
+    """
+    Schedules LLM calls under rate limits, a concurrency limit and retries.
+
+    Every call waits for a free slot (max_in_flight), then for the request and token
+    buckets, in the order the calls arrived. Calls failing with a retryable error are
+    retried with jittered exponential backoff.
+
+    Args:
+        requests_per_minute (int, optional): Request limit, None for no limit.
+        tokens_per_minute (int, optional): Token limit, None for no limit.
+        max_in_flight (int): Maximum number of calls running at the same time.
+        max_retries (int): Maximum number of retries of a single call.
+        base_delay (float): Backoff delay of the first retry, doubled for every next one.
+        max_delay (float): Maximum backoff delay.
+        clock (callable): Returns the current time in seconds.
+        sleep (callable): Coroutine function sleeping the given number of seconds.
+        is_retryable (callable): Decides if an exception is worth a retry.
+
+    Example:
+        >>> scheduler = LLMScheduler(requests_per_minute=60, tokens_per_minute=1_000_000)
+        >>> result = await scheduler.run(lambda: agent.run(task), estimated_tokens=20_000)
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_in_flight: int = 8,
+        max_retries: int = 5,
+        base_delay: float = 1,
+        max_delay: float = 60,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+        is_retryable: Callable[[Exception], bool] = is_retryable_error,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.sleep = sleep
+        self.is_retryable = is_retryable
+        self.request_bucket = (
+            TokenBucket(requests_per_minute, requests_per_minute, clock)
+            if requests_per_minute
+            else None
+        )
+        self.token_bucket = (
+            TokenBucket(tokens_per_minute, tokens_per_minute, clock)
+            if tokens_per_minute
+            else None
+        )
+        self.metrics = SchedulerMetrics()
+        self._loop = None
+        self._slots: asyncio.Semaphore = None
+        self._bucket_lock: asyncio.Lock = None
+
+    def _bind_loop(self):
+        # asyncio primitives belong to one event loop, a new run gets new ones
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._bucket_lock = asyncio.Lock()
+
+    async def _acquire(self, bucket: Optional[TokenBucket], amount: float):
+        if bucket is None:
+            return
+        while True:
+            wait = bucket.try_acquire(amount)
+            if wait == 0:
+                return
+            await self.sleep(wait)
+
+    async def _wait_for_rate_limits(self, estimated_tokens: int):
+        async with self._bucket_lock:
+            await self._acquire(self.request_bucket, 1)
+            await self._acquire(self.token_bucket, estimated_tokens)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        return delay * random.uniform(0.5, 1)
+
+    async def run(self, call: Callable[[], Awaitable[T]], estimated_tokens: int = 0) -> T:
+        """
+        Run an LLM call once the limits allow it.
+
+        Args:
+            call: Coroutine function making the call, called again for every retry.
+            estimated_tokens: Estimated number of tokens the call uses.
+
+        Returns:
+            The result of the call.
+        """
+        self._bind_loop()
+        metrics = self.metrics
+        metrics.queue_depth += 1
+        metrics.max_queue_depth = max(metrics.max_queue_depth, metrics.queue_depth)
+        enqueued_at = self.clock()
+        queued = True
+        try:
+            async with self._slots:
+                await self._wait_for_rate_limits(estimated_tokens)
+                metrics.queue_depth -= 1
+                queued = False
+                wait_time = self.clock() - enqueued_at
+                metrics.requests += 1
+                metrics.total_wait_time += wait_time
+                metrics.max_wait_time = max(metrics.max_wait_time, wait_time)
+                metrics.in_flight += 1
+                try:
+                    return await self._run_with_retries(call, estimated_tokens)
+                finally:
+                    metrics.in_flight -= 1
+        except Exception:
+            metrics.failures += 1
+            raise
+        finally:
+            if queued:
+                metrics.queue_depth -= 1
+
+    async def _run_with_retries(self, call, estimated_tokens):
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except Exception as exc:
+                if attempt >= self.max_retries or not self.is_retryable(exc):
+                    raise
+                delay = self._backoff_delay(attempt)
+                attempt += 1
+                self.metrics.retries += 1
+                logging.warning(
+                    f"LLM call failed ({exc!r}), retry {attempt}/{self.max_retries} in {delay:.1f}s"
+                )
+                await self.sleep(delay)
+                await self._wait_for_rate_limits(estimated_tokens)
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def get_scheduler() -> LLMScheduler:
+    """
+    Return the process-wide scheduler, created from environment variables on first use.
+
+    LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_IN_FLIGHT and LLM_MAX_RETRIES
+    configure it; the limits are off if not set.
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(
+            requests_per_minute=_env_int("LLM_REQUESTS_PER_MINUTE"),
+            tokens_per_minute=_env_int("LLM_TOKENS_PER_MINUTE"),
+            max_in_flight=_env_int("LLM_MAX_IN_FLIGHT", 8),
+            max_retries=_env_int("LLM_MAX_RETRIES", 5),
+        )
+    return _scheduler
+
+
+def set_scheduler(scheduler: Optional[LLMScheduler]):
+    """Replace the process-wide scheduler, None recreates it from the environment on next use."""
+    global _scheduler
+    _scheduler = scheduler
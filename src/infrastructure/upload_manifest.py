@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, Optional
+from src.utils.utils import atomic_write_file
+
+DEFAULT_MANIFEST_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "power_bi_helper", "uploads.json"
+)
+# Entries expiring sooner than this are uploaded again, in seconds
+EXPIRY_MARGIN = 10 * 60
+# How long the remote store keeps a file (Gemini: 48 hours), for entries without an expiry time
+FILE_TTL = 48 * 3600
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class UploadManifest:
+    """
+    Local record of the files uploaded to a remote file store, keyed by content hash.
+
+    A file is reused only while its content is unchanged and the remote copy has not
+    expired, so a changed file with the same name is uploaded again. Entries without
+    an expiry time expire FILE_TTL after they were set.
+
+    Args:
+        path (str, optional): JSON file the manifest is kept in, None keeps it in memory only.
+        clock (callable): Returns the current time in seconds since epoch.
+
+    Example:
+        >>> manifest = UploadManifest("uploads.json")
+        >>> entry = manifest.get(content_hash(file_bytes))
+        >>> manifest.set(content_hash(file_bytes), {"name": file.name, "uri": file.uri,
+        ...     "mime_type": file.mime_type, "expires_at": file.expiration_time.timestamp()})
+        >>> manifest.save()
+    """
+
+    def __init__(self, path: Optional[str] = None, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.entries: Dict[str, dict] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, key: str) -> Optional[dict]:
+        """The entry of the content hash, None if unknown or about to expire."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at = entry.get("expires_at")
+        if expires_at is None:
+            expires_at = entry.get("uploaded_at", 0) + FILE_TTL
+        if expires_at - EXPIRY_MARGIN <= self.clock():
+            return None
+        return entry
+
+    def set(self, key: str, entry: dict):
+        self.entries[key] = {"uploaded_at": self.clock(), **entry}
+
+    def remove_names(self, names: Iterable[str]):
+        """Forget the entries of deleted remote files."""
+        names = set(names)
+        self.entries = {
+            key: entry for key, entry in self.entries.items() if entry["name"] not in names
+        }
+
+    def save(self):
+        if self.path:
+            atomic_write_file(self.path, json.dumps(self.entries, indent=2))
@@ -0,0 +1,142 @@
+import csv
+import json
+import math
+import os
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, List, Optional
+
+# USD per million tokens
+DEFAULT_PRICES = {
+    "gemini-2.0-flash": {"input": 0.10, "output": 0.40},
+    "gemini-2.0-flash-lite": {"input": 0.075, "output": 0.30},
+    "gemini-2.5-flash": {"input": 0.30, "output": 2.50},
+    "gemini-2.5-pro": {"input": 1.25, "output": 10.00},
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+}
+
+
+def load_prices(path: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Return the price table, the defaults updated with a JSON file.
+
+    Args:
+        path (str, optional): JSON file like {"model name": {"input": 0.1, "output": 0.4}}
+            with USD per million tokens, defaults to the LLM_PRICES_PATH environment variable.
+    """
+    prices = {model: dict(price) for model, price in DEFAULT_PRICES.items()}
+    path = path or os.getenv("LLM_PRICES_PATH")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            prices.update(json.load(f))
+    return prices
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentile (q between 0 and 100) with linear interpolation, 0 for no values."""
+    if not values:
+        return 0
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+@dataclass
+class UsageRecord:
+    """One LLM request, latency in seconds and cost in USD."""
+
+    task: str
+    batch: int
+    model: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latency: float = 0
+    retries: int = 0
+    cost: float = 0
+    status: str = "ok"
+
+
+class UsageLedger:
+    """
+    Tokens, latency, retries and estimated cost of the LLM requests of a run.
+
+    Args:
+        prices (dict, optional): Price table, see load_prices; models missing from it cost 0.
+
+    Example:
+        >>> ledger = UsageLedger()
+        >>> ledger.record("measure descriptions", 0, "gemini-2.0-flash", 12000, 800, 4.2)
+        >>> ledger.write("Model.SemanticModel_usage")
+    """
+
+    def __init__(self, prices: Optional[Dict[str, Dict[str, float]]] = None):
+        self.prices = load_prices() if prices is None else prices
+        self.records: List[UsageRecord] = []
+
+    def cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
+        price = self.prices.get(model)
+        if price is None:
+            return 0
+        return (
+            input_tokens * price.get("input", 0) + output_tokens * price.get("output", 0)
+        ) / 1_000_000
+
+    def record(
+        self,
+        task: str,
+        batch: int,
+        model: str,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        latency: float = 0,
+        retries: int = 0,
+        status: str = "ok",
+    ) -> UsageRecord:
+        record = UsageRecord(
+            task=task,
+            batch=batch,
+            model=model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            latency=latency,
+            retries=retries,
+            cost=self.cost(model, input_tokens, output_tokens),
+            status=status,
+        )
+        self.records.append(record)
+        return record
+
+    @staticmethod
+    def _totals(records: List[UsageRecord]) -> dict:
+        latencies = [record.latency for record in records]
+        return {
+            "requests": len(records),
+            "failed": sum(record.status != "ok" for record in records),
+            "input_tokens": sum(record.input_tokens for record in records),
+            "output_tokens": sum(record.output_tokens for record in records),
+            "retries": sum(record.retries for record in records),
+            "cost": sum(record.cost for record in records),
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+        }
+
+    def summary(self) -> dict:
+        """Totals of the run and of every task, with p50/p95 latency."""
+        tasks = {}
+        for record in self.records:
+            tasks.setdefault(record.task, []).append(record)
+        return {
+            **self._totals(self.records),
+            "tasks": {task: self._totals(records) for task, records in tasks.items()},
+        }
+
+    def write(self, path_prefix: str):
+        """Write the records and the summary to <path_prefix>.json and the records to <path_prefix>.csv."""
+        records = [asdict(record) for record in self.records]
+        with open(f"{path_prefix}.json", "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "requests": records}, f, indent=2)
+        with open(f"{path_prefix}.csv", "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=[field.name for field in fields(UsageRecord)])
+            writer.writeheader()
+            writer.writerows(records)
@@ -0,0 +1,136 @@
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Set, Tuple
+from src.utils.tmdl_parser import ModelIndex, TmdlObject
+
+_TOKENS = re.compile(
+    r"""
+      (?P<string>"(?:[^"]|"")*")
+    | (?P<comment>//[^\n]*|--[^\n]*|/\*.*?\*/)
+    | (?P<quoted>'(?:[^']|'')*')
+    | (?P<bracket>\[(?:[^\]]|\]\])*\])
+    | (?P<identifier>[A-Za-z_][A-Za-z0-9_.]*)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+@dataclass
+class DaxReferences:
+    """
+    Objects referenced by a DAX expression, names in the form the TMDL parser uses
+    (single quotes escaped as '').
+
+    Attributes:
+        tables (set): Table names, quoted ('Sales') or not (Sales).
+        columns (set): (table, name) pairs of qualified references, 'Sales'[Amount].
+        names (set): Unqualified [Name] references, measures or columns of the same table.
+    """
+
+    tables: Set[str] = field(default_factory=set)
+    columns: Set[Tuple[str, str]] = field(default_factory=set)
+    names: Set[str] = field(default_factory=set)
+
+
+def _bracket_name(token: str) -> str:
+    return token[1:-1].replace("]]", "]").replace("'", "''")
+
+
+def extract_references(expression: str) -> DaxReferences:
+    """
+    Find the tables, columns and measures a DAX expression refers to.
+
+    This is a tokenizer, not a DAX parser: strings and comments are skipped, every
+    other identifier is a possible table reference, resolved against the model later.
+
+    Example:
+        >>> extract_references("CALCULATE([Total], 'Date'[Year] = 2024)")
+        DaxReferences(tables={'Date'}, columns={('Date', 'Year')}, names={'Total'})
+    """
+    references = DaxReferences()
+    table, table_end = None, -1
+    for match in _TOKENS.finditer(expression):
+        kind, token = match.lastgroup, match.group()
+        if kind == "bracket":
+            if table is not None and not expression[table_end : match.start()].strip():
+                references.columns.add((table, _bracket_name(token)))
+            else:
+                references.names.add(_bracket_name(token))
+            table = None
+        elif kind == "quoted":
+            table, table_end = token[1:-1], match.end()
+            references.tables.add(table)
+        elif kind == "identifier":
+            # Function calls are not table references
+            if expression[match.end() :].lstrip().startswith("("):
+                table = None
+            else:
+                table, table_end = token, match.end()
+                references.tables.add(table)
+        else:
+            table = None
+    return references
+
+
+class DependencyGraph:
+    """
+    References between the tables, columns and measures of a model, keyed by TmdlObject.key.
+
+    Measures and calculated columns point to the objects their DAX expression refers to:
+    'Table'[Name] to the column (or measure) of that table, [Name] to the measure with
+    that name or else to the column of the same table, and table names to the table.
+
+    Example:
+        >>> graph = DependencyGraph(snapshot.index)
+        >>> graph.closure(["measure:Sales:Margin %"])
+        {'measure:Sales:Margin %', 'measure:Sales:Margin', 'column:Sales:Amount', ...}
+    """
+
+    def __init__(self, index: ModelIndex):
+        self.objects: Dict[str, TmdlObject] = {}
+        self.edges: Dict[str, Set[str]] = {}
+        tables: Dict[str, TmdlObject] = {}
+        measures: Dict[str, TmdlObject] = {}
+        members: Dict[Tuple[str, str], TmdlObject] = {}
+        for obj in index.objects():
+            if obj.kind == "table":
+                tables[obj.name] = obj
+            elif obj.kind == "measure":
+                measures.setdefault(obj.name, obj)
+                members.setdefault((obj.table, obj.name), obj)
+            elif obj.kind == "column":
+                members[(obj.table, obj.name)] = obj
+            else:
+                continue
+            self.objects[obj.key] = obj
+
+        for tmdl_file in index.files.values():
+            for obj in tmdl_file.objects:
+                if obj.kind not in ("measure", "column") or obj.expression_span is None:
+                    continue
+                references = extract_references(tmdl_file.expression(obj))
+                targets = [tables.get(name) for name in references.tables]
+                targets += [members.get(column) for column in references.columns]
+                targets += [
+                    measures.get(name) or members.get((obj.table, name))
+                    for name in references.names
+                ]
+                self.edges[obj.key] = {
+                    target.key for target in targets if target is not None
+                } - {obj.key}
+
+    def dependencies(self, key: str) -> Set[str]:
+        """Keys of the objects directly referenced by the object."""
+        return self.edges.get(key, set())
+
+    def closure(self, keys: Iterable[str]) -> Set[str]:
+        """Keys of the objects and of everything they reference, directly or not."""
+        seen = set(keys)
+        queue = deque(seen)
+        while queue:
+            for dependency in self.dependencies(queue.popleft()):
+                if dependency not in seen:
+                    seen.add(dependency)
+                    queue.append(dependency)
+        return seen
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable
+from src.utils.tmdl_parser import TmdlFile, TmdlObject
+
+DEFAULT_CACHE_PATH = os.path.join(
+    Path.home(), ".cache", "power_bi_helper", "descriptions.sqlite"
+)
+# SQLite limits the number of parameters of a single query
+_QUERY_CHUNK_SIZE = 500
+
+
+def _normalize_expression(expression: str) -> str:
+    """Removes indentation, trailing whitespace and empty lines from an expression."""
+    lines = (line.strip() for line in expression.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def normalized_definition(tmdl_file: TmdlFile, obj: TmdlObject) -> dict:
+    """
+    Returns the parts of an object's definition that its description depends on.
+
+    Descriptions, lineage tags and formatting are left out, so writing a description
+    into the file does not change the definition.
+
+    - measures: the DAX expression
+    - columns: data type, source column and the expression of calculated columns
+    - tables: the partitions (mode and source query)
+    """
+    definition = {"kind": obj.kind, "table": obj.table, "name": obj.name}
+    if obj.kind == "measure":
+        definition["expression"] = _normalize_expression(tmdl_file.expression(obj))
+    elif obj.kind == "column":
+        definition["dataType"] = obj.properties.get("dataType")
+        definition["sourceColumn"] = obj.properties.get("sourceColumn")
+        definition["expression"] = _normalize_expression(tmdl_file.expression(obj))
+    elif obj.kind == "table":
+        definition["partitions"] = [
+            _normalize_expression(tmdl_file.content[partition.start : partition.end])
+            for partition in tmdl_file.objects
+            if partition.kind == "partition" and partition.table == obj.name
+        ]
+    return definition
+
+
+def object_cache_key(
+    tmdl_file: TmdlFile,
+    obj: TmdlObject,
+    model_name: str,
+    prompt_version: str,
+    semantic_model: str = None,
+) -> str:
+    """
+    Returns the cache key of an object's description.
+
+    The semantic model is part of the key: the same object text in another model
+    is described from another model context.
+    """
+    payload = json.dumps(
+        [semantic_model, model_name, prompt_version, normalized_definition(tmdl_file, obj)],
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DescriptionCache:
+    """
+    Persistent cache of generated descriptions stored in a SQLite database.
+
+    Values are the JSON serialized documentation of an object, keys are built
+    with `object_cache_key`.
+
+    Example:
+        >>> cache = DescriptionCache()
+        >>> cache.set_many({key: object_details.model_dump_json()})
+        >>> cache.get_many([key])
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS descriptions "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Returns the cached values of the keys found in the cache."""
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), _QUERY_CHUNK_SIZE):
+            chunk = keys[i : i + _QUERY_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT key, value FROM descriptions WHERE key IN ({placeholders})",
+                chunk,
+            )
+            found.update(rows)
+        return found
+
+    def set_many(self, values: Dict[str, str]):
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO descriptions (key, value, created_at) VALUES (?, ?, ?)",
+            [(key, value, now) for key, value in values.items()],
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
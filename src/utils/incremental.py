@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+from src.utils.description_cache import normalized_definition
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.tmdl_parser import TmdlFile
+
+DOCUMENTED_KINDS = ("table", "column", "measure")
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _relative_path(snapshot: ModelSnapshot, path: str) -> str:
+    if snapshot.root is None:
+        return os.path.basename(path)
+    return os.path.relpath(path, snapshot.root).replace(os.sep, "/")
+
+
+def build_manifest(snapshot: ModelSnapshot, exclude: Iterable[str] = ()) -> dict:
+    """
+    Build a manifest with the hashes of all files and documented objects of a model.
+
+    Args:
+        snapshot: The model
+        exclude: Keys of the objects left out of the manifest, e.g. the ones that
+            weren't documented; they and the files holding them count as changed
+            when comparing with the manifest
+
+    Returns:
+        dict: {"created_at": timestamp, "files": {relative path: hash},
+               "objects": {object key: hash of its normalized definition}}
+    """
+    exclude = set(exclude)
+    manifest = {"created_at": time.time(), "files": {}, "objects": {}}
+    for tmdl_file in snapshot.tmdl_files():
+        object_hashes = _object_hashes(tmdl_file)
+        if exclude.isdisjoint(object_hashes):
+            manifest["files"][_relative_path(snapshot, tmdl_file.path)] = _hash(
+                tmdl_file.content
+            )
+        manifest["objects"].update(
+            (key, object_hash) for key, object_hash in object_hashes.items() if key not in exclude
+        )
+    return manifest
+
+
+def _object_hashes(tmdl_file: TmdlFile) -> Dict[str, str]:
+    """Hashes of the normalized definitions of the documented objects of a file, by key."""
+    return {
+        obj.key: _hash(json.dumps(normalized_definition(tmdl_file, obj), sort_keys=True))
+        for obj in tmdl_file.objects
+        if obj.kind in DOCUMENTED_KINDS
+    }
+
+
+def changed_objects_between(
+    previous: ModelSnapshot, current: ModelSnapshot, paths: Iterable[str]
+) -> Set[str]:
+    """
+    Return the keys of the objects that are new or changed between two snapshots.
+
+    Only the given files are compared, the other files are expected to be the same
+    in both snapshots. Descriptions are not part of the compared definitions, so
+    writing descriptions into a file doesn't change its objects.
+    """
+    before, after = {}, {}
+    for path in paths:
+        if path in previous.index.files:
+            before.update(_object_hashes(previous.tmdl_file(path)))
+        if path in current.index.files:
+            after.update(_object_hashes(current.tmdl_file(path)))
+    return {key for key, object_hash in after.items() if before.get(key) != object_hash}
+
+
+def save_manifest(snapshot: ModelSnapshot, path: str, exclude: Iterable[str] = ()):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(build_manifest(snapshot, exclude), f, indent=2)
+
+
+def load_manifest(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def changed_objects_since_manifest(snapshot: ModelSnapshot, manifest: dict) -> Set[str]:
+    """Return the keys of the objects that are new or changed since the manifest was built."""
+    current = build_manifest(snapshot)
+    if current["files"] == manifest.get("files"):
+        return set()
+    previous = manifest.get("objects", {})
+    return {
+        key
+        for key, object_hash in current["objects"].items()
+        if previous.get(key) != object_hash
+    }
+
+
+def changed_files_since_git_ref(root: str, ref: str) -> List[str]:
+    """
+    Return the paths of the files under root changed since the git ref.
+
+    Uncommitted changes and untracked files are included.
+
+    Raises:
+        ValueError: If git fails, e.g. the ref doesn't exist or root is not in a repository.
+    """
+    commands = [
+        ["git", "-C", root, "diff", "--name-only", "--relative", ref, "--", "."],
+        ["git", "-C", root, "ls-files", "--others", "--exclude-standard", "--", "."],
+    ]
+    changed = []
+    for command in commands:
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise ValueError(f"git failed: {completed.stderr.strip()}")
+        changed.extend(line for line in completed.stdout.splitlines() if line)
+    return [os.path.normpath(os.path.join(root, path)) for path in changed]
+
+
+def changed_files_since_timestamp(snapshot: ModelSnapshot, timestamp: float) -> List[str]:
+    return [path for path in snapshot.files if os.path.getmtime(path) > timestamp]
+
+
+def _parse_timestamp(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def changed_objects_since(snapshot: ModelSnapshot, since: str) -> Set[str]:
+    """
+    Return the keys of the objects to document again since a baseline.
+
+    Args:
+        snapshot: The current model
+        since: One of
+            - a path to a manifest saved with save_manifest (object level comparison),
+            - a timestamp, as seconds since epoch or in ISO format (file modification times),
+            - a git ref (files changed according to `git diff --name-only`).
+
+    Returns:
+        set: Keys of the new or modified objects; for file level baselines all
+             objects of the changed files.
+    """
+    if os.path.isfile(since):
+        return changed_objects_since_manifest(snapshot, load_manifest(since))
+
+    timestamp = _parse_timestamp(since)
+    if timestamp is not None:
+        changed_files = changed_files_since_timestamp(snapshot, timestamp)
+    else:
+        changed_files = changed_files_since_git_ref(snapshot.root, since)
+
+    changed_files = {os.path.normcase(os.path.abspath(path)) for path in changed_files}
+    return {
+        obj.key
+        for tmdl_file in snapshot.tmdl_files()
+        if os.path.normcase(os.path.abspath(tmdl_file.path)) in changed_files
+        for obj in tmdl_file.objects
+        if obj.kind in DOCUMENTED_KINDS
+    }
@@ -0,0 +1,80 @@
+import os
+from dataclasses import dataclass
+from typing import Iterable, List, Tuple
+from src.utils.tmdl_parser import ModelIndex, TmdlFile, read_model_file
+from src.utils.utils import list_files_in_directory
+
+
+@dataclass(frozen=True)
+class ModelSnapshot:
+    """
+    The files of a semantic model read and parsed once.
+
+    A snapshot is created at the beginning of a run and shared by all documentation
+    tasks; it is also used to write the output files, so no model file is read twice.
+
+    Attributes:
+        root (str): The SemanticModel folder the files were read from.
+        files (tuple): Paths of the TMDL files, in discovery order.
+        index (ModelIndex): The parsed files, including their content.
+
+    Example:
+        >>> snapshot = ModelSnapshot.load(r"C:\\models\\Sales.SemanticModel")
+        >>> snapshot.index.get_objects("measures")
+    """
+
+    root: str
+    files: Tuple[str, ...]
+    index: ModelIndex
+
+    @classmethod
+    def load(
+        cls, root: str, extension: str = ".tmdl", encoding: str = "utf-8"
+    ) -> "ModelSnapshot":
+        """Discovers, reads and parses all model files under the root folder."""
+        model_files = list_files_in_directory(root, extension=extension, recursive=True)
+        return cls.from_files(model_files, root=root, encoding=encoding)
+
+    @classmethod
+    def from_files(
+        cls, model_files: List[str], root: str = None, encoding: str = "utf-8"
+    ) -> "ModelSnapshot":
+        """Reads and parses the given files."""
+        index = ModelIndex.from_files(model_files, encoding=encoding)
+        return cls(root=root, files=tuple(model_files), index=index)
+
+    def reload(self, paths: Iterable[str], encoding: str = "utf-8") -> "ModelSnapshot":
+        """
+        A new snapshot with the given files read and parsed again.
+
+        Files that no longer exist are left out, new files are added after the known
+        ones. The other files are shared with this snapshot, not read again.
+        """
+        changed = set(paths)
+        index = ModelIndex()
+        files = []
+        for path in list(self.files) + sorted(changed - set(self.files)):
+            if path not in changed:
+                index.add(self.index.files[path])
+            elif os.path.isfile(path):
+                index.add_file(path, read_model_file(path, encoding))
+            else:
+                continue
+            files.append(path)
+        return ModelSnapshot(root=self.root, files=tuple(files), index=index)
+
+    @property
+    def name(self) -> str:
+        """Name of the semantic model, the root folder's name (None without a root)."""
+        if self.root is None:
+            return None
+        return os.path.basename(os.path.normpath(self.root))
+
+    def tmdl_file(self, path: str) -> TmdlFile:
+        return self.index.files[path]
+
+    def content(self, path: str) -> str:
+        return self.index.files[path].content
+
+    def tmdl_files(self) -> List[TmdlFile]:
+        return [self.index.files[path] for path in self.files]
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Set, Tuple
+from src.utils.utils import list_files_in_directory
+
+# Seconds between two scans of the model folder
+POLL_INTERVAL = float(os.getenv("DOCUMENTATION_WATCH_POLL_INTERVAL", "1"))
+# Seconds without changes after which a burst of saves is reported
+DEBOUNCE = float(os.getenv("DOCUMENTATION_WATCH_DEBOUNCE", "2"))
+
+
+def scan_files(root: str, extension: str = ".tmdl") -> Dict[str, Tuple[int, int]]:
+    """Modification time (ns) and size of the model files under root, by path."""
+    stats = {}
+    for path in list_files_in_directory(root, extension=extension, recursive=True):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stats[path] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+
+class ModelWatcher:
+    """
+    Watches the files of a model folder by polling and reports bursts of changes.
+
+    Editors like Power BI Desktop save many files one after the other; changes are
+    collected until the folder has been quiet for the debounce time and reported
+    together. Polling needs nothing but the standard library and works the same on
+    every platform and on network drives.
+
+    Args:
+        root (str): The SemanticModel folder.
+        extension (str): Extension of the watched files.
+        poll_interval (float): Seconds between two scans, defaults to POLL_INTERVAL.
+        debounce (float): Quiet seconds before changes are reported, defaults to DEBOUNCE.
+        clock (callable): Returns the current time in seconds.
+        sleep (callable): Coroutine function sleeping the given number of seconds.
+
+    Example:
+        >>> watcher = ModelWatcher(r"C:\\models\\Sales.SemanticModel")
+        >>> async for changed_paths in watcher.changes():
+        ...     snapshot = snapshot.reload(changed_paths)
+    """
+
+    def __init__(
+        self,
+        root: str,
+        extension: str = ".tmdl",
+        poll_interval: float = None,
+        debounce: float = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self.root = root
+        self.extension = extension
+        self.poll_interval = POLL_INTERVAL if poll_interval is None else poll_interval
+        self.debounce = DEBOUNCE if debounce is None else debounce
+        self.clock = clock
+        self.sleep = sleep
+        self.files = scan_files(root, extension)
+
+    def poll(self) -> Set[str]:
+        """Scan the folder once, return the files added, modified or removed since the last scan."""
+        files = scan_files(self.root, self.extension)
+        changed = {
+            path for path in files.keys() | self.files.keys() if files.get(path) != self.files.get(path)
+        }
+        self.files = files
+        return changed
+
+    async def changes(self) -> AsyncIterator[Set[str]]:
+        """Yield the paths changed in every burst of saves, until cancelled."""
+        pending = set()
+        last_change = None
+        while True:
+            await self.sleep(self.poll_interval)
+            changed = await asyncio.to_thread(self.poll)
+            now = self.clock()
+            if changed:
+                pending |= changed
+                last_change = now
+            elif pending and now - last_change >= self.debounce:
+                yield pending
+                pending = set()
@@ -0,0 +1,87 @@
+import difflib
+import os
+import shutil
+from typing import Optional
+
+# copy: copy the model to the `_updated` folder and write the changed files there
+# in-place: write the changed files over the originals
+# hardlink: link the unchanged files into the `_updated` folder, write only the changed ones
+# patch: write a unified diff next to the model, no model file is touched
+OUTPUT_MODES = ("copy", "in-place", "hardlink", "patch")
+
+
+def updated_folder_path(root: str) -> str:
+    """The `_updated` folder next to a model folder."""
+    return os.path.normpath(root) + "_updated"
+
+
+def link_tree(source: str, destination: str):
+    """
+    Recreate a folder tree with hard links to the files of source.
+
+    Files that can't be linked (e.g. on another file system) are copied. Existing
+    files in destination are replaced.
+    """
+    for folder, _, files in os.walk(source):
+        target_folder = os.path.join(destination, os.path.relpath(folder, source))
+        os.makedirs(target_folder, exist_ok=True)
+        for file in files:
+            source_file = os.path.join(folder, file)
+            target_file = os.path.join(target_folder, file)
+            if os.path.lexists(target_file):
+                os.remove(target_file)
+            try:
+                os.link(source_file, target_file)
+            except OSError:
+                shutil.copy2(source_file, target_file)
+
+
+def _replace_copy(source_file: str, target_file: str):
+    """Copy a file, the target is replaced rather than written into (it may be a link)."""
+    if os.path.lexists(target_file):
+        os.remove(target_file)
+    return shutil.copy2(source_file, target_file)
+
+
+def prepare_output(root: str, mode: str) -> Optional[str]:
+    """
+    Prepare the folder the updated files are written to.
+
+    Args:
+        root: The model folder
+        mode: One of OUTPUT_MODES
+
+    Returns:
+        str: The folder to write the changed files to, None in patch mode
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode: {mode}, expected one of {OUTPUT_MODES}")
+    if mode == "in-place":
+        return root
+    if mode == "patch":
+        return None
+    updated_folder = updated_folder_path(root)
+    if mode == "copy":
+        # The folder may hold links of a previous hardlink run
+        shutil.copytree(root, updated_folder, dirs_exist_ok=True, copy_function=_replace_copy)
+    else:
+        link_tree(root, updated_folder)
+    return updated_folder
+
+
+def unified_diff(old_content: str, new_content: str, relative_path: str) -> str:
+    """Unified diff of a file, with git style a/ and b/ paths."""
+    relative_path = relative_path.replace(os.sep, "/")
+    lines = difflib.unified_diff(
+        old_content.splitlines(keepends=True),
+        new_content.splitlines(keepends=True),
+        fromfile=f"a/{relative_path}",
+        tofile=f"b/{relative_path}",
+    )
+    return "".join(
+        line if line.endswith("\n") else line + "\n\\ No newline at end of file\n"
+        for line in lines
+    )
@@ -0,0 +1,213 @@
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+_WORDS = [
+    "Sales", "Revenue", "Cost", "Margin", "Units", "Customer", "Product", "Region",
+    "Store", "Order", "Discount", "Budget", "Forecast", "Return", "Channel", "Category",
+]
+_DATA_TYPES = ["int64", "string", "double", "dateTime", "boolean", "decimal"]
+
+
+@dataclass
+class SyntheticModelSpec:
+    """
+    Shape of a generated semantic model.
+
+    Attributes:
+        tables (int): Number of tables.
+        columns_per_table (int): Number of columns of every table.
+        measures_per_table (int): Number of measures of every table.
+        description_ratio (float): Share of objects with an existing `///` description.
+        multiline_ratio (float): Share of measures with a multi-line DAX expression.
+        escaped_name_ratio (float): Share of names with a single quote (escaped as '').
+        m_query_lines (int): Number of lines of every partition's M query.
+        seed (int): Seed of the random generator, the same spec gives the same model.
+    """
+
+    tables: int = 10
+    columns_per_table: int = 10
+    measures_per_table: int = 10
+    description_ratio: float = 0.5
+    multiline_ratio: float = 0.3
+    escaped_name_ratio: float = 0.1
+    m_query_lines: int = 20
+    seed: int = 0
+
+    @classmethod
+    def for_objects(cls, objects: int, **kwargs) -> "SyntheticModelSpec":
+        """Spec of a model with about the given number of tables, columns and measures."""
+        per_table = kwargs.pop("objects_per_table", 50)
+        tables = max(1, objects // (per_table + 1))
+        per_table = max(2, objects // tables - 1)
+        return cls(
+            tables=tables,
+            columns_per_table=per_table // 2,
+            measures_per_table=per_table - per_table // 2,
+            **kwargs,
+        )
+
+    @property
+    def objects(self) -> int:
+        return self.tables * (1 + self.columns_per_table + self.measures_per_table)
+
+
+@dataclass
+class SyntheticModel:
+    """
+    A generated model.
+
+    Attributes:
+        files (dict): File content by path relative to the SemanticModel folder.
+        objects (list): (kind, table, name, description) of every table, column and
+                        measure; names as written in TMDL (quotes escaped as ''),
+                        description None if the object has none.
+    """
+
+    files: Dict[str, str] = field(default_factory=dict)
+    objects: List[Tuple[str, str, str, str]] = field(default_factory=list)
+
+
+def _quote(name: str) -> str:
+    """Write a name the way TMDL does: quoted if needed, single quotes doubled."""
+    if name.isidentifier():
+        return name
+    return "'" + name.replace("'", "''") + "'"
+
+
+def _escaped(name: str) -> str:
+    return name.replace("'", "''")
+
+
+class _Generator:
+    def __init__(self, spec: SyntheticModelSpec):
+        self.spec = spec
+        self.random = random.Random(spec.seed)
+        self.model = SyntheticModel()
+
+    def name(self, prefix: str, number: int, table_number: int = None) -> str:
+        """A name ending with the number, and the table number if given (e.g. 2_3)."""
+        word = self.random.choice(_WORDS)
+        label = number if table_number is None else f"{table_number}_{number}"
+        if self.random.random() < self.spec.escaped_name_ratio:
+            return f"{word}'s {prefix} {label}"
+        if number % 3 == 0:
+            return f"{prefix}{label}_{word}"
+        return f"{word} {prefix} {label}"
+
+    def description(self, kind: str, name: str):
+        if self.random.random() < self.spec.description_ratio:
+            return f"Existing description of the {kind} {name}"
+        return None
+
+    def add(self, lines: List[str], kind: str, table: str, name: str, indent: str):
+        description = self.description(kind, name)
+        if description is not None:
+            lines.append(f"{indent}/// {description}")
+        self.model.objects.append((kind, _escaped(table), _escaped(name), description))
+
+    def dax(self, table: str, columns: List[str]) -> List[str]:
+        column = _quote(table) + "[" + self.random.choice(columns) + "]"
+        other = _quote(table) + "[" + self.random.choice(columns) + "]"
+        if self.random.random() < self.spec.multiline_ratio:
+            return [
+                "",
+                "\t\t\tVAR _total =",
+                f"\t\t\t\tCALCULATE(SUM({column}), {other} > 0)",
+                "\t\t\tRETURN",
+                f"\t\t\t\tDIVIDE(_total, COUNTROWS({_quote(table)}))",
+            ]
+        return [f" SUM({column}) - SUM({other})"]
+
+    def m_query(self, table: str) -> List[str]:
+        lines = ["\t\t\t\tlet", '\t\t\t\t    Source = Sql.Database("server", "warehouse"),']
+        for i in range(self.spec.m_query_lines):
+            lines.append(
+                f'\t\t\t\t    #"Step {i}" = Table.TransformColumnTypes(Source, '
+                f'{{{{"Column {i}", type text}}}}),'
+            )
+        lines += ["\t\t\t\tin", f'\t\t\t\t    #"Step {self.spec.m_query_lines - 1}"']
+        return lines
+
+    def table(self, number: int) -> Tuple[str, str, List[str]]:
+        table = self.name("Table", number)
+        lines = []
+        self.add(lines, "table", table, table, "")
+        lines += [f"table {_quote(table)}", f"\tlineageTag: table-{number}", ""]
+
+        columns = [self.name("Column", c) for c in range(self.spec.columns_per_table)]
+        # Measure names are unique in a model, column names only in their table
+        measures = [
+            self.name("Measure", m, number) for m in range(self.spec.measures_per_table)
+        ]
+        for m, measure in enumerate(measures):
+            self.add(lines, "measure", table, measure, "\t")
+            expression = self.dax(table, columns or ["Value"])
+            lines.append(f"\tmeasure {_quote(measure)} ={expression[0]}")
+            lines += expression[1:]
+            lines += ["\t\tformatString: 0", f"\t\tlineageTag: measure-{number}-{m}", ""]
+        for c, column in enumerate(columns):
+            self.add(lines, "column", table, column, "\t")
+            lines += [
+                f"\tcolumn {_quote(column)}",
+                f"\t\tdataType: {self.random.choice(_DATA_TYPES)}",
+                f"\t\tlineageTag: column-{number}-{c}",
+                "\t\tsummarizeBy: none",
+                f"\t\tsourceColumn: {column}",
+                "",
+                "\t\tannotation SummarizationSetBy = Automatic",
+                "",
+            ]
+        lines += [f"\tpartition {_quote(table)} = m", "\t\tmode: import", "\t\tsource ="]
+        lines += self.m_query(table)
+        lines += ["", "\tannotation PBI_ResultType = Table", ""]
+        return table, columns[0] if columns else None, lines
+
+    def generate(self) -> SyntheticModel:
+        tables = []
+        for number in range(self.spec.tables):
+            table, key_column, lines = self.table(number)
+            file_name = table.replace("'", "_")
+            self.model.files[f"definition/tables/{file_name}.tmdl"] = "\n".join(lines)
+            tables.append((table, key_column))
+
+        relationships = []
+        for number, (table, key_column) in enumerate(tables[1:], start=1):
+            fact_table, fact_column = tables[0]
+            if key_column is None or fact_column is None:
+                continue
+            relationships += [
+                f"relationship relationship-{number}",
+                f"\tfromColumn: {_quote(fact_table)}.{_quote(fact_column)}",
+                f"\ttoColumn: {_quote(table)}.{_quote(key_column)}",
+                "",
+            ]
+        self.model.files["definition/relationships.tmdl"] = "\n".join(relationships)
+        self.model.files["definition/model.tmdl"] = "\n".join(
+            ["model Model", "\tculture: en-US", ""]
+            + [f"ref table {_quote(table)}" for table, _ in tables]
+        )
+        return self.model
+
+
+def generate_synthetic_model(spec: SyntheticModelSpec) -> SyntheticModel:
+    """
+    Generate the TMDL files of a semantic model.
+
+    Example:
+        >>> model = generate_synthetic_model(SyntheticModelSpec.for_objects(10_000))
+        >>> len(model.objects)
+    """
+    return _Generator(spec).generate()
+
+
+def write_synthetic_model(folder: str, spec: SyntheticModelSpec) -> SyntheticModel:
+    """Generate a model and write its files into the folder (a SemanticModel folder)."""
+    model = generate_synthetic_model(spec)
+    for relative_path, content in model.files.items():
+        path = os.path.join(folder, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    return model
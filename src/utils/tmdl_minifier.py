@@ -0,0 +1,248 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional, Union
+from src.infrastructure.scheduler import estimate_tokens
+
+# Lineage, change tracking and formatting metadata, none of it says what an object means
+_METADATA = frozenset(
+    {
+        "lineageTag",
+        "sourceLineageTag",
+        "changedProperty",
+        "annotation",
+        "extendedProperty",
+        "formatString",
+        "formatStringDefinition",
+        "summarizeBy",
+        "sourceProviderType",
+        "queryGroup",
+    }
+)
+
+
+@dataclass(frozen=True)
+class ContextProfile:
+    """
+    What the context minifier keeps of a TMDL file.
+
+    Names, data types, DAX expressions, relationships and `///` descriptions are
+    always kept.
+
+    Attributes:
+        name (str): Name of the profile.
+        drop (frozenset): Keywords of the properties and declarations removed, with
+                          everything nested in them (e.g. 'lineageTag', 'annotation').
+        m_query_lines (int): Lines kept of every M query (partition sources and shared
+                             expressions), the rest replaced by a `...` line. None keeps
+                             the whole query.
+        blank_lines (bool): Keep the blank lines between declarations.
+    """
+
+    name: str
+    drop: FrozenSet[str] = frozenset()
+    m_query_lines: Optional[int] = None
+    blank_lines: bool = True
+
+
+PROFILES: Dict[str, ContextProfile] = {
+    # The files as they are
+    "none": ContextProfile("none"),
+    # Metadata removed, M queries cut to their first lines
+    "standard": ContextProfile("standard", _METADATA, m_query_lines=3, blank_lines=False),
+    # Also without partitions, shared M expressions, source columns and table references
+    "aggressive": ContextProfile(
+        "aggressive",
+        _METADATA | {"partition", "expression", "sourceColumn", "ref"},
+        m_query_lines=0,
+        blank_lines=False,
+    ),
+}
+
+
+@dataclass
+class MinifyReport:
+    """
+    What the context minifier removed.
+
+    Attributes:
+        original_tokens (int): Estimated tokens before minifying.
+        minified_tokens (int): Estimated tokens after minifying.
+        removed (Counter): Removed characters by keyword, 'm query' for the cut
+                           lines of M queries and 'blank' for blank lines.
+    """
+
+    original_tokens: int = 0
+    minified_tokens: int = 0
+    removed: Counter = field(default_factory=Counter)
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.minified_tokens
+
+    def update(self, other: "MinifyReport"):
+        """Add the counts of another report, e.g. of one file."""
+        self.original_tokens += other.original_tokens
+        self.minified_tokens += other.minified_tokens
+        self.removed.update(other.removed)
+
+    def summary(self) -> dict:
+        """Estimated tokens before and after minifying and saved tokens by keyword."""
+        return {
+            "original_tokens": self.original_tokens,
+            "minified_tokens": self.minified_tokens,
+            "saved_tokens": self.saved_tokens,
+            "saved_share": self.saved_tokens / self.original_tokens if self.original_tokens else 0.0,
+            "saved_tokens_by_keyword": {
+                keyword: chars // 4 for keyword, chars in self.removed.most_common()
+            },
+        }
+
+
+def get_profile(profile: Union[str, ContextProfile]) -> ContextProfile:
+    """
+    Returns the profile of the given name, profiles are returned as they are.
+
+    Raises:
+        ValueError: If there is no profile of that name.
+    """
+    if isinstance(profile, ContextProfile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown context profile: {profile}, expected one of {list(PROFILES)}")
+    return PROFILES[profile]
+
+
+def _keyword(body: str) -> str:
+    end = 0
+    while end < len(body) and (body[end].isalnum() or body[end] == "_"):
+        end += 1
+    return body[:end]
+
+
+def _starts_expression(body: str) -> bool:
+    """True for lines whose expression continues on the next lines (`x =` or `x = ```)."""
+    stripped = body.rstrip()
+    if stripped.endswith("```"):
+        stripped = stripped[:-3].rstrip()
+    return "=" in body and stripped.endswith("=")
+
+
+def minify_tmdl(
+    content: str,
+    profile: Union[str, ContextProfile] = "standard",
+    report: MinifyReport = None,
+) -> str:
+    """
+    Removes what doesn't help describing the objects from TMDL text.
+
+    Works on the structure of the file in a single pass over its lines, like
+    parse_tmdl: a dropped property or declaration takes the lines indented deeper
+    than it along, expression lines are recognized by their indentation (or the
+    ``` fence) and never mistaken for properties. The text can be a whole file or
+    parts of one (e.g. the declarations of some objects).
+
+    Args:
+        content (str): TMDL text.
+        profile (str | ContextProfile): One of PROFILES or a custom profile.
+        report (MinifyReport, optional): Updated with the removed characters.
+
+    Returns:
+        str: The minified text.
+
+    Example:
+        >>> report = MinifyReport()
+        >>> text = minify_tmdl(tmdl_file.content, "standard", report)
+        >>> report.summary()["saved_tokens"]
+    """
+    profile = get_profile(profile)
+    if report is not None:
+        report.original_tokens += estimate_tokens(content)
+    if profile == PROFILES["none"]:
+        if report is not None:
+            report.minified_tokens += estimate_tokens(content)
+        return content
+
+    removed = Counter()
+    kept = []
+    # Indentation of the dropped declaration whose nested lines are skipped
+    drop_indent = None
+    drop_keyword = ""
+    # State of an open multi-line expression
+    expr_indent = None
+    expr_fenced = False
+    expr_m_query = False
+    expr_lines = 0
+    expr_cut = 0
+    partition_mode = ""
+
+    def close_expression():
+        if expr_cut:
+            kept.append("\t" * (expr_indent + 2) + f"... ({expr_cut} more lines)")
+
+    for line in content.splitlines():
+        body = line.lstrip("\t")
+        indent = len(line) - len(body)
+        blank = not body.strip()
+
+        if drop_indent is not None:
+            if blank or indent > drop_indent:
+                removed[drop_keyword] += len(line) + 1
+                continue
+            drop_indent = None
+
+        if expr_indent is not None:
+            if expr_fenced or blank or indent > expr_indent + 1:
+                if expr_fenced and body.rstrip().endswith("```"):
+                    close_expression()
+                    kept.append(line.rstrip())
+                    expr_indent = None
+                elif blank:
+                    if profile.blank_lines and not expr_cut:
+                        kept.append("")
+                    else:
+                        removed["blank"] += len(line) + 1
+                elif expr_m_query and expr_lines >= profile.m_query_lines:
+                    expr_cut += 1
+                    removed["m query"] += len(line) + 1
+                else:
+                    expr_lines += 1
+                    kept.append(line.rstrip())
+                continue
+            close_expression()
+            expr_indent = None
+
+        if blank:
+            if profile.blank_lines:
+                kept.append(line.rstrip())
+            else:
+                removed["blank"] += len(line) + 1
+            continue
+        if body.startswith("///"):
+            kept.append(line.rstrip())
+            continue
+
+        keyword = _keyword(body)
+        if keyword in profile.drop:
+            removed[keyword] += len(line) + 1
+            drop_indent = indent
+            drop_keyword = keyword
+            continue
+        if keyword == "partition":
+            partition_mode = body.rpartition("=")[2].strip()
+        kept.append(line.rstrip())
+        if _starts_expression(body):
+            expr_indent = indent
+            expr_fenced = body.rstrip().endswith("```")
+            expr_m_query = profile.m_query_lines is not None and (
+                keyword == "expression" or (keyword == "source" and partition_mode == "m")
+            )
+            expr_lines = 0
+            expr_cut = 0
+    if expr_indent is not None:
+        close_expression()
+
+    text = "\n".join(kept)
+    if report is not None:
+        report.minified_tokens += estimate_tokens(text)
+        report.removed.update(removed)
+    return text
@@ -0,0 +1,405 @@
+import mmap
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MODEL_ELEMENTS = {
+    "measures": "measure",
+    "columns": "column",
+    "tables": "table",
+}
+
+
+@dataclass
+class TmdlObject:
+    """
+    A single declaration found in a TMDL file (table, column, measure, partition, ...).
+
+    All offsets are character offsets into the content of the file the object
+    was parsed from, so they can be used directly to slice or splice the text.
+
+    Attributes:
+        kind (str): The TMDL keyword of the declaration, e.g. 'table' or 'measure'.
+        name (str): The object name as written in the file, without the surrounding
+                    quotes. Escaped single quotes are kept as they are ('').
+        file_name (str): The base name of the file the object was found in.
+        path (str): The path of the file the object was found in.
+        table (str): The name of the table the object belongs to (the table itself for tables).
+        indent (int): The number of tabs in front of the declaration.
+        start (int): Offset of the beginning of the declaration line.
+        end (int): Offset just after the last line belonging to the object.
+        description (str): The existing `///` description, None if there is none.
+        description_span (tuple): Offsets of the `///` lines, None if there is no description.
+        lineage_tag (str): The lineageTag property, None if not present.
+        expression_span (tuple): Offsets of the DAX/M expression, None if there is no expression.
+        properties (dict): The `key: value` properties of the object.
+    """
+
+    kind: str
+    name: str
+    file_name: str
+    path: str
+    table: Optional[str]
+    indent: int
+    start: int
+    end: int
+    description: Optional[str] = None
+    description_span: Optional[Tuple[int, int]] = None
+    lineage_tag: Optional[str] = None
+    expression_span: Optional[Tuple[int, int]] = None
+    properties: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        """Identifier of the object within the model, e.g. 'measure:Sales:Total'."""
+        return f"{self.kind}:{self.table}:{self.name}"
+
+
+@dataclass
+class TmdlFile:
+    """Parsed content of a single TMDL file."""
+
+    path: str
+    file_name: str
+    content: str
+    objects: List[TmdlObject] = field(default_factory=list)
+    # Texts derived from the content (e.g. minified model contexts), computed once and
+    # dropped with the file
+    derived: Dict[object, object] = field(default_factory=dict, repr=False, compare=False)
+
+    def of_kind(self, kind: str) -> List[TmdlObject]:
+        return [obj for obj in self.objects if obj.kind == kind]
+
+    @property
+    def tables(self) -> List[TmdlObject]:
+        return self.of_kind("table")
+
+    @property
+    def columns(self) -> List[TmdlObject]:
+        return self.of_kind("column")
+
+    @property
+    def measures(self) -> List[TmdlObject]:
+        return self.of_kind("measure")
+
+    def text(self, span: Optional[Tuple[int, int]]) -> str:
+        """Returns the text of the file for the given span, an empty string for None."""
+        if span is None:
+            return ""
+        return self.content[span[0] : span[1]]
+
+    def expression(self, obj: TmdlObject) -> str:
+        return self.text(obj.expression_span)
+
+
+def _read_name(text: str) -> Tuple[str, str]:
+    """
+    Reads an object name from the beginning of the text.
+
+    Returns:
+        tuple: The name (without quotes, escaping kept) and the rest of the text.
+    """
+    if text.startswith("'"):
+        i = 1
+        while True:
+            i = text.find("'", i)
+            if i == -1:
+                return text[1:], ""
+            if text[i + 1 : i + 2] == "'":
+                i += 2
+                continue
+            return text[1:i], text[i + 1 :]
+    end = 0
+    while end < len(text) and not text[end].isspace() and text[end] not in "=:'":
+        end += 1
+    return text[:end], text[end:]
+
+
+def _is_property(body: str) -> bool:
+    key, sep, _ = body.partition(":")
+    return bool(sep) and key.isidentifier()
+
+
+def parse_tmdl(content: str, path: str = "") -> TmdlFile:
+    """
+    Parses the content of a TMDL file in a single pass over its lines.
+
+    The parser only understands the structure of the file (indentation, declarations,
+    `///` descriptions, properties and expression blocks). DAX and M expressions
+    are not parsed, only their position in the file is recorded.
+
+    Args:
+        content (str): The content of the TMDL file.
+        path (str, optional): The path of the file, used to name the objects' source file.
+
+    Returns:
+        TmdlFile: The parsed file with all declarations found.
+
+    Example:
+        >>> tmdl_file = parse_tmdl(file_content, "KPI.tmdl")
+        >>> [measure.name for measure in tmdl_file.measures]
+    """
+    file_name = os.path.basename(path)
+    tmdl_file = TmdlFile(path=path, file_name=file_name, content=content)
+
+    table: Optional[TmdlObject] = None
+    # Stack of open declarations, the innermost last
+    owners: List[TmdlObject] = []
+    pending_desc: List[Tuple[int, int, str]] = []
+    # State of an open multi-line expression
+    expr_owner: Optional[TmdlObject] = None
+    expr_indent = 0
+    expr_fenced = False
+    expr_is_declaration = False
+
+    pos = 0
+    length = len(content)
+    while pos < length:
+        next_nl = content.find("\n", pos)
+        line_end = length if next_nl == -1 else next_nl
+        next_pos = length if next_nl == -1 else next_nl + 1
+        line = content[pos:line_end]
+        if line.endswith("\r"):
+            line = line[:-1]
+            line_end -= 1
+        body = line.lstrip("\t")
+        indent = len(line) - len(body)
+        blank = not body.strip()
+
+        if expr_owner is not None:
+            if expr_fenced:
+                if expr_is_declaration:
+                    _extend_expression(expr_owner, pos, line_end)
+                for owner in owners:
+                    owner.end = next_pos
+                if body.rstrip().endswith("```"):
+                    expr_owner = None
+                pos = next_pos
+                continue
+            if blank or indent > expr_indent + 1:
+                if not blank:
+                    if expr_is_declaration:
+                        _extend_expression(expr_owner, pos, line_end)
+                    for owner in owners:
+                        owner.end = next_pos
+                pos = next_pos
+                continue
+            expr_owner = None
+
+        if blank:
+            pending_desc = []
+            pos = next_pos
+            continue
+
+        # Close declarations that this line is not a part of
+        while owners and indent <= owners[-1].indent:
+            owners.pop()
+        for owner in owners:
+            owner.end = next_pos
+
+        if body.startswith("///"):
+            pending_desc.append((pos, next_pos, body[3:].strip()))
+            pos = next_pos
+            continue
+
+        parent = owners[-1] if owners else None
+        opened: Optional[TmdlObject] = None
+        rest = ""
+
+        if parent is not None and indent == parent.indent + 1 and _is_property(body):
+            key, _, value = body.partition(":")
+            value = value.strip()
+            parent.properties[key] = value
+            if key == "lineageTag":
+                parent.lineage_tag = value
+        elif indent == 0 or (table is not None and parent is table and indent == 1):
+            keyword, _, remainder = body.partition(" ")
+            if keyword.isidentifier() and remainder and keyword != "ref":
+                name, rest = _read_name(remainder)
+                opened = TmdlObject(
+                    kind=keyword,
+                    name=name,
+                    file_name=file_name,
+                    path=path,
+                    table=None,
+                    indent=indent,
+                    start=pos,
+                    end=next_pos,
+                )
+                if pending_desc:
+                    opened.description_span = (pending_desc[0][0], pending_desc[-1][1])
+                    opened.description = "\n".join(text for _, _, text in pending_desc)
+                if indent == 0:
+                    table = opened if keyword == "table" else None
+                    opened.table = name if keyword == "table" else None
+                else:
+                    opened.table = table.name
+                tmdl_file.objects.append(opened)
+                owners.append(opened)
+
+        pending_desc = []
+
+        # Look for the start of an expression (`name = ...` or `key = ...`)
+        if opened is None:
+            if "=" not in body:
+                pos = next_pos
+                continue
+            rest = body[body.index("=") :]
+        rest_stripped = rest.strip()
+        if rest_stripped.startswith("="):
+            expression = rest_stripped[1:].strip()
+            owner = opened if opened is not None else parent
+            if owner is not None:
+                if not expression or expression == "```":
+                    expr_owner = owner
+                    expr_indent = indent
+                    expr_fenced = expression == "```"
+                    expr_is_declaration = opened is not None
+                elif opened is not None:
+                    after_eq = rest[rest.index("=") + 1 :]
+                    expr_start = (
+                        pos
+                        + len(line)
+                        - len(after_eq)
+                        + len(after_eq) - len(after_eq.lstrip())
+                    )
+                    opened.expression_span = (expr_start, pos + len(line.rstrip()))
+        pos = next_pos
+
+    return tmdl_file
+
+
+def _extend_expression(obj: TmdlObject, start: int, end: int):
+    if obj.expression_span is None:
+        obj.expression_span = (start, end)
+    else:
+        obj.expression_span = (obj.expression_span[0], end)
+
+
+def read_model_file(path: str, encoding: str = "utf-8") -> str:
+    """
+    Reads a text file through mmap.
+
+    The file is decoded straight from the mapped pages, so there is no copy of its
+    bytes next to the decoded text, which matters for files with large embedded M
+    queries. Line endings are normalized like in text mode.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                text = str(view, encoding)
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+class ModelIndex:
+    """
+    Index of all objects of a semantic model, built from its TMDL files.
+
+    Every file is parsed once with `parse_tmdl`; all lookups afterwards are served
+    from the index. Files can be added or replaced one by one, so a single changed
+    file can be re-parsed without parsing the whole model again.
+
+    Example:
+        >>> index = ModelIndex.from_files(list_files_in_directory(path, ".tmdl", recursive=True))
+        >>> index.get_objects("measures")
+    """
+
+    def __init__(self, files: Iterable[TmdlFile] = ()):
+        self.files: Dict[str, TmdlFile] = {}
+        # Lookups kept in step with the files by add/remove_file
+        self._objects: Dict[str, TmdlObject] = {}
+        self._by_name: Dict[Tuple[str, str], List[TmdlObject]] = {}
+        # By id(), the indexed files keep their objects alive
+        self._file_of: Dict[int, TmdlFile] = {}
+        for tmdl_file in files:
+            self.add(tmdl_file)
+
+    @classmethod
+    def from_files(cls, model_files: List[str], encoding: str = "utf-8") -> "ModelIndex":
+        """
+        Reads and parses the given TMDL files, one file at a time.
+
+        Raises:
+            TypeError: If any of the files is not a .tmdl file.
+        """
+        index = cls()
+        for file in model_files:
+            if not file.endswith(".tmdl"):
+                raise TypeError(f"{file} is not a .tmdl file")
+            index.add_file(file, read_model_file(file, encoding))
+        return index
+
+    def add_file(self, path: str, content: str) -> TmdlFile:
+        """Parses the content of a file and adds it to the index, replacing a previous version."""
+        tmdl_file = parse_tmdl(content, path)
+        self.add(tmdl_file)
+        return tmdl_file
+
+    def add(self, tmdl_file: TmdlFile):
+        """Adds an already parsed file to the index, replacing a previous version."""
+        self.remove_file(tmdl_file.path)
+        self.files[tmdl_file.path] = tmdl_file
+        for obj in tmdl_file.objects:
+            self._objects.setdefault(obj.key, obj)
+            self._by_name.setdefault((obj.kind, obj.name), []).append(obj)
+            self._file_of[id(obj)] = tmdl_file
+
+    def remove_file(self, path: str):
+        tmdl_file = self.files.pop(path, None)
+        if tmdl_file is None:
+            return
+        for obj in tmdl_file.objects:
+            del self._file_of[id(obj)]
+            if self._objects.get(obj.key) is obj:
+                del self._objects[obj.key]
+            same_name = self._by_name[(obj.kind, obj.name)]
+            same_name[:] = [other for other in same_name if other is not obj]
+            if not same_name:
+                del self._by_name[(obj.kind, obj.name)]
+
+    def objects(self, kind: str = None) -> List[TmdlObject]:
+        """Returns all objects of the given kind (all objects if kind is None) in file order."""
+        return [
+            obj
+            for tmdl_file in self.files.values()
+            for obj in tmdl_file.objects
+            if kind is None or obj.kind == kind
+        ]
+
+    def find(self, kind: str, name: str, table: str = None) -> Optional[TmdlObject]:
+        """Returns the first indexed object with the given kind and name, optionally within a table."""
+        if table is not None:
+            return self._objects.get(f"{kind}:{table}:{name}")
+        same_name = self._by_name.get((kind, name))
+        return same_name[0] if same_name else None
+
+    def file_of(self, obj: TmdlObject) -> Optional[TmdlFile]:
+        """Returns the file the object was parsed from, None if the object is not in the index."""
+        return self._file_of.get(id(obj))
+
+    def get_objects(self, model_element: str) -> dict:
+        """
+        Returns the names of the objects of the given type grouped by file name.
+
+        Args:
+            model_element (str): One of 'measures', 'columns' or 'tables'.
+
+        Returns:
+            dict: {file_name: [object names]}, files without such objects are omitted.
+
+        Raises:
+            Exception: If model_element is not one of the supported types.
+        """
+        kind = MODEL_ELEMENTS.get(model_element)
+        if kind is None:
+            raise Exception("Unknown model element")
+        all_objects = {}
+        for tmdl_file in self.files.values():
+            names = [obj.name for obj in tmdl_file.objects if obj.kind == kind]
+            if names:
+                all_objects.setdefault(tmdl_file.file_name, []).extend(names)
+        return all_objects
@@ -0,0 +1,93 @@
+import re
+from typing import Dict, List, Tuple
+from src.utils.tmdl_parser import TmdlFile, TmdlObject
+
+EMPTY_TABS_PATTERN = re.compile(r"\t+(?=\n)")
+
+
+def _description_lines(obj: TmdlObject, description: str, existing_line: str) -> str:
+    """Builds the `///` lines for an object, keeping the marker style of an existing description."""
+    marker = "/// "
+    if existing_line:
+        after_marker = existing_line.lstrip("\t")[3:]
+        marker = "///" + after_marker[: len(after_marker) - len(after_marker.lstrip(" "))]
+    indent = "\t" * obj.indent
+    lines = description.splitlines() or [""]
+    return "".join(f"{indent}{marker}{line}\n" for line in lines)
+
+
+def splice_descriptions(
+    content: str,
+    descriptions: List[Tuple[TmdlObject, str]],
+    strip_trailing_tabs: bool = False,
+) -> str:
+    """
+    Writes descriptions for already parsed objects into the file content in one pass.
+
+    Existing `///` descriptions are replaced, objects without a description get a new
+    `///` line just above their declaration. The content between the edited positions
+    is copied as is (optionally without the tabs at the end of its lines).
+
+    Args:
+        content (str): The content the objects were parsed from.
+        descriptions (list): Pairs of (object, description) to write.
+        strip_trailing_tabs (bool, optional): Whether to remove tabs at the end of lines.
+
+    Returns:
+        str: The updated content.
+    """
+    edits = []
+    for obj, description in descriptions:
+        if obj.description_span is not None:
+            start, end = obj.description_span
+            first_line = content[start:end].split("\n", 1)[0]
+        else:
+            start = end = obj.start
+            first_line = ""
+        edits.append((start, end, _description_lines(obj, description, first_line)))
+    edits.sort(key=lambda edit: edit[0])
+
+    parts = []
+    pos = 0
+    for start, end, text in edits:
+        if start < pos:
+            # The same object was given twice, the first description wins
+            continue
+        parts.append(content[pos:start])
+        parts.append(text)
+        pos = end
+    parts.append(content[pos:])
+
+    if strip_trailing_tabs:
+        # Edits always start and end at line boundaries, so the chunks can be cleaned one by one
+        parts = [EMPTY_TABS_PATTERN.sub("", part) for part in parts]
+    return "".join(parts)
+
+
+def write_descriptions(
+    tmdl_file: TmdlFile,
+    descriptions: Dict[Tuple[str, str], str],
+    strip_trailing_tabs: bool = False,
+) -> str:
+    """
+    Writes descriptions into a parsed TMDL file.
+
+    Args:
+        tmdl_file (TmdlFile): The parsed file.
+        descriptions (dict): Descriptions keyed by (object kind, object name),
+                             e.g. {("measure", "Sales"): "Total sales amount"}.
+                             Objects not present in the file are ignored.
+        strip_trailing_tabs (bool, optional): Whether to remove tabs at the end of lines.
+
+    Returns:
+        str: The updated content of the file.
+
+    Example:
+        >>> write_descriptions(tmdl_file, {("table", "Sales"): "Sales transactions"})
+    """
+    edits = [
+        (obj, descriptions[(obj.kind, obj.name)])
+        for obj in tmdl_file.objects
+        if (obj.kind, obj.name) in descriptions
+    ]
+    return splice_descriptions(tmdl_file.content, edits, strip_trailing_tabs)
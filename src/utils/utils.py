@@ -1,8 +1,12 @@
-import re
 import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
 from pydantic_ai import BinaryContent
-from typing import List
+from typing import List, Union
+from src.utils.tmdl_parser import MODEL_ELEMENTS, ModelIndex, parse_tmdl, read_model_file
+from src.utils.tmdl_writer import write_descriptions
 
 
 def update_measures_columns_descriptions(
@@ -17,7 +21,7 @@ def update_measures_columns_descriptions(
     Args:
         file_content (str): The content of the Power BI model file.
         mapping (dict): A dictionary mapping object names to their descriptions.
-                        Format: {object_name: object_description}
+                        Format: {object_name: {"description": str, "understanding_score": float}}
         object_to_map (str): The type of object to update descriptions for.
                             Must be either 'measure' or 'column'.
 
@@ -28,40 +32,18 @@ def update_measures_columns_descriptions(
         Exception: If object_to_map is not 'measure' or 'column'.
 
     Example:
-        >>> mapping = {"Sales": "Total sales amount", "Profit": "Net profit"}
+        >>> mapping = {"Sales": {"description": "Total sales amount", "understanding_score": 0.9}}
         >>> updated_content = update_measures_columns_descriptions(file_content, mapping, "measure")
     """
 
-    updated_content = file_content
     if object_to_map not in ["measure", "column"]:
         raise Exception("object_to_map must be either 'measure' or 'column'")
-    # Update measure descriptions based on the provided mapping
-    for object_name, content in mapping.items():
-        # Find and replace existing measure descriptions
-        object_description = content["description"]
-        understanding_score = content["understanding_score"]
-        # if understanding_score < 0.8:
-        #     continue
-
-        existing_desc_pattern = rf"(?<=\t///)(.*?)([\S]*?)(?=\n\t{object_to_map} '{re.escape(object_name)}')"
-        updated_content = re.sub(
-            existing_desc_pattern, f" {object_description}", updated_content
-        )
-
-        # Find measures without descriptions and add new descriptions
-        no_desc_pattern = (
-            rf"(?<=[\n\t]\n\t)({object_to_map} '?{re.escape(object_name)}'?)(?=\n| =)"
-        )
-        no_desc_matches = re.findall(no_desc_pattern, updated_content)
-        if len(no_desc_matches) == 1:
-            replacement = f"/// {object_description}\n\t{no_desc_matches[0]}"
-            updated_content = re.sub(no_desc_pattern, replacement, updated_content)
-
-    # Remove empty tabs at the end of lines
-    empty_tabs_pattern = r"\t+(?=\n)"
-    updated_content = re.sub(empty_tabs_pattern, "", updated_content)
-
-    return updated_content
+    tmdl_file = parse_tmdl(file_content)
+    descriptions = {
+        (object_to_map, object_name): content["description"]
+        for object_name, content in mapping.items()
+    }
+    return write_descriptions(tmdl_file, descriptions, strip_trailing_tabs=True)
 
 
 def update_table_description(file_content: str, description: str) -> str:
@@ -81,13 +63,11 @@ def update_table_description(file_content: str, description: str) -> str:
     Example:
         >>> updated_content = update_table_description(file_content, "Customer information table")
     """
-    existing_desc_pattern = r"(?<=///)(.*?)([\S]*?)(?=\ntable)"
-    search = re.search(existing_desc_pattern, file_content)
-    if search is not None:
-        updated_content = re.sub(existing_desc_pattern, description, file_content)
-    else:
-        updated_content = f"/// {description}\n" + file_content
-    return updated_content
+    tmdl_file = parse_tmdl(file_content)
+    tables = tmdl_file.tables
+    if not tables:
+        return f"/// {description}\n" + file_content
+    return write_descriptions(tmdl_file, {("table", tables[0].name): description})
 
 
 def list_files_in_directory(
@@ -120,6 +100,70 @@ def list_files_in_directory(
         ]
 
 
+def _read_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Read once, os.umask can only be read by setting it, which isn't thread safe
+UMASK = _read_umask()
+
+
+@contextmanager
+def atomic_open(path: str, encoding: str = "utf-8"):
+    """
+    Open a file for writing through a temporary file in the same folder, renamed over
+    the target when the block ends without error, so the file is either the old or
+    the new version, never partly written. Lets large files be written piece by piece.
+    The file keeps the permissions of the file it replaces, a new file gets the
+    default permissions (0o666 without the umask).
+
+    Args:
+        path (str): The file to write.
+        encoding (str, optional): The encoding of the file.
+
+    Example:
+        >>> with atomic_open("job.jsonl") as f:
+        ...     for line in lines:
+        ...         f.write(line)
+    """
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=folder
+    )
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file readable by the owner only
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        else:
+            os.chmod(temp_path, 0o666 & ~UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def atomic_write_file(path: str, content: str, encoding: str = "utf-8"):
+    """
+    Write a file through a temporary file in the same folder renamed over the target,
+    so the file is either the old or the new version, never partly written.
+
+    Args:
+        path (str): The file to write.
+        content (str): The new content.
+        encoding (str, optional): The encoding of the file.
+    """
+    with atomic_open(path, encoding) as f:
+        f.write(content)
+
+
 def load_file_to_binary(file_list: list[str]):
     files_binary = []
     for file_path in file_list:
@@ -134,69 +178,47 @@ def load_file_to_binary(file_list: list[str]):
     return files_binary
 
 
-async def get_objects_from_model(model_files: List[str], model_element: str) -> dict:
+def get_objects_from_model(
+    model_files: Union[List[str], ModelIndex], model_element: str
+) -> dict:
     """
     Extracts object names of specified type from multiple Power BI tabular model files.
 
-    This function uses regular expressions to find and extract names of objects
-    from Power BI tabular model files based on the specified model element type.
+    The files are parsed once into a `ModelIndex` and the names are read from the index.
+    An already built `ModelIndex` can be passed instead of the file list to avoid
+    reading and parsing the files again.
 
     Args:
-        model_files (List[str]): List of file paths to Power BI model files (.tmdl).
+        model_files (List[str] | ModelIndex): List of file paths to Power BI model files (.tmdl)
+                                              or an index built from them.
         model_element (str): The type of model element to extract. Must be one of:
                              'measures', 'columns', or 'tables'.
 
     Returns:
         dict: A dictionary where keys are file names and values are lists of object names found in each file.
-              Names are normalized to handle escaped single quotes.
+              Names are returned as written in the file, escaped single quotes ('') are kept.
 
     Raises:
         Exception: If model_element is not one of the supported types.
+        TypeError: If any of the files is not a .tmdl file.
 
     Example:
         >>> model_files = list_files_in_directory("path/to/models", "tmdl")
         >>> tables = get_objects_from_model(model_files, "tables")
     """
-    all_objects = {}
-    patterns = {
-        "measures": r"(?<=\n\tmeasure )(?:'((?:[^']|'')*)'|([^\s'=]+))(?= \=)",
-        "columns": r"(?<=\n\tcolumn )(?:'((?:[^']|'')*)'|([^\s'=]+))(?=\n| =)",
-        "tables": r"(?<=table )(?:'((?:[^']|'')*)'|([^\s'=]+))(?=\n)",
-    }
-    for file in model_files:
-        if not file.endswith(".tmdl"):
-            raise TypeError(f"{file} is not a .tmdl file")
-        # Read the file content
-
-        with open(file, "r", encoding="utf-8") as f:
-            model_ct = f.read()
-        # Find the table name
-        file_name = os.path.basename(file)
-
-        pattern = patterns.get(model_element)
-        if pattern is None:
-            raise Exception("Unknown model element")
-
-        matches = re.findall(pattern, model_ct)
-        matches = [match for match in matches if match[0] or match[1]]
-        # Extract the object names from the matches
-        # The first group is the name with single quotes, the second is without
-        # We want to use the first one if it exists, otherwise the second one
-        objects = [match[0] if match[0] else match[1] for match in matches]
-
-        if objects:
-            all_objects[file_name] = objects
-
-    return all_objects
+    if model_element not in MODEL_ELEMENTS:
+        raise Exception("Unknown model element")
+    if isinstance(model_files, ModelIndex):
+        model_index = model_files
+    else:
+        model_index = ModelIndex.from_files(model_files)
+    return model_index.get_objects(model_element)
 
 
 def concatenate_files_content(files_path: list, file_encoding: str = None) -> str:
-    files_content = []
-    for file in files_path:
-        with open(file, "r", encoding=file_encoding) as f:
-            files_content.append(f.read())
-    files_content_str = "\n".join(files_content)
-    return files_content_str
+    return "\n".join(
+        read_model_file(file, file_encoding or "utf-8") for file in files_path
+    )
 
 
 if __name__ == "__main__":
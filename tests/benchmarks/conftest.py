@@ -0,0 +1,21 @@
+import pytest
+
+_results = []
+
+
+@pytest.fixture
+def benchmark_report():
+    """Collect benchmark results, printed at the end of the session."""
+    return _results.append
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    terminalreporter.section("benchmarks")
+    for result in _results:
+        stages = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result["stages"].items())
+        terminalreporter.write_line(
+            f"{result['name']}: {result['objects']} objects, wall {result['wall_time']:.3f}s, "
+            f"peak memory {result['peak_memory'] / 2**20:.1f} MiB ({stages})"
+        )
@@ -0,0 +1,50 @@
+import asyncio
+import time
+import tracemalloc
+import pytest
+from src.agents.powerBI_documenter_agent import _prepare_model_context
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.synthetic_model import SyntheticModelSpec, write_synthetic_model
+from src.utils.tmdl_writer import write_descriptions
+
+# The fixture model has about 20 tables, columns and measures
+FIXTURE_OBJECTS = 20
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("scale", [100, 1_000])
+def test_parse_write_and_context_at_scale(scale, tmp_path, benchmark_report):
+    spec = SyntheticModelSpec.for_objects(FIXTURE_OBJECTS * scale, seed=scale)
+    folder = str(tmp_path / "Synthetic.SemanticModel")
+    model = write_synthetic_model(folder, spec)
+    descriptions = {(kind, name): f"Description of {name}" for kind, _, name, _ in model.objects}
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    snapshot = ModelSnapshot.load(folder)
+    parsed = time.perf_counter()
+    written = [write_descriptions(tmdl_file, descriptions) for tmdl_file in snapshot.tmdl_files()]
+    wrote = time.perf_counter()
+    context = asyncio.run(_prepare_model_context(snapshot))
+    finished = time.perf_counter()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    benchmark_report(
+        {
+            "name": f"model_scale[{scale}x]",
+            "objects": len(model.objects),
+            "wall_time": finished - started,
+            "stages": {
+                "parse": parsed - started,
+                "write": wrote - parsed,
+                "context": finished - wrote,
+            },
+            "peak_memory": peak_memory,
+        }
+    )
+    assert sum(len(snapshot.index.objects(kind)) for kind in ("table", "column", "measure")) == len(
+        model.objects
+    )
+    assert len(written) == len(model.files)
+    assert context.count("<file name=") == len(model.files)
@@ -0,0 +1,51 @@
+import asyncio
+import time
+import tracemalloc
+import pytest
+import src.agents.powerBI_documenter_agent as documenter_agent
+from power_bi_doctor import document_model
+from src.infrastructure.replay import RecordReplayModel, ResponseStore
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.synthetic_model import SyntheticModelSpec, write_synthetic_model
+
+# Simulated LLM latency of a replayed response in seconds
+REPLAY_LATENCY = 0.05
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("objects", [10, 1_000, 10_000])
+def test_pipeline_throughput(objects, fake_llm, tmp_path, mocker, benchmark_report):
+    model_folder = str(tmp_path / "Synthetic.SemanticModel")
+    write_synthetic_model(model_folder, SyntheticModelSpec.for_objects(objects))
+    store = ResponseStore(str(tmp_path / "recordings"))
+
+    # Record the fake LLM's responses once, the measured run replays them
+    mocker.patch.object(
+        documenter_agent, "model", RecordReplayModel(store, documenter_agent.model, "record")
+    )
+    asyncio.run(document_model(ModelSnapshot.load(model_folder)))
+    mocker.patch.object(
+        documenter_agent, "model", RecordReplayModel(store, mode="replay", latency=REPLAY_LATENCY)
+    )
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    snapshot = ModelSnapshot.load(model_folder)
+    load_time = time.perf_counter() - started
+    summary = asyncio.run(document_model(snapshot))
+    wall_time = time.perf_counter() - started
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    benchmark_report(
+        {
+            "name": f"pipeline[{objects}]",
+            "objects": len(snapshot.index.objects("table"))
+            + len(snapshot.index.objects("column"))
+            + len(snapshot.index.objects("measure")),
+            "wall_time": wall_time,
+            "stages": {"load": load_time, **summary["timings"]},
+            "peak_memory": peak_memory,
+        }
+    )
+    assert summary["documented_objects"] > 0
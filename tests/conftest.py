@@ -1,11 +1,40 @@
 import sys
 import os
+import re
+import ast
 import pytest
 import tempfile
+import threading
 import shutil
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.models.function import FunctionModel
 
 # Add the project root directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# The documenter agent creates its Gemini model on import, no request is sent in tests
+os.environ.setdefault("GEMINI_API_KEY", "test-api-key")
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-benchmarks",
+        action="store_true",
+        default=False,
+        help="Run the throughput benchmarks in tests/benchmarks",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks"):
+        return
+    skip_benchmark = pytest.mark.skip(reason="needs --run-benchmarks to run")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: throughput benchmark, slow")
 
 
 @pytest.fixture
@@ -21,6 +50,10 @@ def test_case_paths():
         ),
         "columns_init": os.path.join(test_case_dir, "column descriptions", "Init.tmdl"),
         "columns_goal": os.path.join(test_case_dir, "column descriptions", "Goal.tmdl"),
+        "tables_init": os.path.join(test_case_dir, "table descriptions", "table_2.tmdl"),
+        "tables_goal": os.path.join(
+            test_case_dir, "table descriptions", "table_2 goal.tmdl"
+        ),
         "model_folder": os.path.join(test_case_dir, "model fixtures"),
     }
 
@@ -57,3 +90,72 @@ def mock_agent_class(mocker):
     """Fixture to mock the Agent class."""
     mock_agent = mocker.patch("src.agents.agent.Agent")
     return mock_agent
+
+
+# ast.literal_eval isn't thread safe on Python 3.11 and the fake model runs in threads
+_literal_eval_lock = threading.Lock()
+
+
+def _prompt(messages) -> str:
+    """The system prompt parts and the user message of the request."""
+    return "\n".join(part.content for part in messages[0].parts)
+
+
+def _requested_objects(messages) -> dict:
+    system_prompt = _prompt(messages)
+    objects = re.search(r"<List of \w+'s>\n(.*)\n</List of", system_prompt).group(1)
+    with _literal_eval_lock:
+        return ast.literal_eval(objects)
+
+
+def _requested_object_type(messages) -> str:
+    system_prompt = _prompt(messages)
+    return re.search(r"<List of (\w+)'s>", system_prompt).group(1)
+
+
+class FakeLLMCalls(list):
+    """The requests of fake_llm; transform, if set, edits the documentation it returns."""
+
+    transform = None
+
+
+@pytest.fixture
+def fake_llm(mocker):
+    """Replace the Gemini model with a function documenting every requested object."""
+    calls = FakeLLMCalls()
+
+    def document_objects(messages, info):
+        system_prompt = _prompt(messages)
+        objects = _requested_objects(messages)
+        calls.append({"objects": objects, "system_prompt": system_prompt})
+        documentation = [
+            (
+                # Compact output format: names by ID
+                {"id": name, "description": f"Description of {names[name]}", "confidence": 90}
+                if isinstance(names, dict)
+                else {
+                    "type": _requested_object_type(messages),
+                    "name": name,
+                    "source_table": file_name.split(".")[0],
+                    "description": f"Description of {name}",
+                    "confidence": 90,
+                }
+            )
+            for file_name, names in objects.items()
+            for name in names
+        ]
+        if calls.transform is not None:
+            documentation = calls.transform(documentation)
+        return ModelResponse(
+            parts=[
+                ToolCallPart(
+                    info.output_tools[0].name,
+                    {"objects_documentation": documentation},
+                )
+            ]
+        )
+
+    mocker.patch(
+        "src.agents.powerBI_documenter_agent.model", FunctionModel(document_objects)
+    )
+    return calls
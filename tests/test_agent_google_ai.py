@@ -1,3 +1,8 @@
+import asyncio
+import itertools
+import time
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
 import pytest
 import src.agents.agent_google as agent_google
 
@@ -25,4 +30,238 @@ def test_agent_initialization(mocker):
     assert len(agent.tools) == 2
     assert agent.system_instruction == "Test system instruction"
     assert agent.temperature == 1
-    assert [name for name, _ in agent.avaible_functions.items()] == ["sample_function_1", "sample_function_2"]
\ No newline at end of file
+    assert [name for name, _ in agent.avaible_functions.items()] == ["sample_function_1", "sample_function_2"]
+
+class FakeFiles:
+    """Stand-in for client.files recording the calls."""
+
+    def __init__(self):
+        self.uploaded = {}
+        self.names = itertools.count()
+        self.uploads = 0
+        self.lists = 0
+        self.deleted = []
+
+    def upload(self, file, config):
+        self.uploads += 1
+        name = f"files/{next(self.names)}"
+        self.uploaded[name] = SimpleNamespace(
+            name=name,
+            uri=f"https://files.example/{name}",
+            mime_type=config.get("mime_type", "text/plain"),
+            display_name=config["display_name"],
+            expiration_time=datetime.now(timezone.utc) + timedelta(hours=48),
+        )
+        return self.uploaded[name]
+
+    def list(self):
+        self.lists += 1
+        return list(self.uploaded.values())
+
+    def delete(self, name):
+        self.deleted.append(name)
+        self.uploaded.pop(name)
+
+
+@pytest.fixture
+def model_files(tmp_path):
+    files = []
+    for name in ["Sales.tmdl", "Store.tmdl", "Date.tmdl"]:
+        path = tmp_path / name
+        path.write_text(f"table {name[:-5]}\n")
+        files.append(str(path))
+    return files
+
+
+def _agent(manifest_path, fake_files):
+    agent = agent_google.Agent(api_key="test-api-key", upload_manifest_path=manifest_path)
+    agent.client = type("Client", (), {"files": fake_files})()
+    return agent
+
+
+def test_upload_files_reuses_uploads_by_content(tmp_path, model_files):
+    fake_files = FakeFiles()
+    manifest_path = str(tmp_path / "uploads.json")
+
+    first = _agent(manifest_path, fake_files)._upload_files(model_files)
+    # A new session with the same manifest only checks the uploads in one listing
+    second = _agent(manifest_path, fake_files)._upload_files(model_files)
+
+    assert fake_files.uploads == 3
+    assert fake_files.lists == 1
+    assert [part.file_data.file_uri for part in first.parts] == [
+        part.file_data.file_uri for part in second.parts
+    ]
+
+    # A changed file with the same name is uploaded again
+    with open(model_files[0], "w") as f:
+        f.write("table Sales\n\tmeasure Total = 1\n")
+    third = _agent(manifest_path, fake_files)._upload_files(model_files)
+
+    assert fake_files.uploads == 4
+    assert third.parts[0].file_data.file_uri != first.parts[0].file_data.file_uri
+    assert third.parts[1:] == first.parts[1:]
+
+
+def test_upload_files_reuploads_expired_files(tmp_path, model_files):
+    fake_files = FakeFiles()
+    manifest_path = str(tmp_path / "uploads.json")
+    _agent(manifest_path, fake_files)._upload_files(model_files)
+
+    agent = _agent(manifest_path, fake_files)
+    agent.upload_manifest.clock = lambda: time.time() + 48 * 3600
+    agent._upload_files(model_files)
+
+    assert fake_files.uploads == 6
+
+
+def test_upload_files_reuploads_files_deleted_remotely(tmp_path, model_files):
+    fake_files = FakeFiles()
+    manifest_path = str(tmp_path / "uploads.json")
+    _agent(manifest_path, fake_files)._upload_files(model_files)
+    fake_files.uploaded.pop("files/1")
+
+    content = _agent(manifest_path, fake_files)._upload_files(model_files)
+
+    assert fake_files.uploads == 4
+    assert [part.file_data.file_uri for part in content.parts] == [
+        "https://files.example/files/0",
+        "https://files.example/files/3",
+        "https://files.example/files/2",
+    ]
+
+
+def test_upload_manifest_entries_without_expiry_expire_after_the_file_ttl():
+    now = [1000.0]
+    manifest = agent_google.UploadManifest(clock=lambda: now[0])
+    manifest.set("key", {"name": "files/0", "uri": "uri", "mime_type": "text/plain", "expires_at": None})
+
+    now[0] += 47 * 3600
+    assert manifest.get("key") is not None
+    now[0] += 3600
+    assert manifest.get("key") is None
+
+
+def test_clean_files(tmp_path, model_files):
+    fake_files = FakeFiles()
+    agent = _agent(str(tmp_path / "uploads.json"), fake_files)
+    agent._upload_files(model_files)
+
+    # The upload of a file is found even after the file changed
+    with open(model_files[0], "w") as f:
+        f.write("table Sales\n\tmeasure Total = 1\n")
+    agent._clean_files(model_files[:1])
+    assert fake_files.deleted == ["files/0"]
+    assert len(agent.upload_manifest.entries) == 2
+
+    agent._clean_files()
+    agent._clean_files()
+    assert sorted(fake_files.deleted) == ["files/0", "files/1", "files/2"]
+    assert fake_files.lists == 1
+    assert agent.upload_manifest.entries == {}
+
+
+class FakeAsyncModels:
+    """Stand-in for client.aio.models answering with a tool call first, then with text."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_content(self, model, contents, config):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        last_part = contents[-1].parts[0]
+        if last_part.function_response is None:
+            question = last_part.text
+            parts = [{"function_call": {"name": "sample_function_1", "args": {"arg1": len(question), "arg2": 1}}}]
+        else:
+            parts = [{"text": f"Answer {last_part.function_response.response['output']}"}]
+        return agent_google.types.GenerateContentResponse.model_validate(
+            {
+                "candidates": [{"content": {"role": "model", "parts": parts}}],
+                "usage_metadata": {"prompt_token_count": 10, "candidates_token_count": 2},
+            }
+        )
+
+
+class FakeAsyncFiles:
+    def __init__(self):
+        self.uploads = 0
+        self.lists = 0
+        self.uploaded = []
+
+    async def list(self):
+        self.lists += 1
+
+        async def pager():
+            for file in self.uploaded:
+                yield file
+
+        return pager()
+
+    async def upload(self, file, config):
+        self.uploads += 1
+        await asyncio.sleep(0.01)
+        name = f"files/{self.uploads}"
+        self.uploaded.append(
+            SimpleNamespace(
+                name=name,
+                uri=f"https://files.example/{name}",
+                mime_type=config.get("mime_type", "text/plain"),
+                expiration_time=None,
+            )
+        )
+        return self.uploaded[-1]
+
+
+def _async_agent(tmp_path):
+    agent = agent_google.AsyncAgent(
+        api_key="test-api-key",
+        tools=[sample_function_1, sample_function_2],
+        upload_manifest_path=str(tmp_path / "uploads.json"),
+    )
+    agent.client = SimpleNamespace(
+        aio=SimpleNamespace(models=FakeAsyncModels(), files=FakeAsyncFiles())
+    )
+    return agent
+
+
+def test_async_agent_binds_tools_like_agent():
+    kwargs = dict(api_key="test-api-key", tools=[sample_function_1, sample_function_2])
+    assert agent_google.AsyncAgent(**kwargs).tools == agent_google.Agent(**kwargs).tools
+
+
+def test_async_agent_runs_concurrent_sessions(tmp_path, model_files):
+    agent = _async_agent(tmp_path)
+    questions = ["a", "bb", "ccc", "dddd"]
+    sessions = [agent.new_session() for _ in questions]
+
+    async def run_all():
+        return await asyncio.gather(
+            *(
+                agent(session, question, files=model_files)
+                for session, question in zip(sessions, questions)
+            )
+        )
+
+    responses = asyncio.run(run_all())
+
+    assert [response.text for response in responses] == [
+        f"Answer {len(question) + 1}" for question in questions
+    ]
+    assert agent.client.aio.models.max_in_flight == len(questions)
+    # Every session has its own history: files, question, tool call, tool result, answer
+    assert [len(session.messages) for session in sessions] == [5] * len(questions)
+    assert sessions[0].messages[1].parts[0].text == "a"
+    assert [session.input_tokens for session in sessions] == [20] * len(questions)
+    assert agent.input_tokens == 20 * len(questions)
+    # The files were uploaded once for all sessions
+    assert agent.client.aio.files.uploads == len(model_files)
+
+    # Another call finds the uploads in the manifest and in one listing of the remote files
+    asyncio.run(agent(agent.new_session(), "e", files=model_files))
+    assert agent.client.aio.files.uploads == len(model_files)
+    assert agent.client.aio.files.lists == 1
@@ -0,0 +1,239 @@
+import ast
+import asyncio
+import json
+import re
+import httpx
+import pytest
+from pydantic_ai.models.gemini import GeminiModel
+from pydantic_ai.providers.google_gla import GoogleGLAProvider
+import src.agents.powerBI_documenter_agent as documenter_agent
+from src.infrastructure.context_cache import (
+    CachedContextClient,
+    ContextCache,
+    GeminiContextCache,
+    LocalContextCache,
+)
+from src.utils.model_snapshot import ModelSnapshot
+
+
+class FailingContextCache(ContextCache):
+    async def _create(self, model_name, context, config):
+        raise httpx.HTTPError("content is too small to be cached")
+
+    async def _delete(self, name):
+        pass
+
+
+def test_context_is_cached_once_for_concurrent_requests():
+    cache = LocalContextCache()
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.reference("gemini-2.0-flash", "<model_context>x</model_context>") for _ in range(5))
+        )
+
+    names = asyncio.run(run())
+
+    assert names == ["cachedContents/local-0"] * 5
+    assert len(cache.contexts) == 1
+    assert cache.references == 5
+    assert asyncio.run(cache.reference("gemini-2.0-flash", "other")) == "cachedContents/local-1"
+    asyncio.run(cache.clear())
+    assert cache.contexts == {}
+
+
+def test_context_not_cached_is_sent_with_the_request():
+    cache = FailingContextCache()
+
+    assert asyncio.run(cache.reference("gemini-2.0-flash", "<model_context>")) is None
+    assert cache.references == 0
+
+
+def test_context_is_cached_again_before_its_ttl_ends():
+    now = [0.0]
+    cache = LocalContextCache(ttl=600, clock=lambda: now[0])
+
+    async def reference():
+        return await cache.reference("gemini-2.0-flash", "<model_context>")
+
+    assert asyncio.run(reference()) == "cachedContents/local-0"
+    now[0] = 500
+    assert asyncio.run(reference()) == "cachedContents/local-0"
+    # Within the refresh margin of the TTL
+    now[0] = 550
+    assert asyncio.run(reference()) == "cachedContents/local-1"
+
+
+def test_contexts_are_deleted_when_the_last_session_ends():
+    cache = LocalContextCache()
+
+    async def run(context, seconds):
+        async with cache.session():
+            await cache.reference("gemini-2.0-flash", context)
+            await asyncio.sleep(seconds)
+            return len(cache.contexts)
+
+    async def run_all():
+        return await asyncio.gather(run("<model_context>a", 0), run("<model_context>b", 0.05))
+
+    # The first run ends while the second still uses the cache
+    assert asyncio.run(run_all()) == [2, 2]
+    assert cache.contexts == {} and cache.names == {}
+
+
+def test_missing_cached_context_is_cached_again():
+    cache = LocalContextCache()
+    sent = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        sent.append(body["cachedContent"])
+        if len(sent) == 1:
+            # Deleted on the provider before its TTL ended
+            return httpx.Response(404, json={"error": {"code": 404, "status": "NOT_FOUND"}})
+        return httpx.Response(200, json={"candidates": []})
+
+    client = CachedContextClient(cache, transport=httpx.MockTransport(handler))
+    body = {
+        "systemInstruction": {"parts": [{"text": "<model_context>"}]},
+        "contents": [{"role": "user", "parts": [{"text": "Describe"}]}],
+    }
+
+    async def run():
+        return await client.post(
+            "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent",
+            json=body,
+        )
+
+    response = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert sent == ["cachedContents/local-0", "cachedContents/local-1"]
+    assert list(cache.names.values()) == ["cachedContents/local-1"]
+
+
+def test_gemini_context_cache_requests():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.method == "POST":
+            return httpx.Response(200, json={"name": "cachedContents/abc"})
+        return httpx.Response(200, json={})
+
+    cache = GeminiContextCache(
+        api_key="test-api-key",
+        ttl=600,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+    async def run():
+        name = await cache.reference("gemini-2.0-flash", "<model_context>", {"tools": {"a": 1}})
+        await cache.clear()
+        return name
+
+    assert asyncio.run(run()) == "cachedContents/abc"
+    create, delete = requests
+    assert str(create.url).endswith("/v1beta/cachedContents")
+    assert create.headers["X-Goog-Api-Key"] == "test-api-key"
+    assert json.loads(create.content) == {
+        "model": "models/gemini-2.0-flash",
+        "contents": [{"role": "user", "parts": [{"text": "<model_context>"}]}],
+        "ttl": "600s",
+        "tools": {"a": 1},
+    }
+    assert delete.method == "DELETE"
+    assert str(delete.url).endswith("/v1beta/cachedContents/abc")
+
+
+@pytest.fixture
+def stub_gemini(mocker):
+    """GeminiModel sending its requests through CachedContextClient to a stub Gemini API."""
+    cache = LocalContextCache()
+    requests = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        text = "\n".join(part.get("text", "") for part in body["contents"][0]["parts"])
+        object_type = re.search(r"<List of (\w+)'s>", text).group(1)
+        objects = ast.literal_eval(re.search(r"<List of \w+'s>\n(.*)\n</List of", text).group(1))
+        config = cache.contexts[body["cachedContent"]]["config"]
+        tool_name = config["tools"]["functionDeclarations"][0]["name"]
+        documentation = [
+            {
+                "type": object_type,
+                "name": name,
+                "source_table": file_name.split(".")[0],
+                "description": f"Description of {name}",
+                "confidence": 90,
+            }
+            for file_name, names in objects.items()
+            for name in names
+        ]
+        return httpx.Response(
+            200,
+            json={
+                "candidates": [
+                    {
+                        "content": {
+                            "role": "model",
+                            "parts": [
+                                {
+                                    "functionCall": {
+                                        "name": tool_name,
+                                        "args": {"objects_documentation": documentation},
+                                    }
+                                }
+                            ],
+                        },
+                        "finishReason": "STOP",
+                        "index": 0,
+                    }
+                ],
+                "usageMetadata": {
+                    "promptTokenCount": 10,
+                    "candidatesTokenCount": 5,
+                    "totalTokenCount": 15,
+                    "cachedContentTokenCount": 8,
+                },
+            },
+        )
+
+    client = CachedContextClient(cache, transport=httpx.MockTransport(handler))
+    model = GeminiModel(
+        "gemini-2.0-flash", provider=GoogleGLAProvider(api_key="test-api-key", http_client=client)
+    )
+    mocker.patch.object(documenter_agent, "model", model)
+    return cache, requests
+
+
+def test_all_tasks_and_batches_reference_one_cached_context(stub_gemini, test_case_paths):
+    cache, requests = stub_gemini
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+
+    async def run():
+        return await asyncio.gather(
+            *(
+                documenter_agent.call_agent(
+                    task, snapshot=snapshot, batch_size=2, shared_context=True
+                )
+                for task in documenter_agent.TASK_OBJECT_TYPES
+            )
+        )
+
+    results = asyncio.run(run())
+
+    assert len(cache.contexts) == 1
+    [cached] = cache.contexts.values()
+    assert cached["context"].startswith("<model_context>")
+    assert cache.references == len(requests) > 3
+    for body in requests:
+        assert body["cachedContent"] == "cachedContents/local-0"
+        assert "systemInstruction" not in body and "tools" not in body
+        assert "<model_context>" not in json.dumps(body)
+        assert "Your Role" in body["contents"][0]["parts"][0]["text"]
+    documented = sum(len(result.objects_documentation) for result in results)
+    assert documented == len(snapshot.index.objects("measure")) + len(
+        snapshot.index.objects("column")
+    ) + len(snapshot.index.objects("table"))
@@ -0,0 +1,118 @@
+import asyncio
+from src.agents import powerBI_documenter_agent as documenter_agent
+from src.infrastructure.scheduler import estimate_tokens
+from src.utils.dax_dependencies import DependencyGraph, extract_references
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.synthetic_model import SyntheticModelSpec, generate_synthetic_model
+from src.utils.tmdl_parser import ModelIndex
+
+SALES = """table Sales
+\tcolumn Amount
+\t\tdataType: double
+
+\tcolumn ProductKey
+\t\tdataType: int64
+
+\tcolumn 'Net Amount' = Sales[Amount] * (1 - RELATED('Product'[Discount]))
+\t\tdataType: double
+
+\tmeasure Total = SUM(Sales[Amount])
+
+\tmeasure 'Total Net' = SUMX(Sales, [Net Amount])
+
+\tmeasure 'Net %' = DIVIDE([Total Net], [Total]) // not [Ignored]
+"""
+
+PRODUCT = """table Product
+\tcolumn ProductKey
+\t\tdataType: int64
+
+\tcolumn Discount
+\t\tdataType: double
+"""
+
+STORE = """table Store
+\tcolumn StoreKey
+\t\tdataType: int64
+
+\tmeasure 'Store Count' = COUNTROWS(Store)
+"""
+
+
+def _index():
+    index = ModelIndex()
+    for path, content in [("Sales.tmdl", SALES), ("Product.tmdl", PRODUCT), ("Store.tmdl", STORE)]:
+        index.add_file(path, content)
+    return index
+
+
+def test_extract_references():
+    references = extract_references(
+        "CALCULATE([Total], 'Date'[Year] = 2024, \"[not a measure]\") /* 'Skipped'[X] */"
+        " + COUNTROWS(Sales) + 'new''s'[a]]b]"
+    )
+
+    assert references.names == {"Total"}
+    assert references.columns == {("Date", "Year"), ("new''s", "a]b")}
+    # Function names are not table references
+    assert references.tables == {"Date", "Sales", "new''s"}
+
+
+def test_dependency_graph_closure():
+    graph = DependencyGraph(_index())
+
+    assert graph.dependencies("column:Sales:Net Amount") == {
+        "column:Sales:Amount",
+        "column:Product:Discount",
+        "table:Sales:Sales",
+        "table:Product:Product",
+    }
+    assert graph.dependencies("measure:Sales:Net %") == {
+        "measure:Sales:Total Net",
+        "measure:Sales:Total",
+    }
+    assert "column:Product:Discount" in graph.closure(["measure:Sales:Net %"])
+    assert graph.closure(["measure:Store:Store Count"]) == {
+        "measure:Store:Store Count",
+        "table:Store:Store",
+    }
+
+
+def test_dependency_context_contains_only_referenced_objects():
+    index = _index()
+    snapshot = ModelSnapshot(root=None, files=tuple(index.files), index=index)
+    graph = DependencyGraph(snapshot.index)
+
+    context = documenter_agent._prepare_dependency_context(
+        snapshot, graph, [snapshot.index.find("measure", "Total Net")]
+    )
+
+    assert "SUMX(Sales, [Net Amount])" in context
+    assert "RELATED('Product'[Discount])" in context
+    assert "\tcolumn ProductKey\n" in context
+    assert "Store" not in context
+    assert "Net %" not in context
+
+
+def test_call_agent_with_dependency_context(fake_llm):
+    model = generate_synthetic_model(SyntheticModelSpec(tables=60, m_query_lines=5))
+    index = ModelIndex()
+    for path, content in model.files.items():
+        index.add_file(path, content)
+    snapshot = ModelSnapshot(root=None, files=tuple(model.files), index=index)
+    first_table = index.objects("table")[0].name
+    measures = [obj for obj in index.objects("measure") if obj.table == first_table]
+
+    result = asyncio.run(
+        documenter_agent.call_agent(
+            "measure descriptions",
+            snapshot=snapshot,
+            batch_size=len(measures),
+            context="dependencies",
+        )
+    )
+
+    assert len(result.objects_documentation) == len(index.objects("measure"))
+    full_context = asyncio.run(documenter_agent._prepare_model_context(snapshot))
+    first_batch = fake_llm[0]["system_prompt"]
+    assert estimate_tokens(first_batch) * 10 < estimate_tokens(full_context)
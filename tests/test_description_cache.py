@@ -0,0 +1,41 @@
+from src.utils.description_cache import DescriptionCache, object_cache_key
+from src.utils.tmdl_parser import parse_tmdl
+
+MODEL = "table Sales\n\n\tmeasure Total =\n\t\t\tSUM(Sales[Amount])\n\t\tlineageTag: 1\n"
+
+
+def _measure_key(
+    content: str,
+    model_name: str = "gemini",
+    prompt_version: str = "1",
+    semantic_model: str = "Sales.SemanticModel",
+):
+    tmdl_file = parse_tmdl(content, "Sales.tmdl")
+    return object_cache_key(
+        tmdl_file, tmdl_file.measures[0], model_name, prompt_version, semantic_model
+    )
+
+
+def test_object_cache_key_ignores_descriptions_and_formatting():
+    documented = MODEL.replace("\tmeasure", "\t/// Sum of sales\n\tmeasure")
+    reformatted = MODEL.replace("\t\t\tSUM", "\n\t\t\t\tSUM").replace("lineageTag: 1", "lineageTag: 2")
+
+    assert _measure_key(documented) == _measure_key(MODEL)
+    assert _measure_key(reformatted) == _measure_key(MODEL)
+
+
+def test_object_cache_key_changes_with_definition_model_and_prompt():
+    key = _measure_key(MODEL)
+
+    assert _measure_key(MODEL.replace("SUM", "AVERAGE")) != key
+    assert _measure_key(MODEL, model_name="other") != key
+    assert _measure_key(MODEL, prompt_version="2") != key
+    assert _measure_key(MODEL, semantic_model="Stores.SemanticModel") != key
+
+
+def test_description_cache_roundtrip(tmp_path):
+    cache = DescriptionCache(str(tmp_path / "cache" / "descriptions.sqlite"))
+    cache.set_many({"a": '{"name": "A"}', "b": '{"name": "B"}'})
+
+    assert cache.get_many(["a", "c"]) == {"a": '{"name": "A"}'}
+    assert len(cache) == 2
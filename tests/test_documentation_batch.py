@@ -0,0 +1,268 @@
+import ast
+import asyncio
+import email.parser
+import json
+import re
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import power_bi_doctor
+from src.agents.documentation_batch import (
+    build_documentation_job,
+    documentation_requests,
+    run_documentation_job,
+    write_job_file,
+)
+from src.infrastructure.memory_budget import MemoryBudget, set_memory_budget
+from src.infrastructure.llm_clients.open_ai_client import OpenAiClient
+from src.utils.model_snapshot import ModelSnapshot
+
+
+class StubBatchServer(ThreadingHTTPServer):
+    """Local stand-in for the OpenAI files and batches endpoints."""
+
+    def __init__(self, fail_custom_ids=()):
+        super().__init__(("127.0.0.1", 0), StubBatchHandler)
+        self.fail_custom_ids = set(fail_custom_ids)
+        self.files = {}
+        self.batches = {}
+        self.polls = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/"
+
+    def add_file(self, content: str) -> dict:
+        file_id = f"file-{len(self.files)}"
+        self.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": 0,
+            "filename": "job.jsonl",
+            "purpose": "batch",
+            "status": "processed",
+        }
+
+    def output_line(self, request: dict) -> dict:
+        custom_id = request["custom_id"]
+        if custom_id in self.fail_custom_ids:
+            response = {"status_code": 500, "body": {"error": {"message": "server error"}}}
+            return {"id": custom_id, "custom_id": custom_id, "response": response, "error": None}
+        prompt = request["body"]["messages"][-1]["content"]
+        object_type = re.search(r"<List of (\w+)'s>", prompt).group(1)
+        objects = ast.literal_eval(re.search(r"<List of \w+'s>\n(.*)\n</List of", prompt).group(1))
+        documentation = [
+            (
+                {"id": name, "description": f"Description of {names[name]}", "confidence": 90}
+                if isinstance(names, dict)
+                else {
+                    "type": object_type,
+                    "name": name,
+                    "source_table": file_name.split(".")[0],
+                    "description": f"Description of {name}",
+                    "confidence": 90,
+                }
+            )
+            for file_name, names in objects.items()
+            for name in names
+        ]
+        body = {
+            "choices": [
+                {"message": {"role": "assistant", "content": json.dumps({"objects_documentation": documentation})}}
+            ],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 10},
+        }
+        return {
+            "id": custom_id,
+            "custom_id": custom_id,
+            "response": {"status_code": 200, "body": body},
+            "error": None,
+        }
+
+
+class StubBatchHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, content_type="application/json"):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/v1/files":
+            message = email.parser.BytesParser().parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+            )
+            [upload] = [part for part in message.get_payload() if part.get_filename()]
+            self._reply(self.server.add_file(upload.get_payload(decode=True).decode("utf-8")))
+        elif self.path == "/v1/batches":
+            request = json.loads(body)
+            batch = {
+                "id": f"batch_{len(self.server.batches)}",
+                "object": "batch",
+                "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"],
+                "completion_window": request["completion_window"],
+                "created_at": 0,
+                "status": "in_progress",
+            }
+            self.server.batches[batch["id"]] = batch
+            self._reply(batch)
+
+    def do_GET(self):
+        if self.path.startswith("/v1/batches/"):
+            batch = self.server.batches[self.path.rsplit("/", 1)[1]]
+            self.server.polls += 1
+            if self.server.polls > 2 and batch["status"] == "in_progress":
+                lines = self.server.files[batch["input_file_id"]].splitlines()
+                output = [self.server.output_line(json.loads(line)) for line in lines]
+                output_file = self.server.add_file("\n".join(json.dumps(line) for line in output))
+                batch.update(
+                    status="completed",
+                    output_file_id=output_file["id"],
+                    request_counts={"total": len(lines), "completed": len(lines), "failed": 0},
+                )
+            self._reply(batch)
+        elif self.path.endswith("/content"):
+            file_id = self.path.split("/")[-2]
+            self._reply(self.server.files[file_id].encode("utf-8"), "application/octet-stream")
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(**kwargs):
+        server = StubBatchServer(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def model_folder(test_case_paths, tmp_path, monkeypatch):
+    monkeypatch.setenv("DOCUMENTATION_CACHE_PATH", "")
+    monkeypatch.setattr("src.agents.documentation_batch.POLL_INTERVAL", 0)
+    folder = tmp_path / "Model.SemanticModel"
+    shutil.copytree(test_case_paths["model_folder"], folder)
+    return folder
+
+
+def test_documentation_job_requests(test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+
+    async def build():
+        job = await build_documentation_job(snapshot, "gpt-4o-mini", batch_size=3)
+        return job, [request async for request in documentation_requests(snapshot, job)]
+
+    job, requests = asyncio.run(build())
+
+    measures = snapshot.index.objects("measure")
+    assert [request["custom_id"] for request in requests] == list(job.batches)
+    assert [custom_id for custom_id in job.batches if custom_id.startswith("measure")] == [
+        f"measure descriptions/{number}" for number in range((len(measures) + 2) // 3)
+    ]
+    body = requests[0]["body"]
+    assert [message["role"] for message in body["messages"]] == ["system", "system", "user"]
+    assert body["messages"][0]["content"].startswith("<model_context>")
+    assert body["response_format"]["json_schema"]["name"] == "ObjectDetailsList"
+
+
+def test_document_model_with_batch_job(stub_server, model_folder, tmp_path, mocker):
+    server = stub_server(fail_custom_ids={"column descriptions/0"})
+    client = OpenAiClient(api_key="test-api-key", base_url=server.base_url, model_name="gpt-4o-mini")
+    interactive = mocker.patch.object(power_bi_doctor, "call_agent")
+
+    summary = asyncio.run(
+        power_bi_doctor.document_model(
+            ModelSnapshot.load(str(model_folder)), batch_client=client
+        )
+    )
+
+    interactive.assert_not_called()
+    job_lines = (tmp_path / "Model.SemanticModel_batch.jsonl").read_text().splitlines()
+    assert len(job_lines) == 3
+    for line in job_lines:
+        request = json.loads(line)
+        assert request["url"] == "/v1/chat/completions"
+        assert request["body"]["model"] == "gpt-4o-mini"
+    written = (tmp_path / "Model.SemanticModel_updated" / "KPI.tmdl").read_text(encoding="utf-8")
+    assert "/// Description of KPI01" in written
+    assert "/// Description of Category" not in written
+    assert summary["usage"]["requests"] == 3
+    assert summary["usage"]["failed"] == 1
+    assert summary["usage"]["input_tokens"] == 200
+
+
+def test_batch_job_compact_output_format(stub_server, model_folder, tmp_path):
+    server = stub_server()
+    client = OpenAiClient(api_key="test-api-key", base_url=server.base_url, model_name="gpt-4o-mini")
+    snapshot = ModelSnapshot.load(str(model_folder))
+
+    documentation = asyncio.run(
+        run_documentation_job(
+            client, snapshot, str(tmp_path / "job.jsonl"), output_format="compact"
+        )
+    )
+
+    request = json.loads((tmp_path / "job.jsonl").read_text().splitlines()[0])
+    assert request["body"]["response_format"]["json_schema"]["name"] == "CompactObjectDetailsList"
+    measures = documentation["measure descriptions"].objects_documentation
+    assert sorted(item.name for item in measures) == sorted(
+        obj.name for obj in snapshot.index.objects("measure")
+    )
+    assert all(item.type == "measure" for item in measures)
+
+
+def test_batch_job_needs_a_client_with_batch_support(model_folder, tmp_path):
+    class InteractiveClient(OpenAiClient):
+        supports_batches = False
+
+    client = InteractiveClient(api_key="test-api-key", base_url="http://localhost:1/v1/")
+
+    with pytest.raises(TypeError, match="doesn't support batch jobs"):
+        asyncio.run(
+            run_documentation_job(
+                client, ModelSnapshot.load(str(model_folder)), str(tmp_path / "job.jsonl")
+            )
+        )
+    assert not (tmp_path / "job.jsonl").exists()
+
+
+def test_job_file_is_written_one_request_at_a_time(test_case_paths, tmp_path):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+    client = OpenAiClient(api_key="test-api-key", model_name="gpt-4o-mini")
+    budget = MemoryBudget()
+    set_memory_budget(budget)
+
+    async def write():
+        job = await build_documentation_job(
+            snapshot, "gpt-4o-mini", batch_size=1, shared_context=False
+        )
+        return job, await write_job_file(client, snapshot, job, str(tmp_path / "job.jsonl"))
+
+    try:
+        job, count = asyncio.run(write())
+    finally:
+        set_memory_budget(None)
+
+    lines = (tmp_path / "job.jsonl").read_text(encoding="utf-8").splitlines()
+    assert count == len(lines) == len(job.batches) > 2
+    assert [json.loads(line)["custom_id"] for line in lines] == list(job.batches)
+    # Every request was built under a reservation, released before the next one
+    largest_file = max(len(tmdl_file.content) for tmdl_file in snapshot.tmdl_files())
+    assert 0 < budget.metrics.peak <= 2 * largest_file
+    assert budget.metrics.in_use == 0
@@ -0,0 +1,198 @@
+import json
+from types import SimpleNamespace
+import pytest
+import src.agents.agent as agent
+import src.agents.agent_google as agent_google
+from src.agents.history import GoogleHistory, HistoryManager, OpenAIHistory
+from google.genai import types
+
+
+def _openai_turn(i, result_size=4000):
+    return [
+        {"role": "user", "content": f"Question {i}"},
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_{i}",
+                    "type": "function",
+                    "function": {"name": "get_table", "arguments": "{}"},
+                }
+            ],
+        },
+        {"role": "tool", "tool_call_id": f"call_{i}", "content": json.dumps("x" * result_size)},
+        {"role": "assistant", "content": f"Answer {i}"},
+    ]
+
+
+def _openai_history(turns):
+    messages = [{"role": "system", "content": "You document Power BI models."}]
+    for i in range(turns):
+        messages += _openai_turn(i)
+    return messages
+
+
+def test_history_within_budget_is_unchanged():
+    messages = _openai_history(3)
+
+    assert OpenAIHistory(token_budget=0).compact(messages) is messages
+    assert OpenAIHistory(token_budget=100_000).compact(messages) is messages
+
+
+def test_history_summarizes_older_tool_results():
+    messages = _openai_history(6)
+    history = OpenAIHistory(token_budget=3000, keep_last_turns=2, max_tool_result_chars=100)
+
+    compacted = history.compact(messages)
+
+    assert compacted[0] == messages[0]
+    assert compacted[-8:] == messages[-8:]
+    assert len(compacted) == len(messages)
+    older_results = [message for message in compacted[:-8] if message["role"] == "tool"]
+    assert len(older_results) == 4
+    for message in older_results:
+        assert message["content"].startswith('"' + "x" * 99)
+        assert message["content"].endswith("characters of an older tool result removed]")
+    # Summarized results are not summarized again
+    assert history.compact(compacted) == compacted
+
+
+def test_history_drops_oldest_turns_whole():
+    messages = _openai_history(6)
+    history = OpenAIHistory(token_budget=2500, keep_last_turns=2, max_tool_result_chars=2000)
+
+    compacted = history.compact(messages)
+
+    assert compacted[0] == messages[0]
+    assert compacted[-8:] == messages[-8:]
+    assert sum(history._size(message) for message in compacted) <= 2500
+    user_messages = [message["content"] for message in compacted if message["role"] == "user"]
+    assert user_messages[-2:] == ["Question 4", "Question 5"]
+    tool_call_ids = {
+        call["id"] for message in compacted for call in message.get("tool_calls") or []
+    }
+    assert tool_call_ids == {
+        message["tool_call_id"] for message in compacted if message["role"] == "tool"
+    }
+
+
+def _function_result(name, result):
+    return types.Content(
+        role="user",
+        parts=[types.Part.from_function_response(name=name, response={"output": result})],
+    )
+
+
+def test_google_history_pins_file_parts():
+    files = types.Content(
+        role="user",
+        parts=[types.Part.from_uri(file_uri="https://files/1", mime_type="text/plain")],
+    )
+    messages = [files]
+    for i in range(5):
+        messages += [
+            types.Content(role="user", parts=[types.Part.from_text(text=f"Question {i}")]),
+            types.Content(
+                role="model",
+                parts=[types.Part.from_function_call(name="get_table", args={"name": str(i)})],
+            ),
+            _function_result("get_table", "y" * 4000),
+            types.Content(role="model", parts=[types.Part.from_text(text=f"Answer {i}")]),
+        ]
+    history = GoogleHistory(token_budget=1500, keep_last_turns=1, max_tool_result_chars=50)
+
+    compacted = history.compact(messages)
+
+    assert compacted[0] == files
+    assert compacted[-4:] == messages[-4:]
+    summarized = [
+        part.function_response.response["output"]
+        for message in compacted[1:-4]
+        for part in message.parts
+        if part.function_response
+    ]
+    assert summarized and all(result.startswith("y" * 50 + "...") for result in summarized)
+
+
+def test_google_agent_tool_loop_is_iterative_and_compacted(mocker):
+    def get_table(name: str):
+        """Columns of a table."""
+        return "z" * 4000
+
+    chat = agent_google.Agent(
+        api_key="test-api-key",
+        tools=[get_table],
+        history=GoogleHistory(token_budget=2000, keep_last_turns=1, max_tool_result_chars=50),
+    )
+    rounds = 40
+    sent = []
+
+    def generate_content(model, contents, config):
+        sent.append(sum(chat.history._size(message) for message in contents))
+        if len(sent) <= rounds:
+            part = types.Part.from_function_call(name="get_table", args={"name": str(len(sent))})
+        else:
+            part = types.Part(text="Done")
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[part]))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=1, candidates_token_count=1
+            ),
+        )
+
+    mocker.patch.object(chat.client.models, "generate_content", side_effect=generate_content)
+    chat("Describe the model")
+    chat("And again")
+
+    assert chat.last_assistant_message == "Done"
+    assert len(sent) == rounds + 2
+    # Older turns are summarized, only the current turn is resent whole
+    assert sent[-1] < sent[rounds - 1]
+    assert chat.messages[-1].parts[0].text == "Done"
+    assert chat.messages[-2].parts[0].text == "And again"
+
+
+def test_openai_agent_adds_tool_calls_before_results(mocker):
+    def get_table(name: str):
+        """Columns of a table."""
+        return f"columns of {name}"
+
+    chat = agent.Agent(api_key="test-api-key", tools=[get_table])
+    tool_call = SimpleNamespace(
+        id="call_0", function=SimpleNamespace(name="get_table", arguments='{"name": "Sales"}')
+    )
+    responses = iter(
+        [
+            SimpleNamespace(content=None, tool_calls=[tool_call]),
+            SimpleNamespace(content="Sales has columns", tool_calls=None),
+        ]
+    )
+    mocker.patch.object(
+        chat.client.beta.chat.completions,
+        "parse",
+        side_effect=lambda **kwargs: SimpleNamespace(
+            choices=[SimpleNamespace(message=next(responses))]
+        ),
+    )
+
+    chat("What is in Sales?")
+
+    assert [message["role"] for message in chat.messages] == [
+        "system",
+        "user",
+        "assistant",
+        "tool",
+        "assistant",
+    ]
+    assert chat.messages[2]["tool_calls"][0]["id"] == "call_0"
+    assert chat.messages[3] == {
+        "role": "tool",
+        "tool_call_id": "call_0",
+        "content": json.dumps("columns of Sales"),
+    }
+
+
+def test_history_manager_needs_a_message_format():
+    with pytest.raises(TypeError):
+        HistoryManager(token_budget=100)
@@ -0,0 +1,77 @@
+import os
+import shutil
+import subprocess
+import pytest
+from src.utils import incremental
+from src.utils.model_snapshot import ModelSnapshot
+
+
+@pytest.fixture
+def model_folder(test_case_paths, tmp_path):
+    folder = tmp_path / "Model.SemanticModel"
+    shutil.copytree(test_case_paths["model_folder"], folder)
+    return folder
+
+
+def test_changed_objects_since_manifest(model_folder, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    incremental.save_manifest(ModelSnapshot.load(str(model_folder)), manifest_path)
+
+    kpi_file = model_folder / "KPI.tmdl"
+    content = kpi_file.read_text(encoding="utf-8")
+    content = content.replace("BLANK()", "0")
+    content = content.replace("\tcolumn 'Category name'", "\t/// Name\n\tcolumn 'Category name'")
+    kpi_file.write_text(content, encoding="utf-8")
+    (model_folder / "Sales.tmdl").write_text("table Sales\n\n\tmeasure Total = 1\n")
+
+    changed = incremental.changed_objects_since(
+        ModelSnapshot.load(str(model_folder)), manifest_path
+    )
+
+    assert changed == {"measure:KPI:new''s measure", "table:Sales:Sales", "measure:Sales:Total"}
+
+
+def test_objects_excluded_from_manifest_count_as_changed(model_folder, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    snapshot = ModelSnapshot.load(str(model_folder))
+    incremental.save_manifest(snapshot, manifest_path, exclude={"column:Videos:Duration"})
+
+    changed = incremental.changed_objects_since(snapshot, manifest_path)
+
+    assert changed == {"column:Videos:Duration"}
+
+
+def test_changed_objects_since_timestamp(model_folder):
+    os.utime(model_folder / "KPI.tmdl", (1000, 1000))
+    os.utime(model_folder / "Videos.tmdl", (3000, 3000))
+
+    changed = incremental.changed_objects_since(ModelSnapshot.load(str(model_folder)), "2000")
+
+    assert changed == {
+        "table:Videos:Videos",
+        "column:Videos:Video ID",
+        "column:Videos:Duration",
+        "column:Videos:Video name",
+    }
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_changed_objects_since_git_ref(model_folder):
+    def git(*args):
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@test", *args],
+            cwd=model_folder,
+            check=True,
+            capture_output=True,
+        )
+
+    git("init")
+    git("add", ".")
+    git("commit", "-m", "baseline")
+    videos_file = model_folder / "Videos.tmdl"
+    videos_file.write_text(videos_file.read_text() + "\n\tcolumn Views\n")
+
+    changed = incremental.changed_objects_since(ModelSnapshot.load(str(model_folder)), "HEAD")
+
+    assert "column:Videos:Views" in changed
+    assert not any(key.startswith("measure:KPI") for key in changed)
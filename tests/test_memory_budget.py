@@ -0,0 +1,126 @@
+import asyncio
+import tracemalloc
+import pytest
+import src.agents.powerBI_documenter_agent as documenter_agent
+from src.infrastructure.memory_budget import MemoryBudget, peak_rss, set_memory_budget
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.synthetic_model import SyntheticModelSpec, write_synthetic_model
+from src.utils.tmdl_parser import read_model_file
+
+
+async def _hold(budget, size, running, peaks, seconds=0.01):
+    async with budget.reserve(size):
+        running.append(size)
+        peaks.append(sum(running))
+        await asyncio.sleep(seconds)
+        running.remove(size)
+
+
+def test_reservations_stay_under_the_cap():
+    budget = MemoryBudget(cap=100)
+    running, peaks = [], []
+
+    async def run():
+        await asyncio.gather(*(_hold(budget, 40, running, peaks) for _ in range(6)))
+
+    asyncio.run(run())
+
+    assert max(peaks) == 80
+    assert budget.metrics.peak == 80
+    assert budget.metrics.in_use == 0
+    assert budget.metrics.waits > 0
+
+
+def test_request_larger_than_the_cap_runs_alone():
+    budget = MemoryBudget(cap=100)
+    running, peaks = [], []
+
+    async def run():
+        await asyncio.gather(
+            _hold(budget, 30, running, peaks),
+            _hold(budget, 250, running, peaks),
+            _hold(budget, 30, running, peaks),
+        )
+
+    asyncio.run(run())
+
+    assert peaks == [30, 250, 30]
+
+
+def test_reservations_are_granted_in_arrival_order():
+    budget = MemoryBudget(cap=100)
+    order = []
+
+    async def hold(name, size):
+        async with budget.reserve(size):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        # The large request waits for the first one, the small ones behind it don't overtake it
+        await asyncio.gather(hold("first", 60), hold("large", 80), hold("small", 10), hold("small", 10))
+
+    asyncio.run(run())
+
+    assert order == ["first", "large", "small", "small"]
+
+
+def test_no_cap():
+    budget = MemoryBudget()
+    running, peaks = [], []
+
+    async def run():
+        await asyncio.gather(*(_hold(budget, 40, running, peaks) for _ in range(5)))
+
+    asyncio.run(run())
+
+    assert budget.metrics.peak == 200
+    assert budget.metrics.waits == 0
+
+
+def test_peak_rss():
+    rss = peak_rss()
+    assert rss is None or rss > 2**20
+
+
+def test_read_model_file(tmp_path):
+    path = tmp_path / "Sales.tmdl"
+    path.write_bytes("table Sales\r\n\tmeasure 'Café''s' = 1\r\n".encode("utf-8"))
+    (tmp_path / "Empty.tmdl").write_bytes(b"")
+
+    assert read_model_file(str(path)) == "table Sales\n\tmeasure 'Café''s' = 1\n"
+    assert read_model_file(str(tmp_path / "Empty.tmdl")) == ""
+
+
+def test_call_agent_under_a_memory_cap(fake_llm, test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+    largest_file = max(len(tmdl_file.content) for tmdl_file in snapshot.tmdl_files())
+    budget = MemoryBudget(cap=2 * largest_file)
+    set_memory_budget(budget)
+
+    try:
+        result = asyncio.run(
+            documenter_agent.call_agent(
+                "column descriptions", snapshot=snapshot, batch_size=1, max_concurrency=6
+            )
+        )
+    finally:
+        set_memory_budget(None)
+
+    assert len(result.objects_documentation) == 6
+    assert budget.metrics.peak <= budget.cap
+    assert budget.metrics.waits > 0
+    assert budget.metrics.in_use == 0
+
+
+def test_model_context_is_built_without_intermediate_copies(tmp_path):
+    folder = str(tmp_path / "Synthetic.SemanticModel")
+    write_synthetic_model(folder, SyntheticModelSpec(tables=20, m_query_lines=200))
+    snapshot = ModelSnapshot.load(folder)
+
+    tracemalloc.start()
+    context = asyncio.run(documenter_agent._prepare_model_context(snapshot, profile="none"))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert peak < 1.5 * len(context)
@@ -0,0 +1,19 @@
+import os
+from src.utils.model_snapshot import ModelSnapshot
+
+
+def test_model_snapshot_load(test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+
+    assert sorted(os.path.basename(path) for path in snapshot.files) == [
+        "KPI.tmdl",
+        "Videos.tmdl",
+    ]
+    assert [tmdl_file.path for tmdl_file in snapshot.tmdl_files()] == list(snapshot.files)
+    assert snapshot.index.get_objects("tables") == {
+        "KPI.tmdl": ["KPI"],
+        "Videos.tmdl": ["Videos"],
+    }
+    for path in snapshot.files:
+        with open(path, "r", encoding="utf-8") as f:
+            assert snapshot.content(path) == f.read()
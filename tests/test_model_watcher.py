@@ -0,0 +1,88 @@
+import asyncio
+import os
+import shutil
+import pytest
+from src.utils.incremental import changed_objects_between
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.model_watcher import ModelWatcher
+
+
+@pytest.fixture
+def model_folder(test_case_paths, tmp_path):
+    folder = tmp_path / "Model.SemanticModel"
+    shutil.copytree(test_case_paths["model_folder"], folder)
+    return folder
+
+
+def _append(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+    # Make the change visible even on file systems with coarse modification times
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class ScriptedClock:
+    """Clock advanced by the watcher's sleeps, running the edits due at every tick."""
+
+    def __init__(self, edits):
+        self.now = 0.0
+        self.edits = dict(edits)
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+        for at in sorted(self.edits):
+            if at <= self.now:
+                self.edits.pop(at)()
+
+
+def test_watcher_debounces_bursts_of_saves(model_folder):
+    kpi, videos = str(model_folder / "KPI.tmdl"), str(model_folder / "Videos.tmdl")
+    new_file = str(model_folder / "Sales.tmdl")
+    clock = ScriptedClock(
+        {
+            1: lambda: _append(kpi, "\n"),
+            2: lambda: _append(videos, "\n"),
+            3: lambda: _append(new_file, "table Sales\n"),
+            20: lambda: _append(kpi, "\n"),
+        }
+    )
+    watcher = ModelWatcher(
+        str(model_folder), poll_interval=1, debounce=5, clock=clock, sleep=clock.sleep
+    )
+
+    async def run():
+        bursts = []
+        async for changed in watcher.changes():
+            bursts.append((clock.now, changed))
+            if len(bursts) == 2:
+                return bursts
+
+    bursts = asyncio.run(run())
+
+    assert bursts == [(8, {kpi, videos, new_file}), (25, {kpi})]
+
+
+def test_snapshot_reload_and_changed_objects(model_folder):
+    kpi, videos = str(model_folder / "KPI.tmdl"), str(model_folder / "Videos.tmdl")
+    snapshot = ModelSnapshot.load(str(model_folder))
+    content = open(kpi, encoding="utf-8").read()
+    content = content.replace("BLANK()", "0").replace(
+        "\tmeasure KPI01", "\t/// Edited description\n\tmeasure KPI01"
+    )
+    with open(kpi, "w", encoding="utf-8") as f:
+        f.write(content + "\n\tmeasure Added = 1\n")
+    os.remove(videos)
+
+    current = snapshot.reload([kpi, videos])
+
+    assert current.files == (kpi,)
+    assert current.tmdl_file(kpi).content.endswith("measure Added = 1\n")
+    # Description edits are no definition change
+    assert changed_objects_between(snapshot, current, [kpi, videos]) == {
+        "measure:KPI:new''s measure",
+        "measure:KPI:Added",
+    }
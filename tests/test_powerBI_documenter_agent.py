@@ -0,0 +1,173 @@
+import re
+import asyncio
+import shutil
+import pytest
+import src.agents.powerBI_documenter_agent as documenter_agent
+from src.utils.description_cache import DescriptionCache
+from src.utils.model_snapshot import ModelSnapshot
+
+
+def test_call_agent_single_prompt(fake_llm, test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+
+    result = asyncio.run(
+        documenter_agent.call_agent("column descriptions", snapshot=snapshot)
+    )
+
+    assert len(fake_llm) == 1
+    assert len(result.objects_documentation) == 6
+
+
+def test_call_agent_sharded(fake_llm, test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+
+    result = asyncio.run(
+        documenter_agent.call_agent(
+            "column descriptions", snapshot=snapshot, batch_size=2, max_concurrency=2
+        )
+    )
+
+    assert len(fake_llm) == 3
+    assert sorted(item.name for item in result.objects_documentation) == sorted(
+        ["KPI''s name", "Category", "Category name", "Video ID", "Duration", "Video name"]
+    )
+    for call in fake_llm:
+        # Only the files with the batch's objects are part of the context
+        context_files = re.findall(r"<file name='([^']+)'>", call["system_prompt"])
+        assert context_files == list(call["objects"])
+
+
+def test_call_agent_uses_description_cache(fake_llm, test_case_paths, tmp_path):
+    model_folder = tmp_path / "Model.SemanticModel"
+    shutil.copytree(test_case_paths["model_folder"], model_folder)
+    cache = DescriptionCache(str(tmp_path / "descriptions.sqlite"))
+    first = asyncio.run(
+        documenter_agent.call_agent(
+            "measure descriptions",
+            snapshot=ModelSnapshot.load(str(model_folder)),
+            cache=cache,
+        )
+    )
+
+    kpi_file = model_folder / "KPI.tmdl"
+    kpi_file.write_text(kpi_file.read_text(encoding="utf-8").replace("BLANK()", "0"))
+    second = asyncio.run(
+        documenter_agent.call_agent(
+            "measure descriptions",
+            snapshot=ModelSnapshot.load(str(model_folder)),
+            cache=cache,
+        )
+    )
+
+    assert len(first.objects_documentation) == 3
+    assert len(second.objects_documentation) == 3
+    assert len(fake_llm) == 2
+    assert fake_llm[1]["objects"] == {"KPI.tmdl": ["new''s measure"]}
+
+
+def test_normalize_name():
+    normalize = documenter_agent._normalize_name
+
+    assert normalize("KPI''s name") == normalize("KPI's name") == normalize("'KPI''s name'")
+    assert normalize("[Video ID]") == normalize("video id")
+    assert normalize("Category") != normalize("Category name")
+
+
+def test_call_agent_requests_only_missing_objects(fake_llm, test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+
+    def incomplete_first_answer(documentation):
+        if len(fake_llm) > 1:
+            return documentation
+        for item in documentation:
+            item["name"] = item["name"].replace("''", "'")
+        return [item for item in documentation if item["name"] not in ("Duration", "Category")]
+
+    fake_llm.transform = incomplete_first_answer
+
+    result = asyncio.run(
+        documenter_agent.call_agent("column descriptions", snapshot=snapshot)
+    )
+
+    assert len(fake_llm) == 2
+    assert fake_llm[1]["objects"] == {"KPI.tmdl": ["Category"], "Videos.tmdl": ["Duration"]}
+    assert sorted(item.name for item in result.objects_documentation) == sorted(
+        ["KPI''s name", "Category", "Category name", "Video ID", "Duration", "Video name"]
+    )
+
+
+def test_call_agent_reconcile_retry_budget(fake_llm, test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+    fake_llm.transform = lambda documentation: [
+        item for item in documentation if item["name"] != "Category"
+    ]
+
+    result = asyncio.run(
+        documenter_agent.call_agent(
+            "column descriptions", snapshot=snapshot, reconcile_retries=3
+        )
+    )
+
+    assert len(fake_llm) == 4
+    assert [call["objects"] for call in fake_llm[1:]] == [{"KPI.tmdl": ["Category"]}] * 3
+    assert len(result.objects_documentation) == 5
+
+
+def test_call_agent_compact_output_format(fake_llm, test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+    full = asyncio.run(
+        documenter_agent.call_agent("column descriptions", snapshot=snapshot)
+    )
+    fake_llm.clear()
+
+    compact = asyncio.run(
+        documenter_agent.call_agent(
+            "column descriptions", snapshot=snapshot, output_format="compact"
+        )
+    )
+
+    [call] = fake_llm
+    columns = snapshot.index.objects("column")
+    assert {
+        object_id: name for names in call["objects"].values() for object_id, name in names.items()
+    } == {f"c{number}": obj.name for number, obj in enumerate(columns)}
+    assert "`CompactObjectDetails`" in call["system_prompt"]
+    # Mapped back with the model index to what the full format returns
+    assert [item.model_dump() for item in compact.objects_documentation] == [
+        item.model_dump() for item in full.objects_documentation
+    ]
+
+
+def test_compact_output_format_drops_unknown_ids_and_requests_them_again(
+    fake_llm, test_case_paths
+):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+
+    def wrong_id_first(documentation):
+        if len(fake_llm) == 1:
+            documentation[0]["id"] = "c99"
+        return documentation
+
+    fake_llm.transform = wrong_id_first
+
+    result = asyncio.run(
+        documenter_agent.call_agent(
+            "column descriptions", snapshot=snapshot, output_format="compact"
+        )
+    )
+
+    first = snapshot.index.objects("column")[0]
+    assert len(fake_llm) == 2
+    assert fake_llm[1]["objects"] == {first.file_name: {"c0": first.name}}
+    assert len(result.objects_documentation) == 6
+
+
+def test_call_agent_unknown_output_format(test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+
+    with pytest.raises(ValueError, match="Unknown output format"):
+        asyncio.run(
+            documenter_agent.call_agent(
+                "column descriptions", snapshot=snapshot, output_format="short"
+            )
+        )
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import pytest
+import power_bi_doctor
+from src.agents.powerBI_documenter_agent import ObjectDetails, ObjectDetailsList
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.output_modes import prepare_output
+
+
+@pytest.fixture
+def model_folder(test_case_paths, tmp_path, monkeypatch):
+    monkeypatch.setenv("DOCUMENTATION_CACHE_PATH", "")
+    folder = tmp_path / "Model.SemanticModel"
+    shutil.copytree(test_case_paths["model_folder"], folder)
+    return folder
+
+
+def _documentation(objects):
+    return ObjectDetailsList(
+        objects_documentation=[
+            ObjectDetails(
+                type=obj.kind,
+                name=obj.name,
+                source_table=obj.table,
+                description=f"Description of {obj.name}",
+                confidence=90,
+            )
+            for obj in objects
+        ]
+    )
+
+
+def test_applier_writes_each_file_once_when_complete(model_folder, tmp_path, mocker):
+    snapshot = ModelSnapshot.load(str(model_folder))
+    output_folder = str(tmp_path / "Model.SemanticModel_updated")
+    shutil.copytree(model_folder, output_folder)
+    writes = mocker.spy(power_bi_doctor, "atomic_write_file")
+    applier = power_bi_doctor.DescriptionApplier(snapshot, output_folder)
+    kpi = snapshot.tmdl_file(str(model_folder / "KPI.tmdl"))
+
+    async def run():
+        writer = asyncio.create_task(applier.run())
+        for kind in ("measure", "table"):
+            await applier.submit(kpi.of_kind(kind), _documentation(kpi.of_kind(kind)))
+            await asyncio.sleep(0)
+        assert writes.call_count == 0
+        await applier.submit(kpi.columns, _documentation(kpi.columns))
+        await asyncio.sleep(0.1)
+        assert writes.call_count == 1
+        await applier.close()
+        await writer
+
+    asyncio.run(run())
+
+    written = (tmp_path / "Model.SemanticModel_updated" / "KPI.tmdl").read_text(encoding="utf-8")
+    for obj in kpi.objects:
+        if obj.kind in ("table", "column", "measure"):
+            assert f"/// Description of {obj.name}" in written
+    assert writes.call_count == 1
+    assert applier.updated_files == 1
+    assert not [name for name in os.listdir(output_folder) if name.endswith(".tmp")]
+
+
+def test_applier_reports_objects_left_undocumented(model_folder):
+    snapshot = ModelSnapshot.load(str(model_folder))
+    applier = power_bi_doctor.DescriptionApplier(snapshot, None)
+    kpi = snapshot.tmdl_file(str(model_folder / "KPI.tmdl"))
+
+    async def run():
+        writer = asyncio.create_task(applier.run())
+        await applier.submit(kpi.measures, _documentation(kpi.measures))
+        await applier.close()
+        await writer
+
+    asyncio.run(run())
+
+    assert applier.documented == {obj.key for obj in kpi.measures}
+    assert applier.undocumented == applier.documenting - applier.documented
+    assert {obj.key for obj in kpi.columns} <= applier.undocumented
+
+
+def test_document_model_keeps_results_of_finished_tasks(fake_llm, model_folder, tmp_path, mocker):
+    call_agent = power_bi_doctor.call_agent
+
+    async def failing_columns(task, **kwargs):
+        if task == "column descriptions":
+            await asyncio.sleep(0.1)
+            raise RuntimeError("LLM unavailable")
+        return await call_agent(task, **kwargs)
+
+    mocker.patch.object(power_bi_doctor, "call_agent", failing_columns)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(power_bi_doctor.document_model(ModelSnapshot.load(str(model_folder))))
+
+    written = (tmp_path / "Model.SemanticModel_updated" / "KPI.tmdl").read_text(encoding="utf-8")
+    assert "/// Description of KPI01" in written
+    assert "/// Description of Category" not in written
+
+
+def test_document_model_cancels_other_tasks_on_failure(fake_llm, model_folder, mocker):
+    cancelled = []
+
+    async def failing_columns(task, **kwargs):
+        if task == "column descriptions":
+            raise RuntimeError("LLM unavailable")
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(task)
+            raise
+
+    mocker.patch.object(power_bi_doctor, "call_agent", failing_columns)
+    close = power_bi_doctor.DescriptionApplier.close
+    cancelled_at_close = []
+
+    async def recording_close(applier):
+        cancelled_at_close.extend(cancelled)
+        await close(applier)
+
+    mocker.patch.object(power_bi_doctor.DescriptionApplier, "close", recording_close)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(power_bi_doctor.document_model(ModelSnapshot.load(str(model_folder))))
+
+    assert sorted(cancelled_at_close) == ["measure descriptions", "table descriptions"]
+
+
+def _read(path):
+    return path.read_text(encoding="utf-8")
+
+
+def test_output_mode_in_place(fake_llm, model_folder, tmp_path):
+    summary = asyncio.run(
+        power_bi_doctor.document_model(
+            ModelSnapshot.load(str(model_folder)), output_mode="in-place"
+        )
+    )
+
+    assert summary["updated_folder"] == str(model_folder)
+    assert "/// Description of KPI01" in _read(model_folder / "KPI.tmdl")
+    assert not (tmp_path / "Model.SemanticModel_updated").exists()
+
+
+def test_output_mode_hardlink(fake_llm, model_folder, tmp_path):
+    original = _read(model_folder / "KPI.tmdl")
+    (model_folder / "data.bin").write_bytes(b"large unchanged file")
+
+    summary = asyncio.run(
+        power_bi_doctor.document_model(
+            ModelSnapshot.load(str(model_folder)), output_mode="hardlink"
+        )
+    )
+
+    updated_folder = tmp_path / "Model.SemanticModel_updated"
+    assert summary["updated_folder"] == str(updated_folder)
+    assert os.path.samefile(model_folder / "data.bin", updated_folder / "data.bin")
+    assert not os.path.samefile(model_folder / "KPI.tmdl", updated_folder / "KPI.tmdl")
+    assert "/// Description of KPI01" in _read(updated_folder / "KPI.tmdl")
+    assert _read(model_folder / "KPI.tmdl") == original
+
+
+def test_output_mode_copy_after_hardlink(model_folder, tmp_path):
+    (model_folder / "data.bin").write_bytes(b"large unchanged file")
+    prepare_output(str(model_folder), "hardlink")
+
+    prepare_output(str(model_folder), "copy")
+
+    updated_folder = tmp_path / "Model.SemanticModel_updated"
+    assert not os.path.samefile(model_folder / "data.bin", updated_folder / "data.bin")
+    assert _read(updated_folder / "KPI.tmdl") == _read(model_folder / "KPI.tmdl")
+
+
+def test_output_mode_patch(fake_llm, model_folder, tmp_path):
+    original = _read(model_folder / "KPI.tmdl")
+
+    summary = asyncio.run(
+        power_bi_doctor.document_model(
+            ModelSnapshot.load(str(model_folder)), output_mode="patch"
+        )
+    )
+
+    patch = _read(tmp_path / "Model.SemanticModel.patch")
+    assert summary["updated_folder"] is None
+    assert summary["patch_path"] == str(tmp_path / "Model.SemanticModel.patch")
+    assert patch.startswith("--- a/KPI.tmdl\n+++ b/KPI.tmdl\n")
+    assert "\n--- a/Videos.tmdl\n" in patch
+    assert "+\t/// Description of KPI01\n" in patch
+    assert _read(model_folder / "KPI.tmdl") == original
+    assert not (tmp_path / "Model.SemanticModel_updated").exists()
+
+    subprocess.run(
+        ["git", "apply", str(tmp_path / "Model.SemanticModel.patch")],
+        cwd=model_folder,
+        check=True,
+    )
+    assert "/// Description of KPI01" in _read(model_folder / "KPI.tmdl")
+
+
+def test_applier_doesnt_overwrite_files_changed_on_disk(model_folder):
+    snapshot = ModelSnapshot.load(str(model_folder))
+    kpi = snapshot.tmdl_file(str(model_folder / "KPI.tmdl"))
+    edited = kpi.content + "\n\tmeasure Saved = 1\n"
+    (model_folder / "KPI.tmdl").write_text(edited, encoding="utf-8")
+    applier = power_bi_doctor.DescriptionApplier(snapshot, str(model_folder))
+
+    async def run():
+        writer = asyncio.create_task(applier.run())
+        await applier.submit(kpi.measures, _documentation(kpi.measures))
+        await applier.close()
+        await writer
+
+    asyncio.run(run())
+
+    assert _read(model_folder / "KPI.tmdl") == edited
+    assert applier.skipped_files == [kpi.path]
+    assert applier.updated_files == 0
+
+
+def test_watch_model_documents_only_changed_objects(fake_llm, model_folder):
+    kpi = model_folder / "KPI.tmdl"
+    watcher = power_bi_doctor.ModelWatcher(str(model_folder), poll_interval=0.01, debounce=0.05)
+
+    async def edit():
+        await asyncio.sleep(0.05)
+        content = _read(kpi).replace("\tmeasure KPI01", "\t/// Edited by hand\n\tmeasure KPI01")
+        kpi.write_text(content + "\n\tmeasure 'Added measure' = 1\n", encoding="utf-8")
+
+    async def run():
+        editor = asyncio.create_task(edit())
+        summaries = await power_bi_doctor.watch_model(str(model_folder), watcher=watcher, rounds=1)
+        await editor
+        return summaries
+
+    [summary] = asyncio.run(run())
+
+    assert [call["objects"] for call in fake_llm] == [{"KPI.tmdl": ["Added measure"]}]
+    assert summary["documented_objects"] == 1
+    written = _read(kpi)
+    assert "\t/// Description of Added measure\n\tmeasure 'Added measure' = 1" in written
+    assert "/// Edited by hand\n\tmeasure KPI01" in written
+    assert "/// Description of KPI01" not in written
+
+
+def test_watch_model_reports_the_usage_of_every_round(fake_llm, model_folder):
+    kpi = model_folder / "KPI.tmdl"
+    watcher = power_bi_doctor.ModelWatcher(str(model_folder), poll_interval=0.01, debounce=0.05)
+    ledger = power_bi_doctor.UsageLedger()
+
+    async def edit():
+        for name in ("First", "Second"):
+            while len(fake_llm) < (name == "Second"):
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)
+            kpi.write_text(_read(kpi) + f"\n\tmeasure {name} = 1\n", encoding="utf-8")
+
+    async def run():
+        editor = asyncio.create_task(edit())
+        summaries = await power_bi_doctor.watch_model(
+            str(model_folder), ledger=ledger, watcher=watcher, rounds=2
+        )
+        await editor
+        return summaries
+
+    summaries = asyncio.run(run())
+
+    assert [summary["usage"]["requests"] for summary in summaries] == [1, 1]
+    assert ledger.summary()["requests"] == 2
@@ -0,0 +1,54 @@
+import asyncio
+import json
+import os
+import shutil
+import pytest
+import power_bi_fleet
+
+
+@pytest.fixture
+def fleet_folder(test_case_paths, tmp_path, monkeypatch):
+    monkeypatch.setenv("DOCUMENTATION_CACHE_PATH", "")
+    for name in ["Sales", "Marketing"]:
+        shutil.copytree(
+            test_case_paths["model_folder"], tmp_path / f"{name}.SemanticModel"
+        )
+    broken = tmp_path / "Broken.SemanticModel"
+    broken.mkdir()
+    (broken / "Table.tmdl").write_bytes(b"table \xff\xfe\n")
+    return tmp_path
+
+
+def test_expand_model_paths(fleet_folder):
+    model_paths = power_bi_fleet.expand_model_paths(
+        [str(fleet_folder / "*.SemanticModel"), str(fleet_folder / "Sales.SemanticModel")]
+    )
+
+    assert [os.path.basename(path) for path in model_paths] == [
+        "Broken.SemanticModel",
+        "Marketing.SemanticModel",
+        "Sales.SemanticModel",
+    ]
+
+
+def test_run_fleet_reports_failures_without_stopping(fake_llm, fleet_folder):
+    report_path = fleet_folder / "report.json"
+    args = power_bi_fleet.parse_args(
+        [
+            str(fleet_folder / "*.SemanticModel"),
+            "--parse-workers",
+            "2",
+            "--report",
+            str(report_path),
+        ]
+    )
+
+    summary = asyncio.run(power_bi_fleet.main(args))
+
+    assert summary["succeeded"] == 2
+    assert summary["failed_models"] == [str(fleet_folder / "Broken.SemanticModel")]
+    assert summary["documented_objects"] == 2 * 11
+    assert (fleet_folder / "Sales.SemanticModel_updated" / "KPI.tmdl").exists()
+    report = json.loads(report_path.read_text())
+    assert report["summary"] == summary
+    assert report["models"][0]["error"].startswith("UnicodeDecodeError")
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from google.genai import types
+from openai.types.chat import ChatCompletion
+import src.agents.agent as openai_agent
+import src.agents.agent_google as agent_google
+import src.agents.powerBI_documenter_agent as documenter_agent
+from src.infrastructure.replay import (
+    RecordReplayModel,
+    ResponseStore,
+    record_replay_google_agent,
+    record_replay_openai_agent,
+)
+from src.utils.model_snapshot import ModelSnapshot
+
+
+def test_record_replay_model(fake_llm, test_case_paths, tmp_path, mocker):
+    store = ResponseStore(str(tmp_path / "recordings"))
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+    mocker.patch.object(
+        documenter_agent,
+        "model",
+        RecordReplayModel(store, model=documenter_agent.model, mode="record"),
+    )
+    recorded = asyncio.run(documenter_agent.call_agent("table descriptions", snapshot=snapshot))
+
+    mocker.patch.object(
+        documenter_agent, "model", RecordReplayModel(store, mode="replay", latency=0.01)
+    )
+    replayed = asyncio.run(documenter_agent.call_agent("table descriptions", snapshot=snapshot))
+
+    assert len(fake_llm) == 1
+    assert replayed == recorded
+
+
+def test_replay_without_recording_fails(test_case_paths, tmp_path, mocker):
+    store = ResponseStore(str(tmp_path / "recordings"))
+    mocker.patch.object(documenter_agent, "model", RecordReplayModel(store, mode="replay"))
+
+    with pytest.raises(LookupError):
+        asyncio.run(
+            documenter_agent.call_agent(
+                "table descriptions",
+                snapshot=ModelSnapshot.load(test_case_paths["model_folder"]),
+            )
+        )
+
+
+def test_record_replay_google_agent(tmp_path, mocker):
+    store = ResponseStore(str(tmp_path / "recordings"))
+    response = types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(role="model", parts=[types.Part(text="Hello")])
+            )
+        ],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=3, candidates_token_count=1
+        ),
+    )
+    agent = agent_google.Agent(api_key="test-api-key")
+    mocker.patch.object(agent.client.models, "generate_content", return_value=response)
+    record_replay_google_agent(agent, store, mode="record")
+    agent("Hi")
+
+    replay_agent = agent_google.Agent(api_key="test-api-key")
+    mocker.patch.object(
+        replay_agent.client.models, "generate_content", side_effect=AssertionError
+    )
+    record_replay_google_agent(replay_agent, store, mode="replay")
+    replay_agent("Hi")
+
+    assert replay_agent.last_assistant_message == "Hello"
+    assert replay_agent.input_tokens == 3
+
+
+def test_record_replay_openai_agent(tmp_path, mocker):
+    store = ResponseStore(str(tmp_path / "recordings"))
+    completion = ChatCompletion.model_validate(
+        {
+            "id": "completion-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "test",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "Hello"},
+                }
+            ],
+        }
+    )
+    agent = openai_agent.Agent(api_key="test-api-key")
+    mocker.patch.object(
+        agent.client.beta.chat.completions, "parse", return_value=completion
+    )
+    record_replay_openai_agent(agent, store, mode="record")
+    agent("Hi")
+
+    replay_agent = openai_agent.Agent(api_key="test-api-key")
+    record_replay_openai_agent(replay_agent, store, mode="replay")
+    replay_agent("Hi")
+
+    assert replay_agent.messages[-1] == {"role": "assistant", "content": "Hello"}
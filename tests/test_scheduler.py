@@ -0,0 +1,160 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from google.genai import errors as genai_errors
+from src.infrastructure.scheduler import LLMScheduler, TokenBucket, is_retryable_error
+
+
+class FakeClock:
+    """Clock advanced only by the scheduler's sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class StubModel:
+    """Stub LLM call failing with a rate limit error for the first calls."""
+
+    def __init__(self, clock: FakeClock, failures: int = 0):
+        self.clock = clock
+        self.failures = failures
+        self.call_times = []
+
+    async def __call__(self):
+        self.call_times.append(self.clock.now)
+        if self.failures:
+            self.failures -= 1
+            raise RateLimitError("Too many requests")
+        return "response"
+
+
+def _scheduler(clock: FakeClock, **kwargs) -> LLMScheduler:
+    return LLMScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_token_bucket_wait_time():
+    clock = FakeClock()
+    bucket = TokenBucket(capacity=60, per_minute=60, clock=clock)
+
+    assert bucket.try_acquire(60) == 0
+    assert bucket.try_acquire(30) == pytest.approx(30)
+    clock.now = 30
+    assert bucket.try_acquire(30) == 0
+
+
+def test_scheduler_requests_per_minute():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, requests_per_minute=2)
+    model = StubModel(clock)
+
+    async def run_all():
+        return await asyncio.gather(*(scheduler.run(model) for _ in range(4)))
+
+    assert asyncio.run(run_all()) == ["response"] * 4
+    assert model.call_times == pytest.approx([0, 0, 30, 60])
+    assert scheduler.metrics.requests == 4
+    assert scheduler.metrics.max_wait_time >= 30
+    assert scheduler.metrics.queue_depth == 0
+
+
+def test_scheduler_tokens_per_minute():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, tokens_per_minute=1000)
+    model = StubModel(clock)
+
+    async def run_all():
+        return await asyncio.gather(
+            *(scheduler.run(model, estimated_tokens=500) for _ in range(3))
+        )
+
+    asyncio.run(run_all())
+
+    assert model.call_times == pytest.approx([0, 0, 30])
+
+
+def test_scheduler_max_in_flight():
+    scheduler = LLMScheduler(max_in_flight=2)
+    running = []
+    peak = []
+
+    async def call():
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+
+    async def run_all():
+        await asyncio.gather(*(scheduler.run(call) for _ in range(6)))
+
+    asyncio.run(run_all())
+
+    assert max(peak) == 2
+
+
+def test_scheduler_retries_with_backoff():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, base_delay=1, max_retries=3)
+    model = StubModel(clock, failures=2)
+
+    assert asyncio.run(scheduler.run(model)) == "response"
+    assert scheduler.metrics.retries == 2
+    assert 0.5 <= clock.sleeps[0] <= 1
+    assert 1 <= clock.sleeps[1] <= 2
+
+
+def test_scheduler_gives_up_after_max_retries():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, max_retries=1)
+    model = StubModel(clock, failures=5)
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(scheduler.run(model))
+    assert len(model.call_times) == 2
+    assert scheduler.metrics.failures == 1
+
+
+def test_scheduler_does_not_retry_other_errors():
+    scheduler = LLMScheduler()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(scheduler.run(call))
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize(
+    "exc",
+    [
+        httpx.ReadTimeout("timed out"),
+        httpx.ConnectError("connection refused"),
+        openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com")),
+        openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com")),
+        genai_errors.ServerError(503, {"error": {"message": "unavailable"}}),
+        genai_errors.ClientError(429, {"error": {"message": "quota"}}),
+    ],
+)
+def test_transport_and_provider_errors_are_retryable(exc):
+    assert is_retryable_error(exc)
+
+
+def test_provider_client_errors_are_not_retryable():
+    assert not is_retryable_error(genai_errors.ClientError(400, {"error": {"message": "bad"}}))
+    assert not is_retryable_error(httpx.InvalidURL("bad url"))
@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+from src.agents.powerBI_documenter_agent import _prepare_model_context
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.synthetic_model import (
+    SyntheticModelSpec,
+    generate_synthetic_model,
+    write_synthetic_model,
+)
+from src.utils.tmdl_parser import ModelIndex, parse_tmdl
+from src.utils.tmdl_writer import write_descriptions
+
+DOCUMENTED_KINDS = ("table", "column", "measure")
+
+
+def _index(model):
+    index = ModelIndex()
+    for path, content in model.files.items():
+        index.add_file(path, content)
+    return index
+
+
+def _parsed_objects(index):
+    return sorted(
+        (obj.kind, obj.table, obj.name, obj.description)
+        for kind in DOCUMENTED_KINDS
+        for obj in index.objects(kind)
+    )
+
+
+def test_synthetic_model_is_deterministic():
+    spec = SyntheticModelSpec(tables=3, seed=7)
+    assert generate_synthetic_model(spec) == generate_synthetic_model(spec)
+    assert generate_synthetic_model(spec) != generate_synthetic_model(
+        SyntheticModelSpec(tables=3, seed=8)
+    )
+
+
+def test_synthetic_model_for_objects():
+    spec = SyntheticModelSpec.for_objects(1_000)
+    assert abs(spec.objects - 1_000) <= 50
+    assert len(generate_synthetic_model(spec).objects) == spec.objects
+
+
+def test_synthetic_measure_names_are_unique():
+    model = generate_synthetic_model(SyntheticModelSpec(tables=20, measures_per_table=20))
+    measures = [name for kind, _, name, _ in model.objects if kind == "measure"]
+
+    assert len(measures) == 400
+    assert len(set(measures)) == len(measures)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_parser_fuzz(seed):
+    spec = SyntheticModelSpec(
+        tables=5,
+        columns_per_table=8,
+        measures_per_table=8,
+        escaped_name_ratio=0.3,
+        multiline_ratio=0.5,
+        seed=seed,
+    )
+    model = generate_synthetic_model(spec)
+    index = _index(model)
+
+    assert _parsed_objects(index) == sorted(model.objects)
+    for path, content in model.files.items():
+        tmdl_file = parse_tmdl(content, path)
+        for measure in tmdl_file.measures:
+            expression = tmdl_file.expression(measure)
+            assert "SUM(" in expression or "VAR _total" in expression
+            assert "lineageTag" not in expression
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_writer_round_trip(seed):
+    model = generate_synthetic_model(SyntheticModelSpec(tables=4, seed=seed))
+    descriptions = {
+        (kind, name): f"New description of {name}"
+        for kind, _, name, _ in model.objects
+    }
+    updated = ModelIndex()
+    for path, content in model.files.items():
+        tmdl_file = parse_tmdl(content, path)
+        new_content = write_descriptions(tmdl_file, descriptions)
+        # Writing the same descriptions again doesn't change the file
+        assert write_descriptions(parse_tmdl(new_content, path), descriptions) == new_content
+        updated.add_file(path, new_content)
+
+    assert _parsed_objects(updated) == sorted(
+        (kind, table, name, f"New description of {name}")
+        for kind, table, name, _ in model.objects
+    )
+
+
+def test_context_builder_includes_every_file(tmp_path):
+    folder = str(tmp_path / "Synthetic.SemanticModel")
+    model = write_synthetic_model(folder, SyntheticModelSpec(tables=3))
+    snapshot = ModelSnapshot.load(folder)
+
+    context = asyncio.run(_prepare_model_context(snapshot))
+
+    assert len(snapshot.files) == len(model.files)
+    assert context.count("<file name=") == len(model.files)
+    for content in model.files.values():
+        assert content in context
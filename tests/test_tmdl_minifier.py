@@ -0,0 +1,152 @@
+import asyncio
+import pytest
+import src.agents.powerBI_documenter_agent as documenter_agent
+from src.utils.model_snapshot import ModelSnapshot
+from src.utils.synthetic_model import SyntheticModelSpec, generate_synthetic_model
+from src.utils.tmdl_minifier import MinifyReport, get_profile, minify_tmdl
+from src.utils.tmdl_parser import parse_tmdl
+
+DOCUMENTED_KINDS = ("table", "column", "measure")
+
+
+def _definitions(tmdl_file):
+    """What the descriptions are written from: names, descriptions, DAX and data types."""
+    return sorted(
+        (
+            obj.kind,
+            obj.table,
+            obj.name,
+            obj.description,
+            tmdl_file.expression(obj).strip() if obj.kind == "measure" else None,
+            obj.properties.get("dataType"),
+        )
+        for obj in tmdl_file.objects
+        if obj.kind in DOCUMENTED_KINDS
+    )
+
+
+@pytest.fixture
+def kpi_content(test_case_paths):
+    with open(test_case_paths["model_folder"] + "/KPI.tmdl", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_standard_profile_drops_metadata(kpi_content):
+    minified = minify_tmdl(kpi_content, "standard")
+
+    for noise in ("lineageTag", "annotation", "formatString", "summarizeBy", "\n\n"):
+        assert noise not in minified
+    assert "sourceColumn: KPI" in minified
+    assert "\t\t\tBLANK()" in minified
+    # The M query is cut after its first lines
+    assert "\t\t\t\tlet\n" in minified
+    assert "... (2 more lines)" in minified
+    assert _definitions(parse_tmdl(minified)) == _definitions(parse_tmdl(kpi_content))
+
+
+def test_aggressive_profile_drops_partitions(kpi_content):
+    minified = minify_tmdl(kpi_content, "aggressive")
+
+    assert "partition" not in minified
+    assert "sourceColumn" not in minified
+    assert _definitions(parse_tmdl(minified)) == _definitions(parse_tmdl(kpi_content))
+
+
+def test_none_profile_keeps_the_text(kpi_content):
+    report = MinifyReport()
+
+    assert minify_tmdl(kpi_content, "none", report) == kpi_content
+    assert report.saved_tokens == 0
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError, match="Unknown context profile"):
+        minify_tmdl("table A", "smallest")
+
+
+def test_expression_lines_are_not_properties():
+    content = "\n".join(
+        [
+            "table Sales",
+            "\tmeasure Total = ```",
+            "\t\tlineageTag: inside the fence",
+            "\t\t```",
+            "\t\tlineageTag: abc",
+            "\tmeasure Other =",
+            "\t\t\t\"annotation\"",
+            "\t\tformatString: 0",
+        ]
+    )
+
+    assert minify_tmdl(content, "standard") == "\n".join(
+        [
+            "table Sales",
+            "\tmeasure Total = ```",
+            "\t\tlineageTag: inside the fence",
+            "\t\t```",
+            "\tmeasure Other =",
+            "\t\t\t\"annotation\"",
+        ]
+    )
+
+
+@pytest.mark.parametrize("profile", ["standard", "aggressive"])
+@pytest.mark.parametrize("seed", range(5))
+def test_minified_synthetic_model_keeps_definitions(profile, seed):
+    spec = SyntheticModelSpec(
+        tables=3, columns_per_table=6, measures_per_table=6, multiline_ratio=0.5, seed=seed
+    )
+    model = generate_synthetic_model(spec)
+
+    for path, content in model.files.items():
+        minified = minify_tmdl(content, profile)
+        assert _definitions(parse_tmdl(minified, path)) == _definitions(parse_tmdl(content, path))
+
+
+def _minify_report(contents, profile):
+    report = MinifyReport()
+    for content in contents:
+        minify_tmdl(content, profile, report)
+    return report
+
+
+def test_minify_report():
+    model = generate_synthetic_model(SyntheticModelSpec(tables=3))
+
+    summary = _minify_report(model.files.values(), "standard").summary()
+
+    assert summary["saved_tokens"] == summary["original_tokens"] - summary["minified_tokens"]
+    assert summary["saved_share"] > 0.4
+    assert {"lineageTag", "annotation", "m query"} <= set(summary["saved_tokens_by_keyword"])
+
+
+def test_call_agent_minifies_the_model_context(fake_llm, test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+
+    asyncio.run(
+        documenter_agent.call_agent(
+            "measure descriptions", snapshot=snapshot, context_profile="standard"
+        )
+    )
+
+    [call] = fake_llm
+    assert "lineageTag" not in call["system_prompt"]
+    assert "measure KPI01 = IF(SUM('KPI'[KPI])=1" in call["system_prompt"]
+
+
+def test_minified_files_are_kept_with_the_snapshot(test_case_paths):
+    snapshot = ModelSnapshot.load(test_case_paths["model_folder"])
+    contents = [tmdl_file.content for tmdl_file in snapshot.tmdl_files()]
+
+    report = documenter_agent.model_context_report(snapshot, "standard")
+    context = asyncio.run(documenter_agent._prepare_model_context(snapshot, profile="standard"))
+
+    assert report.summary() == _minify_report(contents, "standard").summary()
+    for tmdl_file in snapshot.tmdl_files():
+        # The prompt is built from the texts the report was computed from
+        [(text, _)] = tmdl_file.derived.values()
+        assert text in context
+    # Files sent as they are aren't kept a second time
+    documenter_agent.model_context_report(snapshot, "none")
+    assert all(len(tmdl_file.derived) == 1 for tmdl_file in snapshot.tmdl_files())
+    assert list(snapshot.tmdl_files()[0].derived) == [("minified", get_profile("standard"))]
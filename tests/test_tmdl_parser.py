@@ -0,0 +1,94 @@
+import pytest
+from src.utils import utils
+from src.utils.tmdl_parser import ModelIndex, parse_tmdl
+
+
+@pytest.fixture
+def model_index(test_case_paths):
+    model_files = utils.list_files_in_directory(
+        test_case_paths["model_folder"], extension=".tmdl", recursive=True
+    )
+    return ModelIndex.from_files(model_files)
+
+
+def test_parse_tmdl_objects(model_index):
+    measure = model_index.find("measure", "KPI01")
+    column = model_index.find("column", "KPI''s name", table="KPI")
+    table = model_index.find("table", "KPI")
+
+    assert measure.table == "KPI"
+    assert measure.lineage_tag == "90d22ebd-e687-4532-b394-e34c89c4abd4"
+    assert column.properties["dataType"] == "int64"
+    assert column.properties["sourceColumn"] == "KPI"
+    assert table.lineage_tag == "a0941aee-8d5c-4766-9d79-f8b3bd1807e5"
+    assert model_index.find("column", "Video name").description == "Old Description"
+    assert model_index.find("column", "Video ID").description is None
+
+
+def test_parse_tmdl_expressions(model_index):
+    kpi_file = model_index.file_of(model_index.find("table", "KPI"))
+
+    single_line = kpi_file.expression(model_index.find("measure", "KPI 02"))
+    multi_line = kpi_file.expression(model_index.find("measure", "new''s measure"))
+    calculated_column = kpi_file.expression(model_index.find("column", "Category"))
+
+    assert single_line.startswith("IF(SUM('KPI'[KPI])=1,(CALCULATE(")
+    assert single_line.endswith('"%"))))')
+    assert multi_line.strip() == "BLANK()"
+    assert calculated_column == "'some definition'"
+    assert kpi_file.expression(model_index.find("column", "Category name")) == ""
+
+
+def test_parse_tmdl_offsets():
+    content = (
+        "/// Sales table\n"
+        "table Sales\n"
+        "\tlineageTag: 1\n"
+        "\n"
+        "\t/// First line\n"
+        "\t/// Second line\n"
+        "\tmeasure 'Total' =\n"
+        "\t\t\tSUM(Sales[Amount])\n"
+        "\t\tlineageTag: 2\n"
+        "\n"
+        "\tcolumn Amount\n"
+        "\t\tdataType: double\n"
+    )
+    tmdl_file = parse_tmdl(content, "Sales.tmdl")
+    table, measure, column = tmdl_file.objects
+
+    assert table.description == "Sales table"
+    assert tmdl_file.text(table.description_span) == "/// Sales table\n"
+    assert measure.description == "First line\nSecond line"
+    assert content[measure.start :].startswith("\tmeasure 'Total' =")
+    assert content[measure.start : measure.end].endswith("lineageTag: 2\n")
+    assert tmdl_file.expression(measure) == "\t\t\tSUM(Sales[Amount])"
+    assert column.properties == {"dataType": "double"}
+    assert column.end == len(content)
+
+
+def test_model_index_add_file_replaces_previous_version():
+    model_index = ModelIndex()
+    model_index.add_file("Sales.tmdl", "table Sales\n\n\tmeasure A = 1\n")
+    model_index.add_file("Sales.tmdl", "table Sales\n\n\tmeasure B = 1\n")
+
+    assert model_index.get_objects("measures") == {"Sales.tmdl": ["B"]}
+
+
+def test_model_index_lookups_follow_replaced_files():
+    model_index = ModelIndex()
+    old = model_index.add_file("Sales.tmdl", "table Sales\n\n\tmeasure A = 1\n")
+    model_index.add_file("Costs.tmdl", "table Costs\n\n\tmeasure A = 2\n")
+    new = model_index.add_file("Sales.tmdl", "table Sales\n\n\tmeasure A = 1\n")
+    [old_measure], [new_measure] = old.measures, new.measures
+
+    assert model_index.find("measure", "A", table="Sales") is new_measure
+    assert model_index.find("measure", "A").table == "Costs"
+    # An equal object of the replaced version is not in the index any more
+    assert old_measure == new_measure
+    assert model_index.file_of(old_measure) is None
+    assert model_index.file_of(new_measure) is new
+
+    model_index.remove_file("Costs.tmdl")
+    assert model_index.find("measure", "A") is new_measure
+    assert model_index.find("table", "Costs") is None
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+import pytest
+import src.agents.agent as agent
+import src.agents.agent_google as agent_google
+from src.agents.tool_calls import run_tool_calls, run_tool_calls_async
+
+
+def lookup_measure(name: str):
+    """Look up a measure, slowly."""
+    time.sleep(0.2)
+    return f"expression of {name}"
+
+
+async def lookup_table(name: str):
+    """Look up a table, slowly."""
+    await asyncio.sleep(0.2)
+    return f"columns of {name}"
+
+
+def hang(name: str):
+    """Never answers in time."""
+    time.sleep(1)
+    return name
+
+
+def fail(name: str):
+    """Always fails."""
+    raise KeyError(name)
+
+
+FUNCTIONS = {f.__name__: f for f in [lookup_measure, lookup_table, hang, fail]}
+
+
+def test_run_tool_calls_concurrently_in_call_order():
+    calls = [("lookup_measure", {"name": f"M{i}"}) for i in range(5)]
+    calls += [("lookup_table", {"name": f"T{i}"}) for i in range(5)]
+
+    started = time.perf_counter()
+    results = run_tool_calls(FUNCTIONS, calls)
+    duration = time.perf_counter() - started
+
+    assert results == [f"expression of M{i}" for i in range(5)] + [
+        f"columns of T{i}" for i in range(5)
+    ]
+    assert duration < 0.6
+
+
+def test_run_tool_calls_timeout():
+    started = time.perf_counter()
+    results = run_tool_calls(
+        FUNCTIONS, [("hang", {"name": "a"}), ("lookup_measure", {"name": "M"})], timeout=0.5
+    )
+
+    assert results[0] == {"error": "Tool hang timed out after 0.5 seconds"}
+    assert results[1] == "expression of M"
+    assert time.perf_counter() - started < 0.9
+
+
+def test_run_tool_calls_raises_tool_errors():
+    with pytest.raises(KeyError):
+        run_tool_calls(FUNCTIONS, [("lookup_measure", {"name": "M"}), ("fail", {"name": "x"})])
+
+
+def test_run_tool_calls_inside_running_loop():
+    async def call_sync_version():
+        return run_tool_calls(FUNCTIONS, [("lookup_table", {"name": "T"})])
+
+    assert asyncio.run(call_sync_version()) == ["columns of T"]
+    assert asyncio.run(
+        run_tool_calls_async(FUNCTIONS, [("lookup_measure", {"name": "M"})])
+    ) == ["expression of M"]
+
+
+def test_openai_agent_uses_tools_concurrently():
+    chat = agent.Agent(api_key="test-api-key", tools=[lookup_measure, lookup_table])
+    tool_calls = [
+        SimpleNamespace(
+            id=f"call_{i}",
+            function=SimpleNamespace(name=name, arguments=json.dumps({"name": str(i)})),
+        )
+        for i, name in enumerate(["lookup_measure", "lookup_table", "lookup_measure"])
+    ]
+
+    started = time.perf_counter()
+    chat._use_tools(tool_calls)
+
+    assert time.perf_counter() - started < 0.5
+    assert [message["tool_call_id"] for message in chat.messages[1:]] == [
+        "call_0",
+        "call_1",
+        "call_2",
+    ]
+    assert json.loads(chat.messages[2]["content"]) == "columns of 1"
+
+
+def test_google_agent_uses_tools_concurrently():
+    chat = agent_google.Agent(api_key="test-api-key", tools=[lookup_measure, lookup_table])
+    tool_calls = [
+        agent_google.types.FunctionCall(name=name, args={"name": str(i)})
+        for i, name in enumerate(["lookup_table", "lookup_measure"])
+    ]
+
+    started = time.perf_counter()
+    chat._use_tools(tool_calls)
+
+    assert time.perf_counter() - started < 0.4
+    # All results answer the model turn in a single user turn, like in AsyncAgent
+    [message] = chat.messages
+    assert message.role == "user"
+    assert [part.function_response.name for part in message.parts] == [
+        "lookup_table",
+        "lookup_measure",
+    ]
+    assert [part.function_response.response["output"] for part in message.parts] == [
+        "columns of 0",
+        "expression of 1",
+    ]
+
+
+def test_google_agent_history_has_one_model_turn_per_round_of_calls():
+    chat = agent_google.Agent(api_key="test-api-key", tools=[lookup_measure, lookup_table])
+
+    def generate_content(model, contents, config):
+        if contents[-1].parts[0].function_response is None:
+            parts = [
+                {"function_call": {"name": "lookup_table", "args": {"name": "T"}}},
+                {"function_call": {"name": "lookup_measure", "args": {"name": "M"}}},
+            ]
+        else:
+            parts = [{"text": "Done"}]
+        return agent_google.types.GenerateContentResponse.model_validate(
+            {
+                "candidates": [{"content": {"role": "model", "parts": parts}}],
+                "usage_metadata": {"prompt_token_count": 10, "candidates_token_count": 2},
+            }
+        )
+
+    chat.client = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+    chat("Describe T")
+
+    assert [message.role for message in chat.messages] == ["user", "model", "user", "model"]
+    assert len(chat.messages[1].parts) == len(chat.messages[2].parts) == 2
@@ -0,0 +1,107 @@
+import asyncio
+import csv
+import json
+import shutil
+import pytest
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.models.function import FunctionModel
+from power_bi_doctor import document_model
+from src.agents import powerBI_documenter_agent as documenter_agent
+from src.infrastructure.scheduler import LLMScheduler, set_scheduler
+from src.infrastructure.usage_ledger import UsageLedger, load_prices, percentile
+from src.utils.model_snapshot import ModelSnapshot
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+async def _no_sleep(seconds):
+    pass
+
+
+def test_percentile():
+    assert percentile([], 50) == 0
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([4, 1, 3, 2], 50) == 2.5
+    assert percentile(list(range(101)), 95) == 95
+
+
+def test_ledger_cost_and_summary():
+    ledger = UsageLedger(prices={"model": {"input": 1.0, "output": 2.0}})
+    ledger.record("measure descriptions", 0, "model", 1_000_000, 500_000, latency=1.0)
+    ledger.record("measure descriptions", 1, "model", 0, 0, latency=3.0, retries=2)
+    ledger.record("table descriptions", 0, "unknown model", 10, 10, latency=2.0)
+
+    summary = ledger.summary()
+
+    assert summary["requests"] == 3
+    assert summary["cost"] == pytest.approx(2.0)
+    assert summary["retries"] == 2
+    measures = summary["tasks"]["measure descriptions"]
+    assert measures["requests"] == 2
+    assert measures["latency_p50"] == pytest.approx(2.0)
+    assert measures["latency_p95"] == pytest.approx(2.9)
+    assert summary["tasks"]["table descriptions"]["cost"] == 0
+
+
+def test_load_prices_from_file(tmp_path, monkeypatch):
+    prices_path = tmp_path / "prices.json"
+    prices_path.write_text(json.dumps({"my-model": {"input": 0.5, "output": 1.5}}))
+    monkeypatch.setenv("LLM_PRICES_PATH", str(prices_path))
+
+    prices = load_prices()
+
+    assert prices["my-model"] == {"input": 0.5, "output": 1.5}
+    assert "gemini-2.0-flash" in prices
+
+
+def test_document_model_writes_usage(fake_llm, test_case_paths, tmp_path):
+    model_folder = tmp_path / "Model.SemanticModel"
+    shutil.copytree(test_case_paths["model_folder"], model_folder)
+
+    summary = asyncio.run(document_model(ModelSnapshot.load(str(model_folder))))
+
+    usage = summary["usage"]
+    assert usage["requests"] == 3
+    assert set(usage["tasks"]) == {
+        "measure descriptions",
+        "table descriptions",
+        "column descriptions",
+    }
+    assert usage["input_tokens"] > 0 and usage["output_tokens"] > 0
+    report = json.loads((tmp_path / "Model.SemanticModel_usage.json").read_text())
+    assert report["summary"] == usage
+    with open(tmp_path / "Model.SemanticModel_usage.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["task"] for row in rows] == [r["task"] for r in report["requests"]]
+
+
+def test_ledger_counts_retries(test_case_paths, mocker):
+    failures = [RateLimitError()]
+
+    def document(messages, info):
+        if failures:
+            raise failures.pop()
+        return ModelResponse(
+            parts=[ToolCallPart(info.output_tools[0].name, {"objects_documentation": []})]
+        )
+
+    mocker.patch.object(documenter_agent, "model", FunctionModel(document))
+    set_scheduler(LLMScheduler(sleep=_no_sleep))
+    ledger = UsageLedger()
+    try:
+        asyncio.run(
+            documenter_agent.call_agent(
+                "table descriptions",
+                snapshot=ModelSnapshot.load(test_case_paths["model_folder"]),
+                ledger=ledger,
+                reconcile_retries=0,
+            )
+        )
+    finally:
+        set_scheduler(None)
+
+    assert len(ledger.records) == 1
+    assert ledger.records[0].retries == 1
+    assert ledger.records[0].status == "ok"
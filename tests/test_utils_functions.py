@@ -1,6 +1,7 @@
 import pytest
 from src.utils import utils
 import os
+import stat
 from pydantic_ai import BinaryContent
 from pathlib import Path
 
@@ -58,6 +59,26 @@ def test_update_columns_descriptions_with_actual_files(test_case_paths):
     assert updated_content == expected_content
 
 
+def test_update_table_description_with_actual_files(test_case_paths):
+
+    with open(test_case_paths["tables_goal"], "r", encoding="utf-8") as file:
+        expected_content = file.read()
+    with open(test_case_paths["tables_init"], "r", encoding="utf-8") as file:
+        file_content_raw = file.read()
+
+    updated_content = utils.update_table_description(file_content_raw, "New description")
+
+    assert updated_content == expected_content
+
+
+def test_update_table_description_without_existing_description():
+    updated_content = utils.update_table_description(
+        "table Sales\n\tlineageTag: 1\n", "New description"
+    )
+
+    assert updated_content == "/// New description\ntable Sales\n\tlineageTag: 1\n"
+
+
 def test_list_files_in_directory(test_directory):
     """Test the list_files_in_directory function with a temporary directory."""
     # Test listing files in the main directory
@@ -104,3 +125,27 @@ def test_tmdl_object_finder(test_case_paths):
     assert found_measures == expected_measures
     assert found_columns == expected_columns
     assert found_tables == expected_tables
+
+
+def test_atomic_write_file(tmp_path):
+    path = tmp_path / "model" / "Table.tmdl"
+
+    utils.atomic_write_file(str(path), "table Sales\n")
+    utils.atomic_write_file(str(path), "table Sales\n\tmeasure Total = 1\n")
+
+    assert path.read_text(encoding="utf-8") == "table Sales\n\tmeasure Total = 1\n"
+    assert os.listdir(path.parent) == ["Table.tmdl"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX permissions")
+def test_atomic_write_file_keeps_permissions(tmp_path):
+    new_path = tmp_path / "New.tmdl"
+    existing_path = tmp_path / "Existing.tmdl"
+    existing_path.write_text("table Sales\n")
+    existing_path.chmod(0o640)
+
+    utils.atomic_write_file(str(new_path), "table Sales\n")
+    utils.atomic_write_file(str(existing_path), "table Sales\n\tmeasure Total = 1\n")
+
+    assert stat.S_IMODE(new_path.stat().st_mode) == 0o666 & ~utils.UMASK
+    assert stat.S_IMODE(existing_path.stat().st_mode) == 0o640